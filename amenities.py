@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Amenity dictionary and per-listing amenity bitmaps.
+
+Amenity questions ("listings with Wifi and a washer, per state") otherwise
+scan every listing's amenity list as text. Ingest splits the lists into
+
+    amenity_dictionary    (amenity_id, amenity)
+    listing_amenity_bits  (file_id, state, listing_id, word, bits)
+
+Each distinct amenity string gets a dense integer id (ids are never reused,
+so reloading a file does not renumber anything). A listing's amenity set is
+stored as a bitset sliced into 64-bit words: amenity ``i`` is bit ``i % 64``
+of word ``i // 64``, and only non-zero words get a row. A listing has about
+40 amenities, so that is a handful of integers per listing.
+
+A query resolves the requested names against the small dictionary first
+(exactly, case-insensitively, or by substring), turns them into per-word
+masks and then only does ``bits & mask`` tests on the bitmap rows. Reloading
+a file replaces only its bitmaps.
+
+Usage:
+    python3 amenities.py Wifi Washer                  # listings with both, per state
+    python3 amenities.py camera --contains --any      # any amenity containing "camera"
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+import duckdb
+
+from coldstore import text_source
+from query_cache import connect_cached
+
+WORD_BITS = 64
+
+
+def has_amenities(con: duckdb.DuckDBPyConnection) -> bool:
+    """Whether the connected database carries the amenity dictionary and bitmaps."""
+    return con.execute("""
+        SELECT COUNT(*) FROM duckdb_tables()
+        WHERE database_name = current_database() AND schema_name = 'main'
+          AND table_name IN ('amenity_dictionary', 'listing_amenity_bits')
+    """).fetchone()[0] == 2
+
+
+def refresh_amenities(con: duckdb.DuckDBPyConnection, table_name: str, file_ids: Iterable[int],
+                      source: str = 'listings'):
+    """
+    Replace the amenity bitmaps of (re)loaded listings files.
+
+    New amenity strings are appended to the dictionary first. Reviews files
+    carry no amenities and are ignored.
+
+    Args:
+        con: DuckDB connection, normally inside the file's load transaction
+        table_name: 'listings' or 'reviews'
+        file_ids: Manifest ids of the loaded files
+        source: Relation to read the amenity lists from (listings_full once
+            the text is split off; freshly loaded rows still hold theirs)
+    """
+    id_list = ", ".join(str(file_id) for file_id in sorted(set(file_ids)))
+    if table_name != 'listings' or not id_list:
+        return
+
+    con.execute(f"""
+        INSERT INTO amenity_dictionary
+        SELECT (SELECT COALESCE(MAX(amenity_id), -1) FROM amenity_dictionary)
+                   + row_number() OVER (ORDER BY amenity), amenity
+        FROM (
+            SELECT DISTINCT unnest(amenities) AS amenity
+            FROM {source} WHERE file_id IN ({id_list})
+        )
+        WHERE amenity IS NOT NULL AND amenity NOT IN (SELECT amenity FROM amenity_dictionary)
+    """)
+    con.execute(f"DELETE FROM listing_amenity_bits WHERE file_id IN ({id_list})")
+    con.execute(f"""
+        INSERT INTO listing_amenity_bits
+        SELECT l.file_id, l.state, l.id, d.amenity_id // {WORD_BITS} AS word,
+               bit_or(1::UBIGINT << (d.amenity_id % {WORD_BITS})::UBIGINT) AS bits
+        FROM (
+            SELECT file_id, state, id, unnest(amenities) AS amenity
+            FROM {source} WHERE file_id IN ({id_list})
+        ) l
+        JOIN amenity_dictionary d USING (amenity)
+        GROUP BY l.file_id, l.state, l.id, word
+    """)
+
+
+def create_amenities(con: duckdb.DuckDBPyConnection):
+    """
+    Create the amenity tables if they do not exist yet.
+
+    Tables created here are filled from the listings already loaded, so an
+    existing database gets complete bitmaps on its next ingest.
+    """
+    if has_amenities(con):
+        return
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute("CREATE TABLE IF NOT EXISTS amenity_dictionary (amenity_id INTEGER, amenity TEXT)")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS listing_amenity_bits (
+                file_id INTEGER,
+                state TEXT,
+                listing_id BIGINT,
+                word SMALLINT,
+                bits UBIGINT
+            )
+        """)
+        file_ids = [row[0] for row in con.execute(
+            "SELECT DISTINCT file_id FROM listings WHERE file_id IS NOT NULL"
+        ).fetchall()]
+        refresh_amenities(con, 'listings', file_ids, source=text_source(con, 'listings'))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+
+def amenity_ids(con: duckdb.DuckDBPyConnection, names: List[str], contains: bool = False) -> Dict[str, List[int]]:
+    """
+    Resolve amenity names to dictionary ids, case-insensitively.
+
+    Args:
+        con: DuckDB connection
+        names: Amenity names (or substrings with contains=True)
+        contains: Match every amenity containing the name instead of equal to it
+
+    Returns:
+        Name -> matching amenity ids (empty when nothing matches)
+    """
+    ids = {}
+    for name in names:
+        condition = "contains(lower(amenity), lower(?))" if contains else "lower(amenity) = lower(?)"
+        ids[name] = [row[0] for row in con.execute(
+            f"SELECT amenity_id FROM amenity_dictionary WHERE {condition} ORDER BY amenity_id", [name]
+        ).fetchall()]
+    return ids
+
+
+def word_masks(ids: Dict[str, List[int]]) -> List[Tuple[int, int, int]]:
+    """Turn each name's ids into (term, word, mask) rows, one per word it touches."""
+    masks = []
+    for term, name in enumerate(ids):
+        words = defaultdict(int)
+        for amenity_id in ids[name]:
+            words[amenity_id // WORD_BITS] |= 1 << (amenity_id % WORD_BITS)
+        masks.extend((term, word, mask) for word, mask in sorted(words.items()))
+    return masks
+
+
+def listings_with_amenities(con: duckdb.DuckDBPyConnection, names: List[str], match_all: bool = True,
+                            contains: bool = False) -> List[Tuple[str, int]]:
+    """
+    Count distinct listings per state that have the given amenities.
+
+    A name is satisfied by any amenity it resolves to (see amenity_ids); with
+    match_all every name must be satisfied by the same listing row, otherwise
+    any one. Uses the bitmaps when the database has them and scans the
+    amenity lists otherwise (e.g. on the Parquet backend).
+
+    Returns:
+        List of (state, listings) ordered by listings descending
+    """
+    if not has_amenities(con):
+        return con.execute(f"""
+            SELECT state, COUNT(DISTINCT id) AS listings
+            FROM {text_source(con, 'listings')}
+            WHERE {amenity_scan_filter(names, match_all, contains)}
+            GROUP BY state
+            ORDER BY listings DESC, state
+        """, [name.lower() for name in names]).fetchall()
+
+    ids = amenity_ids(con, names, contains)
+    if match_all and not all(ids.values()):
+        return []
+    masks = word_masks(ids)
+    if not masks:
+        return []
+
+    values = ", ".join(f"({term}, {word}, {mask}::UBIGINT)" for term, word, mask in masks)
+    required = len(names) if match_all else 1
+    return con.execute(f"""
+        WITH masks(term, word, mask) AS (VALUES {values})
+        SELECT state, COUNT(DISTINCT listing_id) AS listings
+        FROM (
+            SELECT b.file_id, b.listing_id, b.state
+            FROM listing_amenity_bits b
+            JOIN masks m ON b.word = m.word AND b.bits & m.mask <> 0
+            GROUP BY b.file_id, b.listing_id, b.state
+            HAVING COUNT(DISTINCT m.term) >= {required}
+        )
+        GROUP BY state
+        ORDER BY listings DESC, state
+    """).fetchall()
+
+
+def amenity_scan_filter(names: List[str], match_all: bool, contains: bool) -> str:
+    """SQL predicate over listings.amenities equivalent to the bitmap lookup (one ? per name)."""
+    test = "contains(lower(a), ?)" if contains else "lower(a) = ?"
+    terms = [f"len(list_filter(amenities, a -> {test})) > 0" for _ in names]
+    return "(" + (" AND " if match_all else " OR ").join(terms) + ")"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count listings with a set of amenities, per state.")
+    parser.add_argument('amenities', nargs='+', help="Amenity names, e.g. Wifi \"Free parking on premises\"")
+    parser.add_argument('--any', action='store_true', help="Match listings with any of the amenities (default: all)")
+    parser.add_argument('--contains', action='store_true',
+                        help="Match every amenity containing a name instead of the exact name")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    con = connect_cached()
+    by_state = listings_with_amenities(con, args.amenities, match_all=not args.any, contains=args.contains)
+    con.close()
+
+    for state, listings in by_state:
+        print(f"{state}\t{listings}")
+    print(f"Total listings: {sum(listings for _, listings in by_state)}")
+    print(f"Execution time: {time.time() - start_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
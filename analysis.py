@@ -1,13 +1,24 @@
-import duckdb
+from dedup import has_canonical, joins_exactly
+from query_cache import connect_cached
+from keywords import flag_column, mention_filter, table_columns
 import time
 
 # Connect to the database
-con = duckdb.connect('airbnb.db')
+con = connect_cached()
 
-def time_query(query_name, query):
-    """Time a query and return the result"""
+# Precomputed flag columns when ingest created them, LIKE scans otherwise
+review_mentions_camera = mention_filter(con, 'reviews', 'camera')
+listing_mentions_camera = mention_filter(con, 'listings', 'camera')
+
+# Deduplicated canonical tables (see dedup.py) turn distinct id counts into row counts
+listings_deduped = has_canonical(con, 'listings')
+reviews_deduped = has_canonical(con, 'reviews')
+
+def time_query(query_name, query, fetch_all=False):
+    """Time a query, including fetching its rows, and return the result"""
     start_time = time.time()
-    result = con.execute(query).fetchone()
+    result = con.execute(query)
+    result = result.fetchall() if fetch_all else result.fetchone()
     end_time = time.time()
     print(f"{query_name} took {end_time - start_time:.3f} seconds")
     return result
@@ -20,9 +31,14 @@ print(f"{listings_count[0]}")
 print(f"{reviews_count[0]}")
 
 print("\n=== Count unique listings and reviews ===")
-unique_listings = time_query("Unique listings", "SELECT COUNT(DISTINCT id) FROM listings")
-unique_reviews = time_query("Unique reviews", "SELECT COUNT(DISTINCT id) FROM reviews")
-unique_reviewers = time_query("Unique reviewers", "SELECT COUNT(DISTINCT reviewer_id) FROM reviews")
+if listings_deduped and reviews_deduped:
+    unique_listings = time_query("Unique listings", "SELECT COUNT(*) FROM listings_canonical")
+    unique_reviews = time_query("Unique reviews", "SELECT COUNT(*) FROM reviews_canonical")
+    unique_reviewers = time_query("Unique reviewers", "SELECT COUNT(DISTINCT reviewer_id) FROM reviews_canonical")
+else:
+    unique_listings = time_query("Unique listings", "SELECT COUNT(DISTINCT id) FROM listings")
+    unique_reviews = time_query("Unique reviews", "SELECT COUNT(DISTINCT id) FROM reviews")
+    unique_reviewers = time_query("Unique reviewers", "SELECT COUNT(DISTINCT reviewer_id) FROM reviews")
 
 print(f"{unique_listings[0]}")
 print(f"{unique_reviews[0]}")
@@ -36,8 +52,15 @@ state_counts_query = """
     GROUP BY state
     ORDER BY listing_count DESC
 """
+if listings_deduped:
+    state_counts_query = """
+        SELECT state, COUNT(*) as listing_count
+        FROM listing_id_states
+        GROUP BY state
+        ORDER BY listing_count DESC
+    """
 
-state_counts = con.execute(state_counts_query).fetchall()
+state_counts = time_query("State listing counts", state_counts_query, fetch_all=True)
 most_listings_state = state_counts[0]
 least_listings_state = state_counts[-1]
 
@@ -54,30 +77,37 @@ top_host_query = """
     ORDER BY review_count DESC
     LIMIT 1
 """
-
-top_host = con.execute(top_host_query).fetchone()
+if joins_exactly(con, 'reviews'):
+    top_host_query = """
+        SELECT host_id, COUNT(*) as review_count
+        FROM (SELECT DISTINCT id, host_id FROM listings) l
+        JOIN reviews_canonical r ON l.id = r.listing_id
+        GROUP BY host_id
+        ORDER BY review_count DESC
+        LIMIT 1
+    """
+
+top_host = time_query("Top host", top_host_query)
 print(f"{top_host[1]}")
 
 print("\n=== Listings that mention 'cameras' ===")
 # Find listings mentioning camera in description, host_about, or amenities
-camera_listings_query = """
+camera_listings_query = f"""
     SELECT COUNT(DISTINCT id)
     FROM listings
-    WHERE LOWER(description) LIKE '%camera%'
-       OR LOWER(host_about) LIKE '%camera%'
-       OR LOWER(amenities) LIKE '%camera%'
+    WHERE {listing_mentions_camera}
 """
 
-camera_listings = con.execute(camera_listings_query).fetchone()
+camera_listings = time_query("Camera listings", camera_listings_query)
 print(f"{camera_listings[0]}")
 
 print("\n=== Top states with camera listings ===")
 # Find state with highest percentage of camera reviews
-camera_reviews_by_state_query = """
+camera_reviews_by_state_query = f"""
     WITH camera_reviews AS (
         SELECT DISTINCT r.id, r.state
         FROM reviews r
-        WHERE LOWER(r.comments) LIKE '%camera%'
+        WHERE {review_mentions_camera}
     ),
     total_reviews_by_state AS (
         SELECT state, COUNT(DISTINCT id) as total_reviews
@@ -98,25 +128,35 @@ camera_reviews_by_state_query = """
     ORDER BY percentage DESC
     LIMIT 1
 """
+if reviews_deduped and flag_column('camera') in table_columns(con, 'review_id_states'):
+    camera_reviews_by_state_query = f"""
+        SELECT state,
+               COUNT(*) FILTER (WHERE {flag_column('camera')}) as camera_reviews,
+               COUNT(*) as total_reviews,
+               (camera_reviews * 100.0 / total_reviews) as percentage
+        FROM review_id_states
+        GROUP BY state
+        HAVING camera_reviews > 0
+        ORDER BY percentage DESC
+        LIMIT 1
+    """
 
-top_camera_state = con.execute(camera_reviews_by_state_query).fetchone()
+top_camera_state = time_query("Top camera state", camera_reviews_by_state_query)
 print(f"{top_camera_state[0]}")
 print(f"{top_camera_state[1]}")
 
 print("\n=== Secret cameras ===")
 # Find listings that mention cameras in reviews but NOT in listing details
-secret_cameras_query = """
+secret_cameras_query = f"""
     WITH camera_in_reviews AS (
         SELECT DISTINCT listing_id, state
         FROM reviews
-        WHERE LOWER(comments) LIKE '%camera%'
+        WHERE {review_mentions_camera}
     ),
     camera_in_listings AS (
         SELECT DISTINCT id, state
         FROM listings
-        WHERE LOWER(description) LIKE '%camera%'
-           OR LOWER(host_about) LIKE '%camera%'
-           OR LOWER(amenities) LIKE '%camera%'
+        WHERE {listing_mentions_camera}
     ),
     secret_camera_listings AS (
         SELECT c.listing_id, c.state
@@ -144,7 +184,7 @@ secret_cameras_query = """
     LIMIT 1
 """
 
-secret_cameras = con.execute(secret_cameras_query).fetchone()
+secret_cameras = time_query("Secret cameras", secret_cameras_query)
 print(f"{secret_cameras[0]}")
 print(f"{secret_cameras[1]}")
 
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Benchmark ingest and every challenge query, with machine-readable baselines.
+
+Each measured run is a separate process, so peak RSS and bytes read come
+from that process alone (``os.wait4`` rusage). Runs come in two flavours:
+
+- cold: the OS page cache is dropped before each run (needs root; otherwise
+  a cold run is only a fresh process and the report says so)
+- warm: a discarded warm-up run first, then the measured runs
+
+Ingest runs ``preprocess.py`` and ``preprocess_fast.py`` from scratch in a
+temporary directory of symlinks to the CSV files, so the real ``airbnb.db``
+is never touched. Query runs execute the challenge scripts against the
+database in the data directory, with the query result cache disabled, and
+use the ``Execution time`` each script prints (connect + query, without
+interpreter start-up) as the latency.
+
+Results go to a JSON file (p50/p95/mean latency, peak RSS, bytes read,
+rows/sec per benchmark and mode) and can be compared against a stored
+baseline; any p50 slower than the baseline by more than --threshold is a
+regression and makes the run exit non-zero.
+
+Usage:
+    python3 benchmark.py --save-baseline                 # record benchmark_baseline.json
+    python3 benchmark.py --baseline benchmark_baseline.json --threshold 0.10
+    python3 benchmark.py --skip-ingest --repeat 10 top_host secret_cameras
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import duckdb
+
+from db import connect
+from schema import find_csv_files
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+INGEST_SCRIPTS = ["preprocess.py", "preprocess_fast.py"]
+
+# Challenge script -> tables it reads (their row counts give rows/sec)
+QUERY_SCRIPTS = {
+    "count_rows": ("listings", "reviews"),
+    "count_unique": ("listings", "reviews"),
+    "state_analysis": ("listings",),
+    "top_host": ("listings", "reviews"),
+    "camera_listings": ("listings",),
+    "top_camera_states": ("reviews",),
+    "secret_cameras": ("listings", "reviews"),
+}
+
+EXECUTION_TIME = re.compile(r"Execution time: ([0-9.]+) seconds")
+BLOCK_BYTES = 512  # Unit of ru_inblock
+
+
+def drop_page_cache() -> bool:
+    """Flush and drop the OS page cache; False when not permitted."""
+    try:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except OSError:
+        return False
+
+
+def run_process(command: List[str], cwd: str, env: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Run a command to completion and measure it.
+
+    Returns:
+        Dict with wall seconds, peak RSS bytes, bytes read from storage and output
+    """
+    with tempfile.TemporaryFile(mode='w+') as output:
+        start_time = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, env=env, stdout=output, stderr=subprocess.STDOUT)
+        # wait4 reports the rusage of this child only (getrusage would mix all children)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start_time
+        process.returncode = os.waitstatus_to_exitcode(status)
+        output.seek(0)
+        text = output.read()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} exited with {process.returncode}:\n{text[-2000:]}")
+
+    return {
+        "wall_seconds": wall,
+        "peak_rss_bytes": usage.ru_maxrss * 1024,  # KB on Linux
+        "bytes_read": usage.ru_inblock * BLOCK_BYTES,
+        "output": text,
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linearly interpolated percentile (pct in 0-100) of a non-empty list."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(runs: List[Dict], rows: int) -> Dict:
+    """Aggregate measured runs of one benchmark and mode."""
+    latencies = [run["seconds"] for run in runs]
+    p50 = percentile(latencies, 50)
+    return {
+        "runs": len(runs),
+        "latencies": latencies,
+        "p50_seconds": p50,
+        "p95_seconds": percentile(latencies, 95),
+        "mean_seconds": statistics.mean(latencies),
+        "peak_rss_bytes": max(run["peak_rss_bytes"] for run in runs),
+        "bytes_read": statistics.median(run["bytes_read"] for run in runs),
+        "rows": rows,
+        "rows_per_second": rows / p50 if p50 > 0 else None,
+    }
+
+
+def measure(run_once, repeat: int, rows_of=None) -> Dict:
+    """
+    Measure a benchmark cold and warm.
+
+    Args:
+        run_once: Callable performing one run and returning its measurements
+        repeat: Measured runs per mode
+        rows_of: Callable giving the rows processed (default: fixed per run)
+
+    Returns:
+        Dict of mode -> summary
+    """
+    cold = []
+    for _ in range(repeat):
+        drop_page_cache()
+        cold.append(run_once())
+
+    run_once()  # warm-up
+    warm = [run_once() for _ in range(repeat)]
+
+    rows = rows_of() if rows_of else cold[0].get("rows", 0)
+    return {"cold": summarize(cold, rows), "warm": summarize(warm, rows)}
+
+
+def ingest_once(script: str, csv_files: List[str]) -> Dict:
+    """Run one from-scratch ingest in a scratch directory; return its measurements."""
+    work_dir = tempfile.mkdtemp(prefix="airbnb_bench_")
+    try:
+        for file_path in csv_files:
+            os.symlink(file_path, os.path.join(work_dir, os.path.basename(file_path)))
+        result = run_process([sys.executable, os.path.join(SCRIPT_DIR, script)], work_dir)
+        result["seconds"] = result["wall_seconds"]
+
+        con = duckdb.connect(os.path.join(work_dir, 'airbnb.db'), read_only=True)
+        result["rows"] = con.execute(
+            "SELECT (SELECT COUNT(*) FROM listings) + (SELECT COUNT(*) FROM reviews)"
+        ).fetchone()[0]
+        con.close()
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def query_once(name: str) -> Dict:
+    """Run one challenge script against the data directory; return its measurements."""
+    # Bypass the query result cache, so every run measures the query itself
+    result = run_process([sys.executable, os.path.join(SCRIPT_DIR, f"{name}.py")], os.getcwd(),
+                         env=dict(os.environ, AIRBNB_CACHE='0'))
+    match = EXECUTION_TIME.search(result["output"])
+    result["seconds"] = float(match.group(1)) if match else result["wall_seconds"]
+    return result
+
+
+def table_rows() -> Dict[str, int]:
+    """Row counts of the tables the queries read."""
+    con = connect()
+    counts = {table_name: con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+              for table_name in ("listings", "reviews")}
+    con.close()
+    return counts
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Compare p50 latencies against a baseline.
+
+    Returns:
+        Descriptions of the benchmarks slower than baseline * (1 + threshold)
+    """
+    regressions = []
+    print(f"\n{'benchmark':<32}{'mode':<6}{'baseline p50':>14}{'current p50':>14}{'change':>10}")
+    for name, modes in results.items():
+        for mode, summary in modes.items():
+            previous = baseline.get(name, {}).get(mode)
+            if previous is None:
+                continue
+            change = summary["p50_seconds"] / previous["p50_seconds"] - 1 if previous["p50_seconds"] else 0.0
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{name:<32}{mode:<6}{previous['p50_seconds']:>13.3f}s{summary['p50_seconds']:>13.3f}s"
+                  f"{change:>+10.1%}{flag}")
+            if flag:
+                regressions.append(f"{name} ({mode}): {change:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest and the challenge queries.")
+    parser.add_argument('queries', nargs='*',
+                        help=f"Queries to run (default: all of {', '.join(QUERY_SCRIPTS)})")
+    parser.add_argument('--data-dir', default='.', help="Directory with the CSV files and airbnb.db (default: .)")
+    parser.add_argument('--repeat', type=int, default=5, help="Measured query runs per mode (default: 5)")
+    parser.add_argument('--ingest-repeat', type=int, default=1, help="Measured ingest runs per mode (default: 1)")
+    parser.add_argument('--skip-ingest', action='store_true', help="Only benchmark the queries")
+    parser.add_argument('--skip-queries', action='store_true', help="Only benchmark ingest")
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help="Where to write the results (default: benchmark_results.json)")
+    parser.add_argument('--baseline', help="Baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Allowed p50 slowdown versus the baseline before failing (default: 0.10)")
+    parser.add_argument('--save-baseline', nargs='?', const='benchmark_baseline.json',
+                        help="Also store the results as the baseline (default: benchmark_baseline.json)")
+    args = parser.parse_args()
+    unknown = [name for name in args.queries if name not in QUERY_SCRIPTS]
+    if unknown:
+        parser.error(f"unknown queries: {', '.join(unknown)}")
+    output_paths = [os.path.abspath(path) for path in (args.output, args.save_baseline) if path]
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(args.data_dir)
+
+    can_drop_cache = drop_page_cache()
+    if not can_drop_cache:
+        print("Note: cannot drop the page cache (needs root); cold runs only use a fresh process")
+
+    results = {}
+
+    if not args.skip_ingest:
+        csv_files = [os.path.abspath(path) for path in find_csv_files('listings') + find_csv_files('reviews')]
+        for script in INGEST_SCRIPTS:
+            print(f"Benchmarking ingest: {script} ({args.ingest_repeat} run(s) per mode)...")
+            results[f"ingest:{script}"] = measure(lambda: ingest_once(script, csv_files), args.ingest_repeat)
+
+    if not args.skip_queries:
+        rows = table_rows()
+        for name in args.queries or list(QUERY_SCRIPTS):
+            print(f"Benchmarking query: {name} ({args.repeat} runs per mode)...")
+            results[f"query:{name}"] = measure(
+                lambda: query_once(name), args.repeat,
+                rows_of=lambda: sum(rows[table_name] for table_name in QUERY_SCRIPTS[name]),
+            )
+
+    print(f"\n{'benchmark':<32}{'mode':<6}{'p50':>10}{'p95':>10}{'peak RSS':>12}{'read':>12}{'rows/sec':>14}")
+    for name, modes in results.items():
+        for mode, summary in modes.items():
+            print(f"{name:<32}{mode:<6}{summary['p50_seconds']:>9.3f}s{summary['p95_seconds']:>9.3f}s"
+                  f"{summary['peak_rss_bytes'] / 1024 ** 2:>10.0f}MB{summary['bytes_read'] / 1024 ** 2:>10.1f}MB"
+                  f"{summary['rows_per_second'] or 0:>14,.0f}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "host": platform.node(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "repeat": args.repeat,
+            "ingest_repeat": args.ingest_repeat,
+            "page_cache_dropped": can_drop_cache,
+        },
+        "results": results,
+    }
+    for path in output_paths:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {path}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,19 @@
-import duckdb
+from query_cache import connect_cached
+from keywords import mention_filter
 import time
 
 start_time = time.time()
 
-con = duckdb.connect('airbnb.db')
+con = connect_cached()
+
+# Precomputed flag column when ingest created one, LIKE scan otherwise
+listing_mentions_camera = mention_filter(con, 'listings', 'camera')
 
 # Count unique listings mentioning camera
-camera_listings = con.execute("""
+camera_listings = con.execute(f"""
     SELECT COUNT(DISTINCT id)
     FROM listings
-    WHERE LOWER(description) LIKE '%camera%'
-       OR LOWER(host_about) LIKE '%camera%'
-       OR LOWER(amenities) LIKE '%camera%'
+    WHERE {listing_mentions_camera}
 """).fetchone()[0]
 
 print(camera_listings)
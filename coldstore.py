@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Vertical split of the wide text columns into a compressed cold store.
+
+Descriptions, host bios, URLs, amenity lists, review comments and reviewer
+names are most of the bytes of ``listings`` and ``reviews``, yet only the
+keyword flags, amenity bitmaps and text index ever read them. This optional
+post-ingest stage (``--split-text``) moves COLD_COLUMNS out of the tables:
+
+    cold_text/<table>/file_id=<n>/*.parquet    (text_id, <cold columns>)
+        zstd Parquet, one partition per ingested file
+    listings / reviews
+        keep every column; the cold ones are NULL for moved rows, which
+        carry the ``text_id`` of their cold row instead
+    listings_full / reviews_full
+        views joining the two back on (file_id, text_id), with every column
+        under its original name
+
+The counting and grouping queries keep reading ``listings`` and ``reviews``
+directly. Code that needs the text asks text_source() which relation to read,
+or wraps its condition in text_predicate() to keep selecting from the table.
+
+A moved row's text_id is its rowid at the time of the split, which is
+unique within its file. Rows loaded since the last split have a NULL
+text_id and still hold their text, so the views show them unchanged and the
+next split moves them. Reloading a file replaces all of its rows, so its
+partition is rewritten whole; until then the old partition matches no row.
+"""
+
+import glob
+import os
+import shutil
+import time
+
+import duckdb
+
+from db import connect
+
+TEXT_DIR = os.environ.get('AIRBNB_TEXT_DIR', 'cold_text')
+
+# Table -> columns moved to the cold store
+COLD_COLUMNS = {
+    "listings": (
+        "listing_url", "description", "neighborhood_overview", "picture_url", "host_url",
+        "host_about", "host_thumbnail_url", "host_picture_url", "amenities",
+    ),
+    "reviews": ("reviewer_name", "comments"),
+}
+
+FULL_VIEWS = {
+    "listings": "listings_full",
+    "reviews": "reviews_full",
+}
+
+
+def cold_glob(table_name: str, text_dir: str = TEXT_DIR) -> str:
+    """Glob matching every cold store file of a table."""
+    return os.path.join(text_dir, table_name, 'file_id=*', '*.parquet')
+
+
+def is_split(con: duckdb.DuckDBPyConnection, table_name: str) -> bool:
+    """Whether a table's text has been split off (its full view exists)."""
+    return con.execute("""
+        SELECT COUNT(*) FROM duckdb_views()
+        WHERE database_name = current_database() AND schema_name = 'main' AND view_name = ?
+    """, [FULL_VIEWS[table_name]]).fetchone()[0] > 0
+
+
+def text_source(con: duckdb.DuckDBPyConnection, table_name: str) -> str:
+    """Relation to read a table's text columns from: its full view once split, otherwise the table."""
+    return FULL_VIEWS[table_name] if is_split(con, table_name) else table_name
+
+
+def text_predicate(con: duckdb.DuckDBPyConnection, table_name: str, expression: str,
+                   text_dir: str = TEXT_DIR) -> str:
+    """
+    Condition on a table's text columns that still works in ``FROM <table>``.
+
+    Once the table is split, moved rows match through their cold store row
+    and rows loaded since the split through their own columns; otherwise the
+    expression is returned unchanged.
+    """
+    if not is_split(con, table_name):
+        return expression
+    return f"""((text_id IS NULL AND {expression}) OR (file_id, text_id) IN (
+        SELECT (file_id, text_id) FROM read_parquet('{cold_glob(table_name, text_dir)}', hive_partitioning = true)
+        WHERE {expression}
+    ))"""
+
+
+def create_full_view(con: duckdb.DuckDBPyConnection, table_name: str, text_dir: str = TEXT_DIR):
+    """(Re)create a table's full view over the table and its cold store."""
+    restored = ", ".join(f"COALESCE(c.{column}, h.{column}) AS {column}" for column in COLD_COLUMNS[table_name])
+    con.execute(f"""
+        CREATE OR REPLACE VIEW {FULL_VIEWS[table_name]} AS
+        SELECT h.* REPLACE ({restored})
+        FROM {table_name} h
+        LEFT JOIN read_parquet('{cold_glob(table_name, text_dir)}', hive_partitioning = true) c
+          ON c.file_id = h.file_id AND c.text_id = h.text_id
+    """)
+
+
+def split_table(con: duckdb.DuckDBPyConnection, table_name: str, text_dir: str = TEXT_DIR) -> tuple:
+    """
+    Move the text of rows loaded since the last split to the cold store.
+
+    The pending rows' cold columns are written to their files' partitions,
+    then the table is rewritten (in its current order) with those columns
+    NULL and text_id set, and swapped in by rename in one transaction.
+    Indexes on the table are recreated after the swap.
+
+    Returns:
+        (files moved, rows moved, cold store bytes of those files)
+    """
+    con.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS text_id BIGINT")
+    pending = [row[0] for row in con.execute(f"""
+        SELECT DISTINCT file_id FROM {table_name}
+        WHERE text_id IS NULL AND file_id IS NOT NULL
+        ORDER BY file_id
+    """).fetchall()]
+    if not pending:
+        return 0, 0, 0
+
+    id_list = ", ".join(str(file_id) for file_id in pending)
+    moved = f"text_id IS NULL AND file_id IN ({id_list})"
+    output_dir = os.path.join(text_dir, table_name)
+    for file_id in pending:
+        # Whatever is there is from an earlier version of the file
+        shutil.rmtree(os.path.join(output_dir, f"file_id={file_id}"), ignore_errors=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    index_sql = [row[0] for row in con.execute(
+        "SELECT sql FROM duckdb_indexes() WHERE database_name = current_database() AND table_name = ?",
+        [table_name],
+    ).fetchall()]
+    cleared = ", ".join(f"CASE WHEN {moved} THEN NULL ELSE {column} END AS {column}"
+                        for column in COLD_COLUMNS[table_name])
+    staging = f"{table_name}_split"
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        rows = con.execute(f"""
+            COPY (
+                SELECT file_id, rowid AS text_id, {', '.join(COLD_COLUMNS[table_name])}
+                FROM {table_name} WHERE {moved}
+            ) TO '{output_dir}' (FORMAT parquet, COMPRESSION zstd, PARTITION_BY (file_id), OVERWRITE_OR_IGNORE)
+        """).fetchone()[0]
+        con.execute(f"DROP TABLE IF EXISTS {staging}")
+        con.execute(f"""
+            CREATE TABLE {staging} AS
+            SELECT * REPLACE ({cleared}, CASE WHEN {moved} THEN rowid ELSE text_id END AS text_id)
+            FROM {table_name}
+        """)
+        con.execute(f"DROP TABLE {table_name}")
+        con.execute(f"ALTER TABLE {staging} RENAME TO {table_name}")
+        for sql in index_sql:
+            con.execute(sql)
+        create_full_view(con, table_name, text_dir)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+    cold_bytes = sum(os.path.getsize(path) for file_id in pending
+                     for path in glob.glob(os.path.join(output_dir, f"file_id={file_id}", '*.parquet')))
+    return len(pending), rows, cold_bytes
+
+
+def split_text(con: duckdb.DuckDBPyConnection, table_name: str):
+    """Split a table's pending text off and print what moved."""
+    print(f"Moving {table_name} text to {os.path.join(TEXT_DIR, table_name)}/...")
+    start_time = time.time()
+    files, rows, cold_bytes = split_table(con, table_name)
+    if files:
+        print(f"Moved the text of {rows:,} {table_name} rows from {files} files in "
+              f"{time.time() - start_time:.2f} seconds ({cold_bytes / 1024 ** 2:,.1f} MB of zstd Parquet)")
+    else:
+        print(f"No {table_name} rows loaded since the last split")
+
+
+def apply_text_split(con: duckdb.DuckDBPyConnection, split: bool):
+    """
+    Move the text of newly loaded rows to the cold store after an ingest run.
+
+    Args:
+        con: DuckDB connection to airbnb.db
+        split: Split the text off (otherwise nothing is done)
+    """
+    if not split:
+        return
+    for table_name in COLD_COLUMNS:
+        split_text(con, table_name)
+
+
+if __name__ == "__main__":
+    # Split the text off an existing airbnb.db
+    con = connect()
+    apply_text_split(con, True)
+    con.close()
@@ -1,9 +1,9 @@
-import duckdb
+from query_cache import connect_cached
 import time
 
 start_time = time.time()
 
-con = duckdb.connect('airbnb.db')
+con = connect_cached()
 
 # Count the number of rows across all the listings
 listings_count = con.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
@@ -1,21 +1,40 @@
-import duckdb
+from dedup import has_canonical
+from query_cache import connect_cached
+from sketches import approx_distinct
+import argparse
 import time
 
+parser = argparse.ArgumentParser(description="Count unique listings, reviews and reviewers.")
+parser.add_argument('--approx', action='store_true',
+                    help="Estimate from HyperLogLog sketches instead of exact COUNT(DISTINCT), with a ~95%% error bound")
+args = parser.parse_args()
+
 start_time = time.time()
 
-con = duckdb.connect('airbnb.db')
+con = connect_cached()
 
-# Count the number of unique listings by the "id" field across all the listings
-unique_listings = con.execute("SELECT COUNT(DISTINCT id) FROM listings").fetchone()[0]
-print(unique_listings)
+if args.approx:
+    # Merge the per-file sketches; each line is "estimate ± bound"
+    for table_name, column in [("listings", "id"), ("reviews", "id"), ("reviews", "reviewer_id")]:
+        _, estimate, bound = approx_distinct(con, table_name, column)[0]
+        print(f"{estimate} ± {bound}")
+elif has_canonical(con, "listings") and has_canonical(con, "reviews"):
+    # The canonical tables hold one row per id, so rows are unique ids
+    print(con.execute("SELECT COUNT(*) FROM listings_canonical").fetchone()[0])
+    print(con.execute("SELECT COUNT(*) FROM reviews_canonical").fetchone()[0])
+    print(con.execute("SELECT COUNT(DISTINCT reviewer_id) FROM reviews_canonical").fetchone()[0])
+else:
+    # Count the number of unique listings by the "id" field across all the listings
+    unique_listings = con.execute("SELECT COUNT(DISTINCT id) FROM listings").fetchone()[0]
+    print(unique_listings)
 
-# Count the number of unique reviews by the "id" field across all the reviews
-unique_reviews = con.execute("SELECT COUNT(DISTINCT id) FROM reviews").fetchone()[0]
-print(unique_reviews)
+    # Count the number of unique reviews by the "id" field across all the reviews
+    unique_reviews = con.execute("SELECT COUNT(DISTINCT id) FROM reviews").fetchone()[0]
+    print(unique_reviews)
 
-# Count the number of unique reviewers by the "reviewer_id" field across all the reviews
-unique_reviewers = con.execute("SELECT COUNT(DISTINCT reviewer_id) FROM reviews").fetchone()[0]
-print(unique_reviewers)
+    # Count the number of unique reviewers by the "reviewer_id" field across all the reviews
+    unique_reviewers = con.execute("SELECT COUNT(DISTINCT reviewer_id) FROM reviews").fetchone()[0]
+    print(unique_reviewers)
 
 con.close()
 
@@ -0,0 +1,93 @@
+"""
+Connection helper used by the query scripts.
+
+Two storage backends are supported:
+
+- ``duckdb``  (default): the ``airbnb.db`` file built by preprocess.py
+- ``parquet``: the Hive-partitioned Parquet staging directory written by
+  ``preprocess.py --format parquet``; ``listings`` and ``reviews`` are
+  exposed as views so the same SQL runs unchanged, and filters on
+  ``state`` skip whole partitions.
+
+Select the backend with the AIRBNB_BACKEND environment variable
+(``AIRBNB_DB`` and ``AIRBNB_PARQUET_DIR`` override the default locations).
+Connections get threads, memory limit and spill directory sized to the host
+by resources.py.
+"""
+
+import os
+
+import duckdb
+
+from resources import configure
+from schema import TABLES, csv_stem
+
+DB_PATH = os.environ.get('AIRBNB_DB', 'airbnb.db')
+PARQUET_DIR = os.environ.get('AIRBNB_PARQUET_DIR', 'parquet')
+BACKEND = os.environ.get('AIRBNB_BACKEND', 'duckdb')
+
+
+def parquet_glob(table_name: str, parquet_dir: str = PARQUET_DIR) -> str:
+    """Glob matching every Parquet file of a table in the staging directory."""
+    return os.path.join(parquet_dir, table_name, 'state=*', '*.parquet')
+
+
+def parquet_path(parquet_dir: str, table_name: str, state_code: str, file_path: str) -> str:
+    """Staging file for one CSV, e.g. parquet/listings/state=NY/albany_ny_listings.parquet."""
+    stem = os.path.basename(csv_stem(file_path))
+    return os.path.join(parquet_dir, table_name, f"state={state_code}", f"{stem}.parquet")
+
+
+def attach_parquet(con: duckdb.DuckDBPyConnection, parquet_dir: str = PARQUET_DIR):
+    """Create ``listings``/``reviews`` views over the Parquet staging directory."""
+    for table_name in TABLES:
+        con.execute(f"""
+            CREATE OR REPLACE VIEW {table_name} AS
+            SELECT * FROM read_parquet('{parquet_glob(table_name, parquet_dir)}',
+                                       hive_partitioning = true)
+        """)
+
+
+def database_bytes(con: duckdb.DuckDBPyConnection) -> int:
+    """Bytes of storage currently used by the database file."""
+    con.execute("CHECKPOINT")
+    used_blocks, block_size = con.execute(
+        "SELECT used_blocks, block_size FROM pragma_database_size()"
+    ).fetchone()
+    return used_blocks * block_size
+
+
+def connect(backend: str = None, read_only: bool = False) -> duckdb.DuckDBPyConnection:
+    """
+    Open a connection exposing the ``listings`` and ``reviews`` tables.
+
+    Args:
+        backend: 'duckdb' or 'parquet' (defaults to AIRBNB_BACKEND)
+        read_only: Attach airbnb.db read-only (to an in-memory database, which
+            can still attach scratch databases), so other read-only processes
+            can open it at the same time; the Parquet backend never writes
+
+    Returns:
+        DuckDB connection
+    """
+    backend = backend or BACKEND
+
+    if backend == 'duckdb' and read_only:
+        con = duckdb.connect()
+        configure(con)
+        con.execute(f"ATTACH '{DB_PATH}' AS airbnb (READ_ONLY)")
+        con.execute("USE airbnb")
+        return con
+
+    if backend == 'duckdb':
+        con = duckdb.connect(DB_PATH)
+        configure(con)
+        return con
+
+    if backend == 'parquet':
+        con = duckdb.connect()
+        configure(con)
+        attach_parquet(con)
+        return con
+
+    raise ValueError(f"Unknown backend: {backend!r} (expected 'duckdb' or 'parquet')")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Deduplicated canonical tables, so queries can count rows instead of ids.
+
+Listing ids (and their reviews) repeat across city files where metro areas
+overlap, which is why the questions use ``COUNT(DISTINCT id)``. After ingest,
+this stage builds for each table:
+
+    listings_canonical / reviews_canonical
+        one row per id, sorted by id
+    listing_id_states / review_id_states   (id, state, rows, <flag columns>)
+        the duplicate mapping: one row per id and state it was seen in, with
+        the number of copies and each keyword flag OR-ed over them
+
+Tie-break: the copy with the latest ``last_scraped`` (listings) or ``date``
+(reviews) wins, then the one from the most recently registered file (highest
+file_id). The canonical row is that copy unchanged, so its state, host and
+text are those of one real file row (after ``--split-text`` its text is in
+the cold store under the row's file_id and text_id).
+
+``dedup_summary`` records per table the rows, unique ids, ids seen in more
+than one state, and ids whose copies disagree on CONFLICT_KEYS (a listing
+under several hosts, a review under several listings), which the tie-break
+would hide.
+
+With these, the questions count rows:
+
+- unique listings/reviews: ``COUNT(*)`` of the canonical table
+- distinct ids per state, and per-state keyword mentions: ``COUNT(*)`` over
+  the id-state mapping, which is exact even for ids seen in several states
+- the host leaderboard: one canonical row per review, joined to the
+  distinct (listing, host) pairs, when no review id spans listings
+
+Loading a file drops its table's canonical tables in the load transaction,
+so they are never stale; the next ``--dedup`` preprocessing run (or
+``python3 dedup.py``) rebuilds them.
+"""
+
+import time
+
+import duckdb
+
+from db import connect
+from keywords import WATCHED_KEYWORDS, flag_column, table_columns
+
+CANONICAL_TABLES = {
+    "listings": "listings_canonical",
+    "reviews": "reviews_canonical",
+}
+
+ID_STATE_TABLES = {
+    "listings": "listing_id_states",
+    "reviews": "review_id_states",
+}
+
+# Table -> ORDER BY picking the surviving copy of an id (first wins)
+TIE_BREAK = {
+    "listings": "last_scraped DESC NULLS LAST, file_id DESC",
+    "reviews": "date DESC NULLS LAST, file_id DESC",
+}
+
+# Table -> column the copies of an id should agree on
+CONFLICT_KEYS = {
+    "listings": "host_id",
+    "reviews": "listing_id",
+}
+
+
+def has_canonical(con: duckdb.DuckDBPyConnection, table_name: str) -> bool:
+    """Whether a table's canonical and id-state tables exist (and so are current)."""
+    return con.execute(f"""
+        SELECT COUNT(*) FROM duckdb_tables()
+        WHERE database_name = current_database() AND schema_name = 'main'
+          AND table_name IN ('{CANONICAL_TABLES[table_name]}', '{ID_STATE_TABLES[table_name]}')
+    """).fetchone()[0] == 2
+
+
+def drop_canonical(con: duckdb.DuckDBPyConnection, table_name: str):
+    """
+    Drop a table's canonical tables because its rows changed.
+
+    Called inside each file's load transaction, so a committed load never
+    leaves them out of date.
+    """
+    con.execute(f"DROP TABLE IF EXISTS {CANONICAL_TABLES[table_name]}")
+    con.execute(f"DROP TABLE IF EXISTS {ID_STATE_TABLES[table_name]}")
+
+
+def build_canonical(con: duckdb.DuckDBPyConnection, table_name: str):
+    """(Re)build a table's canonical and id-state tables and its summary row in one transaction."""
+    columns = table_columns(con, table_name)
+    flags = "".join(
+        f", bool_or({flag_column(keyword)}) AS {flag_column(keyword)}"
+        for keyword in WATCHED_KEYWORDS if flag_column(keyword) in columns
+    )
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        drop_canonical(con, table_name)
+        con.execute(f"""
+            CREATE TABLE {CANONICAL_TABLES[table_name]} AS
+            SELECT DISTINCT ON (id) * FROM {table_name}
+            ORDER BY id, {TIE_BREAK[table_name]}
+        """)
+        con.execute(f"""
+            CREATE TABLE {ID_STATE_TABLES[table_name]} AS
+            SELECT id, state, COUNT(*) AS rows{flags}
+            FROM {table_name}
+            GROUP BY id, state
+        """)
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS dedup_summary (
+                table_name TEXT,
+                rows BIGINT,
+                unique_ids BIGINT,
+                multi_state_ids BIGINT,
+                conflicting_ids BIGINT,
+                built_at TIMESTAMP
+            )
+        """)
+        con.execute("DELETE FROM dedup_summary WHERE table_name = ?", [table_name])
+        con.execute(f"""
+            INSERT INTO dedup_summary
+            SELECT ?, SUM(rows), COUNT(*), COUNT(*) FILTER (WHERE states > 1),
+                   (SELECT COUNT(*) FROM (
+                        SELECT id FROM {table_name} GROUP BY id
+                        HAVING COUNT(DISTINCT {CONFLICT_KEYS[table_name]}) > 1
+                    )),
+                   current_timestamp
+            FROM (
+                SELECT id, SUM(rows) AS rows, COUNT(*) AS states
+                FROM {ID_STATE_TABLES[table_name]}
+                GROUP BY id
+            )
+        """, [table_name])
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+
+def dedup_stats(con: duckdb.DuckDBPyConnection, table_name: str) -> tuple:
+    """(rows, unique ids, ids in more than one state, ids with conflicting copies) of a deduplicated table."""
+    return con.execute("""
+        SELECT rows, unique_ids, multi_state_ids, conflicting_ids
+        FROM dedup_summary WHERE table_name = ?
+    """, [table_name]).fetchone()
+
+
+def joins_exactly(con: duckdb.DuckDBPyConnection, table_name: str) -> bool:
+    """
+    Whether a table's canonical rows can stand in for all its copies in joins.
+
+    True when it is deduplicated and no id's copies disagree on its
+    CONFLICT_KEYS column (e.g. every review id belongs to one listing).
+    """
+    return has_canonical(con, table_name) and dedup_stats(con, table_name)[3] == 0
+
+
+def dedup_table(con: duckdb.DuckDBPyConnection, table_name: str):
+    """Build a table's canonical tables and print what deduplication found."""
+    print(f"Deduplicating {table_name} by id...")
+    start_time = time.time()
+    build_canonical(con, table_name)
+    rows, ids, shared, conflicting = dedup_stats(con, table_name)
+    print(f"Deduplicated {table_name} in {time.time() - start_time:.2f} seconds: "
+          f"{rows or 0:,} rows, {ids:,} unique ids, {shared:,} ids in more than one state, "
+          f"{conflicting:,} ids with differing {CONFLICT_KEYS[table_name]}")
+
+
+def apply_dedup(con: duckdb.DuckDBPyConnection, dedup: bool):
+    """
+    Build the canonical tables that do not exist after an ingest run.
+
+    Args:
+        con: DuckDB connection to airbnb.db
+        dedup: Build them (otherwise nothing is done)
+    """
+    if not dedup:
+        return
+    for table_name in CANONICAL_TABLES:
+        if not has_canonical(con, table_name):
+            dedup_table(con, table_name)
+
+
+if __name__ == "__main__":
+    # Rebuild both tables' canonical tables in an existing airbnb.db
+    con = connect()
+    for table_name in CANONICAL_TABLES:
+        dedup_table(con, table_name)
+    con.close()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic, Airbnb-shaped dataset at a configurable scale.
+
+Writes ``<city>_<st>_listings.csv`` / ``<city>_<st>_reviews.csv`` pairs (optionally
+gzip- or zstd-compressed, as ``.csv.gz`` / ``.csv.zst``) with
+exactly the CSV columns of the ``listings``/``reviews`` tables in schema.py,
+in the same text formats as the real files (``t``/``f`` booleans,
+``$1,234.00`` prices, ``95%`` rates, JSON-ish amenity lists, quoted
+multi-line text), so every preprocessing and query path can run offline.
+
+Scale 1.0 approximates the real dataset: 34 cities, ~1.4M listings and ~68M
+reviews (~22GB). The shapes that matter for performance are reproduced:
+
+- city sizes are skewed (New York City and Los Angeles dominate)
+- reviews per listing are heavy-tailed; many listings have none
+- hosts own a heavy-tailed number of listings
+- a fraction of listing ids reappear in a neighbouring city's file
+- descriptions, host_about and comments are long, with commas, quotes and newlines
+- a controllable fraction of text mentions a camera
+
+Rows are generated by DuckDB in parallel. Values are derived from
+``hash(row, salt)``, so a given seed and scale always produce the same files.
+
+Usage:
+    python3 generate_data.py --scale 0.01 --output-dir data_small
+    python3 generate_data.py --scale 0.1 --cities 8 --camera-rate 0.02
+    python3 generate_data.py --scale 0.01 --compress zstd
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Optional
+
+import duckdb
+
+from resources import configure
+from schema import csv_columns
+
+FULL_SCALE_LISTINGS = 1_400_000
+REVIEWS_PER_LISTING = 48.5  # ~68M reviews at scale 1.0
+REVIEWED_SHARE = 0.8  # Listings with at least one review
+
+# --compress choice -> file name suffix added after .csv
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+MIN_SCALE, MAX_SCALE = 0.01, 2.0
+CORPUS_WORDS = 50_000
+
+# (city, state, share of all listings); file names follow the real dataset
+CITIES = [
+    ("new_york_city", "ny", 0.135), ("los_angeles", "ca", 0.125), ("hawaii", "hi", 0.060),
+    ("clark_county", "nv", 0.050), ("broward_county", "fl", 0.045), ("austin", "tx", 0.042),
+    ("chicago", "il", 0.035), ("san_diego", "ca", 0.035), ("washington", "dc", 0.030),
+    ("nashville", "tn", 0.030), ("dallas", "tx", 0.028), ("seattle", "wa", 0.025),
+    ("san_francisco", "ca", 0.025), ("new_orleans", "la", 0.025), ("denver", "co", 0.022),
+    ("boston", "ma", 0.020), ("twin_cities", "mn", 0.020), ("asheville", "nc", 0.018),
+    ("portland", "or", 0.018), ("santa_clara_county", "ca", 0.018), ("fort_worth", "tx", 0.017),
+    ("rhode_island", "ri", 0.016), ("santa_cruz_county", "ca", 0.015), ("jersey_city", "nj", 0.014),
+    ("columbus", "oh", 0.014), ("oakland", "ca", 0.013), ("san_mateo_county", "ca", 0.013),
+    ("newark", "nj", 0.012), ("bozeman", "mt", 0.012), ("pacific_grove", "ca", 0.010),
+    ("cambridge", "ma", 0.009), ("salem", "or", 0.008), ("rochester", "ny", 0.008),
+    ("albany", "ny", 0.007),
+]
+
+WORDS = [
+    "cozy", "spacious", "bright", "quiet", "modern", "charming", "private", "downtown", "walk",
+    "minutes", "beach", "park", "kitchen", "bedroom", "bathroom", "balcony", "view", "coffee",
+    "restaurants", "shops", "parking", "wifi", "workspace", "family", "friendly", "host",
+    "clean", "comfortable", "stay", "great", "location", "close", "subway", "bus", "airport",
+    "historic", "neighborhood", "garden", "patio", "pool", "hot", "tub", "fireplace", "queen",
+    "king", "bed", "sofa", "towels", "linens", "check-in", "self", "keypad", "responsive",
+    "recommend", "again", "perfect", "lovely", "amazing", "would", "definitely", "easy",
+]
+AMENITIES = [
+    "Wifi", "Kitchen", "Heating", "Air conditioning", "Washer", "Dryer", "Smoke alarm",
+    "Carbon monoxide alarm", "Hair dryer", "Iron", "Hangers", "Dedicated workspace",
+    "Free parking on premises", "Self check-in", "Coffee maker", "Dishwasher", "Microwave",
+    "Refrigerator", "Hot water", "Essentials", "TV", "Pool", "Hot tub", "Gym",
+]
+CAMERA_PHRASES = [
+    "there is a security camera at the front door",
+    "noticed a camera in the living room",
+    "the listing mentions an exterior camera",
+]
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Maria", "Wei", "Priya", "John", "Ana", "Chris"]
+
+PROPERTY_TYPES = ["Entire rental unit", "Private room in home", "Entire home", "Entire condo", "Room in hotel"]
+ROOM_TYPES = ["Entire home/apt", "Private room", "Shared room", "Hotel room"]
+VERIFICATIONS = ["['email', 'phone']", "['phone']", "['email', 'phone', 'work_email']"]
+
+
+def sql_list(values) -> str:
+    """SQL list literal of strings."""
+    return "[" + ", ".join("'" + value.replace("'", "''") + "'" for value in values) + "]"
+
+
+def create_macros(con: duckdb.DuckDBPyConnection, seed: int):
+    """
+    Deterministic per-row randomness and text helpers.
+
+    ``rnd(row, salt)`` is hash(row, salt) scaled to [0, 1). Free text is cut
+    from a shared corpus of CORPUS_WORDS random words (roughly one in eight
+    followed by a comma, one in 40 by a line break), which is much cheaper than
+    assembling every comment word by word.
+    """
+    con.execute(f"CREATE OR REPLACE MACRO rnd(i, salt) AS hash(i, salt, {seed})::DOUBLE / 18446744073709551616.0")
+    con.execute("CREATE OR REPLACE MACRO capitalize(s) AS upper(s[1]) || s[2:]")
+    con.execute("CREATE OR REPLACE MACRO pick(items, i, salt) AS items[1 + floor(rnd(i, salt) * len(items))::INTEGER]")
+
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(CORPUS_WORDS):
+        draw = rng.random()
+        corpus.append(rng.choice(WORDS) + (".\n" if draw < 0.025 else "," if draw < 0.15 else ""))
+    corpus_text = " ".join(corpus)
+    # A constant, so it is stored once rather than carried along every row
+    con.execute(f"CREATE OR REPLACE MACRO corpus_text() AS '{corpus_text}'")
+    # Roughly `n` words of text from a random offset in the corpus (may start mid-word)
+    con.execute(f"""
+        CREATE OR REPLACE MACRO words(i, salt, n) AS trim(substr(
+            corpus_text(),
+            1 + floor(rnd(i, salt) * ({len(corpus_text)} - 8 * n))::INTEGER,
+            (8 * n)::INTEGER
+        ))
+    """)
+
+
+def listing_expression(name: str, col_type: str, camera_rate: float) -> str:
+    """SQL expression generating one listings column for global row `i` (with `listing_id`, `host_id`)."""
+    camera = f"rnd(i, 'cam') < {camera_rate}"
+    special = {
+        "id": "listing_id",
+        "listing_url": "'https://www.airbnb.com/rooms/' || listing_id",
+        "scrape_id": "20240000000000 + hash(city_code) % 1000000",
+        "last_scraped": "DATE '2024-06-01' + floor(rnd(i, 'scraped') * 20)::INTEGER",
+        "source": "pick(['city scrape', 'previous scrape'], i, 'source')",
+        "name": "capitalize(words(i, 'name', 4 + rnd(i, 'name_len') * 5))",
+        "description": f"""words(i, 'desc', 20 + pow(rnd(i, 'desc_len'), 2) * 180)
+                           || CASE WHEN {camera} THEN ' Note: ' || pick({sql_list(CAMERA_PHRASES)}, i, 'cam') || '.' ELSE '' END""",
+        "neighborhood_overview": "CASE WHEN rnd(i, 'nb') < 0.6 THEN words(i, 'nb', 10 + rnd(i, 'nb_len') * 60) END",
+        "picture_url": "'https://a0.muscache.com/pictures/' || md5(listing_id::TEXT) || '.jpg'",
+        "host_id": "host_id",
+        "host_url": "'https://www.airbnb.com/users/show/' || host_id",
+        "host_name": f"pick({sql_list(FIRST_NAMES)}, host_id, 'host_name')",
+        "host_since": "DATE '2009-01-01' + floor(rnd(host_id, 'since') * 5400)::INTEGER",
+        "host_about": "CASE WHEN rnd(host_id, 'about') < 0.5 THEN words(host_id, 'about', 5 + pow(rnd(host_id, 'about_len'), 2) * 120) END",
+        "host_response_time": "pick(['within an hour', 'within a few hours', 'within a day', 'a few days or more'], host_id, 'rt')",
+        "host_response_rate": "CASE WHEN rnd(host_id, 'rr') < 0.85 THEN (50 + floor(rnd(host_id, 'rrv') * 51))::INTEGER || '%' ELSE 'N/A' END",
+        "host_acceptance_rate": "CASE WHEN rnd(host_id, 'ar') < 0.85 THEN (30 + floor(rnd(host_id, 'arv') * 71))::INTEGER || '%' ELSE 'N/A' END",
+        "host_verifications": f"pick({sql_list(VERIFICATIONS)}, host_id, 'verif')",
+        "latitude": "25 + rnd(i, 'lat') * 22",
+        "longitude": "-123 + rnd(i, 'lon') * 52",
+        "property_type": f"pick({sql_list(PROPERTY_TYPES)}, i, 'ptype')",
+        "room_type": f"pick({sql_list(ROOM_TYPES)}, i, 'rtype')",
+        "bathrooms_text": "(1 + floor(rnd(i, 'bath') * 3))::INTEGER || ' baths'",
+        "amenities": f"""'[' || array_to_string(list_transform(
+                               list_filter({sql_list(AMENITIES)}, a -> rnd(i, a) < 0.45)
+                               || CASE WHEN {camera} THEN ['Security cameras on property'] ELSE [] END,
+                               a -> '"' || a || '"'), ', ') || ']'""",
+        "price": "CASE WHEN rnd(i, 'price_null') < 0.1 THEN NULL ELSE printf('$%,.2f', floor(30 + pow(rnd(i, 'price'), 3) * 2000)) END",
+        "calendar_updated": "NULL",
+        "license": "CASE WHEN rnd(i, 'lic') < 0.4 THEN 'STR-' || (100000 + floor(rnd(i, 'licv') * 900000))::INTEGER END",
+    }
+    if name in special:
+        return special[name]
+    if name.startswith("neighbourhood") or name in ("host_location", "host_neighbourhood"):
+        return f"CASE WHEN rnd(i, '{name}') < 0.8 THEN capitalize(pick({sql_list(WORDS)}, i, '{name}')) END"
+    return generic_expression(name, col_type)
+
+
+def generic_expression(name: str, col_type: str) -> str:
+    """Type-shaped filler for columns no query looks at."""
+    if col_type in ("BIGINT", "INTEGER"):
+        return f"floor(pow(rnd(i, '{name}'), 2) * 365)::INTEGER"
+    if col_type == "DOUBLE":
+        return f"CASE WHEN rnd(i, '{name}_null') < 0.15 THEN NULL ELSE round(1 + rnd(i, '{name}') * 4, 2) END"
+    if col_type == "DATE":
+        return f"DATE '2015-01-01' + floor(rnd(i, '{name}') * 3400)::INTEGER"
+    if col_type == "BOOLEAN":
+        return f"CASE WHEN rnd(i, '{name}') < 0.5 THEN 't' ELSE 'f' END"
+    return f"capitalize(pick({sql_list(WORDS)}, i, '{name}'))"
+
+
+def review_expression(name: str, camera_rate: float) -> str:
+    """SQL expression generating one reviews column for global row `j` (with `listing_id`)."""
+    expressions = {
+        "listing_id": "listing_id",
+        "id": "review_id",
+        "date": "DATE '2010-01-01' + floor(sqrt(rnd(j, 'date')) * 5300)::INTEGER",
+        "reviewer_id": "1 + floor(rnd(j, 'reviewer') * reviewer_pool)::BIGINT",
+        "reviewer_name": f"pick({sql_list(FIRST_NAMES)}, j, 'reviewer_name')",
+        "comments": f"""CASE WHEN rnd(j, 'empty') < 0.01 THEN NULL ELSE
+                            words(j, 'comment', 3 + pow(rnd(j, 'comment_len'), 3) * 150)
+                            || CASE WHEN rnd(j, 'cam') < {camera_rate}
+                                    THEN ' ' || capitalize(pick({sql_list(CAMERA_PHRASES)}, j, 'cam_phrase')) || '!'
+                                    ELSE '' END
+                        END""",
+    }
+    return expressions[name]
+
+
+def city_plan(scale: float, city_count: int):
+    """
+    Per-city listing/review counts and id offsets.
+
+    Returns:
+        List of dicts with city, state, listings, reviews, listing_offset, review_offset
+    """
+    cities = CITIES[:city_count]
+    plan = []
+    listing_offset = review_offset = 0
+    for city, state, share in cities:
+        listings = max(10, round(FULL_SCALE_LISTINGS * scale * share))
+        reviews = round(listings * REVIEWS_PER_LISTING)
+        plan.append({
+            "city": city, "state": state, "listings": listings, "reviews": reviews,
+            "listing_offset": listing_offset, "review_offset": review_offset,
+        })
+        listing_offset += listings
+        review_offset += reviews
+    return plan
+
+
+def generate_city(con: duckdb.DuckDBPyConnection, entry: dict, previous: dict, output_dir: str,
+                  camera_rate: float, duplicate_rate: float, reviewer_pool: int, compress: Optional[str] = None):
+    """Write the listings and reviews files of one city."""
+    city_code = f"{entry['city']}_{entry['state']}"
+    listings = entry["listings"]
+
+    # Rows are numbered globally (i for listings, j for reviews), so every
+    # city draws different values; listing id = i + 1, except for a fraction
+    # that reuse an id from the neighbouring file (metro overlap)
+    first_row = entry['listing_offset']
+    if previous:
+        duplicate_id = (f"{previous['listing_offset'] + 1} + "
+                        f"floor(rnd(i, 'dup_id') * {previous['listings']})::BIGINT")
+        listing_id = f"CASE WHEN rnd(i, 'dup') < {duplicate_rate} THEN {duplicate_id} ELSE i + 1 END"
+    else:
+        listing_id = "i + 1"
+    # Heavy-tailed listings per host: low host numbers own many listings
+    host_id = f"{first_row + 1} + floor(pow(rnd(i, 'host'), 2.5) * {max(listings // 3, 1)})::BIGINT"
+
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE city_listings AS
+        SELECT i, {listing_id} AS listing_id, {host_id} AS host_id, '{city_code}' AS city_code
+        FROM range({first_row}, {first_row + listings}) t(i)
+    """)
+
+    columns = ",\n".join(
+        f"{listing_expression(name, col_type, camera_rate)} AS {name}"
+        for name, col_type in csv_columns("listings").items()
+    )
+    write_csv(con, f"SELECT {columns} FROM city_listings ORDER BY i",
+              os.path.join(output_dir, f"{city_code}_listings.csv"), compress)
+
+    # Heavy-tailed reviews per listing: review j goes to the city's listing
+    # floor(n * u^3) among the first REVIEWED_SHARE of them, so a few listings
+    # get thousands of reviews and the rest get none
+    columns = ",\n".join(
+        f"{review_expression(name, camera_rate)} AS {name}" for name in csv_columns("reviews")
+    )
+    write_csv(con, f"""
+        WITH review_rows AS (
+            SELECT j, j + 1 AS review_id,
+                   {first_row} + floor(pow(rnd(j, 'listing'), 3) * {max(round(listings * REVIEWED_SHARE), 1)})::BIGINT AS i,
+                   {reviewer_pool} AS reviewer_pool
+            FROM range({entry['review_offset']}, {entry['review_offset'] + entry['reviews']}) t(j)
+        )
+        SELECT {columns}
+        FROM review_rows JOIN city_listings USING (i)
+        ORDER BY j
+    """, os.path.join(output_dir, f"{city_code}_reviews.csv"), compress)
+
+
+def write_csv(con: duckdb.DuckDBPyConnection, query: str, output_path: str, compress: Optional[str] = None):
+    """Write a query result as a quoted CSV file, renamed into place when complete."""
+    if compress:
+        output_path += COMPRESSED_SUFFIXES[compress]
+    tmp_path = output_path + ".tmp"
+    con.execute(f"COPY ({query}) TO '{tmp_path}' "
+                f"(FORMAT csv, HEADER true, QUOTE '\"', ESCAPE '\"', COMPRESSION {compress or 'none'})")
+    os.replace(tmp_path, output_path)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Generate a synthetic Airbnb-shaped dataset.")
+    parser.add_argument('--scale', type=float, default=0.01,
+                        help=f"Size relative to the real dataset, {MIN_SCALE}-{MAX_SCALE} (default: 0.01)")
+    parser.add_argument('--output-dir', default='.', help="Where to write the CSV files (default: .)")
+    parser.add_argument('--cities', type=int, default=len(CITIES),
+                        help=f"Number of cities to generate, largest first (default: {len(CITIES)})")
+    parser.add_argument('--camera-rate', type=float, default=0.01,
+                        help="Fraction of listings and reviews whose text mentions a camera (default: 0.01)")
+    parser.add_argument('--duplicate-rate', type=float, default=0.02,
+                        help="Fraction of listings reusing an id from the previous city's file (default: 0.02)")
+    parser.add_argument('--seed', type=int, default=42, help="Seed for the generated values (default: 42)")
+    parser.add_argument('--compress', choices=list(COMPRESSED_SUFFIXES),
+                        help="Write gzip- or zstd-compressed files (default: plain CSV)")
+    args = parser.parse_args()
+    if not MIN_SCALE <= args.scale <= MAX_SCALE:
+        parser.error(f"--scale must be between {MIN_SCALE} and {MAX_SCALE}")
+    if not 1 <= args.cities <= len(CITIES):
+        parser.error(f"--cities must be between 1 and {len(CITIES)}")
+    for name in ('camera_rate', 'duplicate_rate'):
+        if not 0 <= getattr(args, name) <= 1:
+            parser.error(f"--{name.replace('_', '-')} must be between 0 and 1")
+    return args
+
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    plan = city_plan(args.scale, args.cities)
+    total_listings = sum(entry["listings"] for entry in plan)
+    total_reviews = sum(entry["reviews"] for entry in plan)
+    # Reviewers are drawn uniformly from twice as many ids as reviews, so about
+    # 80% of reviews come from distinct reviewers and the rest from repeat ones
+    reviewer_pool = max(2 * total_reviews, 1)
+
+    print(f"Generating {len(plan)} cities at scale {args.scale}: "
+          f"{total_listings:,} listings, {total_reviews:,} reviews into {args.output_dir}/")
+
+    con = duckdb.connect()
+    configure(con)
+    create_macros(con, args.seed)
+
+    previous = None
+    for entry in plan:
+        city_start = time.time()
+        generate_city(con, entry, previous, args.output_dir, args.camera_rate, args.duplicate_rate, reviewer_pool,
+                      args.compress)
+        print(f"  {entry['city']}_{entry['state']}: {entry['listings']:,} listings, "
+              f"{entry['reviews']:,} reviews ({time.time() - city_start:.1f}s)")
+        previous = entry
+    con.close()
+
+    end_time = time.time()
+    print(f"Execution time: {end_time - start_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,3 @@
 # Install packages
-# pandas
+# pyarrow
 # duckdb
@@ -0,0 +1,116 @@
+"""
+Precomputed keyword-mention flags.
+
+Scanning 68M review comments with ``LOWER(comments) LIKE '%camera%'`` is the
+most expensive thing the analysis scripts do, and several of them repeat it.
+Instead, ingest evaluates each watched keyword once per row and stores the
+result in a narrow boolean column (``mentions_<keyword>``), so queries only
+read a flag instead of the text.
+
+The watched keywords default to WATCHED_KEYWORDS and can be overridden with
+a comma-separated AIRBNB_KEYWORDS environment variable at ingest time.
+"""
+
+import os
+import re
+
+import duckdb
+
+from coldstore import create_full_view, text_predicate, text_source
+
+# Text columns searched for each table; a row mentions a keyword if any of them does
+KEYWORD_SOURCES = {
+    "listings": ("description", "host_about", "amenities"),
+    "reviews": ("comments",),
+}
+
+WATCHED_KEYWORDS = tuple(
+    keyword.strip().lower()
+    for keyword in os.environ.get('AIRBNB_KEYWORDS', 'camera').split(',')
+    if keyword.strip()
+)
+
+
+def flag_column(keyword: str) -> str:
+    """Column holding the mention flag for a keyword, e.g. camera -> mentions_camera."""
+    return "mentions_" + re.sub(r'[^a-z0-9]+', '_', keyword.lower()).strip('_')
+
+
+def mention_expression(table_name: str, keyword: str) -> str:
+    """
+    SQL predicate scanning the text columns directly (the pre-flag query form).
+
+    Columns are cast to text, so the stored ``amenities`` list matches like
+    its raw CSV form does at ingest.
+    """
+    pattern = keyword.lower().replace("'", "''")
+    return "(" + " OR ".join(
+        f"LOWER({column}::VARCHAR) LIKE '%{pattern}%'" for column in KEYWORD_SOURCES[table_name]
+    ) + ")"
+
+
+def flag_select_sql(table_name: str, keywords=WATCHED_KEYWORDS) -> str:
+    """
+    Select-list fragment computing the flag columns for an INSERT ... BY NAME.
+
+    Returns an empty string when no keywords are watched, otherwise
+    ", <expr> AS mentions_<keyword>, ..." to append after the other columns.
+    """
+    return "".join(
+        f", COALESCE({mention_expression(table_name, keyword)}, false) AS {flag_column(keyword)}"
+        for keyword in keywords
+    )
+
+
+def table_columns(con: duckdb.DuckDBPyConnection, table_name: str) -> set:
+    """Names of the columns of a table or view."""
+    return {row[0] for row in con.execute(f"DESCRIBE {table_name}").fetchall()}
+
+
+def add_flag_columns(con: duckdb.DuckDBPyConnection, keywords=WATCHED_KEYWORDS):
+    """
+    Add a flag column per watched keyword to listings and reviews.
+
+    Rows loaded before a keyword was watched are backfilled once, so every
+    existing flag column is complete and can replace the text scan. Rows
+    whose text is in the cold store are backfilled through the full view.
+    """
+    for table_name in KEYWORD_SOURCES:
+        existing = table_columns(con, table_name)
+        source = text_source(con, table_name)
+        for keyword in keywords:
+            column = flag_column(keyword)
+            if column in existing:
+                continue
+            con.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} BOOLEAN")
+            con.execute(f"""
+                UPDATE {table_name}
+                SET {column} = COALESCE({mention_expression(table_name, keyword)}, false)
+                {'WHERE text_id IS NULL' if source != table_name else ''}
+            """)
+            if source != table_name:
+                # The view's column list is fixed when it is created
+                create_full_view(con, table_name)
+                con.execute(f"""
+                    UPDATE {table_name}
+                    SET {column} = cold.flag
+                    FROM (
+                        SELECT file_id, text_id, COALESCE({mention_expression(table_name, keyword)}, false) AS flag
+                        FROM {source} WHERE text_id IS NOT NULL
+                    ) cold
+                    WHERE {table_name}.file_id = cold.file_id AND {table_name}.text_id = cold.text_id
+                """)
+
+
+def mention_filter(con: duckdb.DuckDBPyConnection, table_name: str, keyword: str) -> str:
+    """
+    SQL predicate for rows of a table mentioning a keyword.
+
+    Uses the precomputed flag column when ingest created one, and falls back
+    to the LIKE scan over the text columns otherwise (reading the cold store
+    for rows whose text was split off).
+    """
+    column = flag_column(keyword)
+    if column in table_columns(con, table_name):
+        return column
+    return text_predicate(con, table_name, mention_expression(table_name, keyword))
@@ -0,0 +1,182 @@
+"""
+Physical layout of airbnb.db: clustering order and index profile.
+
+The challenge queries are full-table aggregates, which DuckDB answers with
+scans that ART indexes do not help. Two things do help them:
+
+- clustering: rows stored sorted by SORT_KEYS make each row group's min/max
+  zone map cover a narrow range of states and listing ids, so filtered scans
+  skip row groups and ``listings JOIN reviews`` reads both sides in the
+  same order
+- fewer indexes: every ART index costs build time and memory at ingest and
+  space on disk, and is kept up to date on every insert
+
+Loading a file deletes and appends rows, which every ART index on the table
+would have to follow row by row, so the loaders drop a table's indexes before
+its first file and create_indexes rebuilds the profile's indexes after the
+run.
+
+Clustering rewrites a table in sorted order (``CREATE TABLE ... AS ... ORDER
+BY``, swapped in by rename in one transaction). Ingest appends unsorted rows,
+so loading a file clears the table's entry in ``table_layout`` and the next
+``--sort`` run clusters it again.
+
+Index profiles:
+    none          no indexes
+    point-lookup  only the id / listing_id indexes used for single-row lookups
+    full          all of INDEXES (the original behaviour, default)
+"""
+
+import time
+from typing import Iterable, List, Tuple
+
+import duckdb
+from tqdm import tqdm
+
+from db import database_bytes
+
+SORT_KEYS = {
+    "listings": ("state", "id"),
+    "reviews": ("state", "listing_id"),
+}
+
+# (index name, table, column)
+INDEXES = [
+    ("idx_listings_id", "listings", "id"),
+    ("idx_listings_host_id", "listings", "host_id"),
+    ("idx_listings_state", "listings", "state"),
+    ("idx_reviews_id", "reviews", "id"),
+    ("idx_reviews_listing_id", "reviews", "listing_id"),
+    ("idx_reviews_reviewer_id", "reviews", "reviewer_id"),
+    ("idx_reviews_state", "reviews", "state"),
+]
+
+INDEX_PROFILES = {
+    "none": (),
+    "point-lookup": ("idx_listings_id", "idx_reviews_id", "idx_reviews_listing_id"),
+    "full": tuple(index_name for index_name, _, _ in INDEXES),
+}
+DEFAULT_INDEX_PROFILE = "full"
+
+
+def order_by_sql(table_name: str) -> str:
+    """ORDER BY clause putting a table's rows in clustering order."""
+    return "ORDER BY " + ", ".join(SORT_KEYS[table_name])
+
+
+def create_layout_table(con: duckdb.DuckDBPyConnection):
+    """Create the table recording which tables are clustered, if it does not exist yet."""
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS table_layout (
+            table_name TEXT,
+            sort_key TEXT,
+            clustered_at TIMESTAMP
+        )
+    """)
+
+
+def is_clustered(con: duckdb.DuckDBPyConnection, table_name: str) -> bool:
+    """Whether a table is stored in its current clustering order."""
+    return con.execute(
+        "SELECT COUNT(*) FROM table_layout WHERE table_name = ? AND sort_key = ?",
+        [table_name, ", ".join(SORT_KEYS[table_name])],
+    ).fetchone()[0] > 0
+
+
+def drop_indexes(con: duckdb.DuckDBPyConnection, table_name: str, keep: Iterable[str] = ()):
+    """Drop the INDEXES of a table, except those in keep."""
+    known = {index_name for index_name, index_table, _ in INDEXES if index_table == table_name}
+    for (index_name,) in con.execute(
+        "SELECT index_name FROM duckdb_indexes() WHERE database_name = current_database() AND table_name = ?",
+        [table_name],
+    ).fetchall():
+        if index_name in known and index_name not in keep:
+            con.execute(f"DROP INDEX {index_name}")
+
+
+def cluster_table(con: duckdb.DuckDBPyConnection, table_name: str):
+    """
+    Rewrite a table in SORT_KEYS order.
+
+    Indexes on the table are dropped first (they would block the swap);
+    create_indexes rebuilds the ones the chosen profile wants.
+    """
+    drop_indexes(con, table_name)
+    staging = f"{table_name}_clustered"
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"DROP TABLE IF EXISTS {staging}")
+        con.execute(f"CREATE TABLE {staging} AS SELECT * FROM {table_name} {order_by_sql(table_name)}")
+        con.execute(f"DROP TABLE {table_name}")
+        con.execute(f"ALTER TABLE {staging} RENAME TO {table_name}")
+        con.execute("DELETE FROM table_layout WHERE table_name = ?", [table_name])
+        con.execute("INSERT INTO table_layout VALUES (?, ?, current_timestamp)",
+                    [table_name, ", ".join(SORT_KEYS[table_name])])
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+
+def apply_layout(con: duckdb.DuckDBPyConnection, sort: bool, loaded_tables: Iterable[str]):
+    """
+    Bring the clustering state up to date after an ingest run.
+
+    Args:
+        con: DuckDB connection to airbnb.db
+        sort: Cluster every table that is not clustered yet
+        loaded_tables: Tables that received rows in this run (no longer sorted)
+    """
+    create_layout_table(con)
+    for table_name in set(loaded_tables):
+        con.execute("DELETE FROM table_layout WHERE table_name = ?", [table_name])
+
+    if not sort:
+        return
+    for table_name in SORT_KEYS:
+        if is_clustered(con, table_name):
+            continue
+        print(f"Clustering {table_name} by ({', '.join(SORT_KEYS[table_name])})...")
+        start_time = time.time()
+        cluster_table(con, table_name)
+        print(f"Clustered {table_name} in {time.time() - start_time:.2f} seconds")
+
+
+def create_indexes(con: duckdb.DuckDBPyConnection, profile: str = DEFAULT_INDEX_PROFILE) -> List[Tuple[str, float, int]]:
+    """
+    Create the indexes of a profile and drop the other INDEXES.
+
+    Each new index is timed and its on-disk size measured as the growth of
+    the database across a checkpoint.
+
+    Returns:
+        (index name, build seconds, bytes) for every index built
+    """
+    wanted = INDEX_PROFILES[profile]
+    for table_name in SORT_KEYS:
+        drop_indexes(con, table_name, keep=wanted)
+
+    existing = {row[0] for row in con.execute(
+        "SELECT index_name FROM duckdb_indexes() WHERE database_name = current_database()"
+    ).fetchall()}
+
+    built = []
+    for index_name, table_name, column_name in tqdm(
+        [index for index in INDEXES if index[0] in wanted], desc=f"Creating indexes ({profile})"
+    ):
+        if index_name in existing:
+            continue
+        try:
+            size_before = database_bytes(con)
+            start_time = time.time()
+            con.execute(f"CREATE INDEX {index_name} ON {table_name}({column_name})")
+            build_time = time.time() - start_time
+            built.append((index_name, build_time, database_bytes(con) - size_before))
+        except Exception as e:
+            print(f"Warning: Failed to create index {index_name}: {e}")
+            # Continue with other indexes
+
+    print(f"Index profile: {profile} ({len(wanted)} indexes, {len(built)} built)")
+    for index_name, build_time, index_bytes in built:
+        print(f"  {index_name:<26}{build_time:>8.2f}s{index_bytes / 1024 ** 2:>10.1f} MB")
+    return built
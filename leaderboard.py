@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Top-k host and listing leaderboards by review count.
+
+top_host.py joins every review row to listings and counts distinct review
+ids per host. Here reviews are first reduced to one row per listing (and
+state), about 1.4M rows instead of 68M, and only that result is joined to
+the listing -> host pairs. The per-listing counts come from:
+
+    summaries   listing_review_counts / listing_review_totals / listing_hosts,
+                kept up to date by ingest
+    aggregate   built on demand with GROUP BYs over reviews
+    join        the original full join, for comparison
+
+(``auto`` picks summaries when the database has them, aggregate otherwise.)
+A listing's reviews can appear in the files of several states, so the
+all-states boards use each listing's distinct review count across states
+rather than the sum of its per-state counts. A review id belongs to one
+listing, so summing those over a host's listings equals the join's
+``COUNT(DISTINCT r.id)``.
+
+Ranks use RANK(): tied entries share a rank, and every entry tied with the
+N-th is shown, so a board can hold more than N rows. Per-state boards count
+the reviews of a state's listings in that state.
+
+``--compare`` runs each source in its own process (as benchmark.py does) and
+reports its latency and peak memory, and whether the boards agree.
+
+Usage:
+    python3 leaderboard.py                        # top 10 hosts
+    python3 leaderboard.py --top 5 --per-state
+    python3 leaderboard.py --by listing --top 20
+    python3 leaderboard.py --compare
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from benchmark import EXECUTION_TIME, run_process
+from query_cache import connect_cached
+from summaries import has_summaries
+
+SOURCES = ('auto', 'summaries', 'aggregate', 'join')
+
+# Source -> (per-listing review counts per state, per-listing totals across states,
+#            listing -> host pairs with a state column)
+PER_LISTING = {
+    'summaries': (
+        "SELECT listing_id, state, reviews FROM listing_review_counts",
+        "SELECT listing_id, reviews FROM listing_review_totals",
+        "SELECT listing_id, host_id, state FROM listing_hosts",
+    ),
+    'aggregate': (
+        "SELECT listing_id, state, COUNT(DISTINCT id) AS reviews FROM reviews GROUP BY listing_id, state",
+        "SELECT listing_id, COUNT(DISTINCT id) AS reviews FROM reviews GROUP BY listing_id",
+        "SELECT DISTINCT id AS listing_id, host_id, state FROM listings",
+    ),
+}
+
+
+def totals_sql(source: str, by: str, per_state: bool) -> str:
+    """
+    Query giving (state, key, reviews) per host or listing.
+
+    state is NULL for the all-states board; key is the host_id or listing id.
+    """
+    if source == 'join':
+        key = "l.host_id" if by == 'host' else "l.id"
+        state = "l.state" if per_state else "NULL"
+        on_state = " AND l.state = r.state" if per_state else ""
+        return f"""
+            SELECT {state} AS state, {key} AS key, COUNT(DISTINCT r.id) AS reviews
+            FROM listings l
+            JOIN reviews r ON l.id = r.listing_id{on_state}
+            GROUP BY ALL
+        """
+
+    counts, listing_totals, hosts = PER_LISTING[source]
+    if per_state:
+        key = "h.host_id" if by == 'host' else "c.listing_id"
+        return f"""
+            SELECT c.state, {key} AS key, SUM(c.reviews) AS reviews
+            FROM (SELECT DISTINCT listing_id, host_id, state FROM ({hosts})) h
+            JOIN ({counts}) c ON c.listing_id = h.listing_id AND c.state = h.state
+            GROUP BY ALL
+        """ if by == 'host' else f"""
+            SELECT c.state, c.listing_id AS key, c.reviews
+            FROM ({counts}) c
+            WHERE (c.listing_id, c.state) IN (SELECT (listing_id, state) FROM ({hosts}))
+        """
+
+    if by == 'host':
+        return f"""
+            SELECT NULL AS state, h.host_id AS key, SUM(c.reviews) AS reviews
+            FROM (SELECT DISTINCT listing_id, host_id FROM ({hosts})) h
+            JOIN ({listing_totals}) c ON c.listing_id = h.listing_id
+            GROUP BY ALL
+        """
+    return f"""
+        SELECT NULL AS state, c.listing_id AS key, c.reviews
+        FROM ({listing_totals}) c
+        WHERE c.listing_id IN (SELECT listing_id FROM ({hosts}))
+    """
+
+
+def leaderboard_sql(source: str, by: str, per_state: bool, top: int) -> str:
+    """Ranked board: entries ranked at most ``top`` (ties included), per state when asked."""
+    return f"""
+        SELECT state, key, reviews, rank
+        FROM (
+            SELECT state, key, reviews, RANK() OVER (PARTITION BY state ORDER BY reviews DESC) AS rank
+            FROM ({totals_sql(source, by, per_state)})
+        )
+        WHERE rank <= {int(top)}
+        ORDER BY state, rank, key
+    """
+
+
+def print_board(rows: list, by: str, per_state: bool):
+    """Print a board, one line per entry, with '=' marking shared ranks."""
+    shared = {}
+    for state, _, _, rank in rows:
+        shared[(state, rank)] = shared.get((state, rank), 0) + 1
+
+    key_label = "host_id" if by == 'host' else "listing_id"
+    print(f"{'rank':<7}{'state  ' if per_state else ''}{key_label:<16}{'reviews':>10}")
+    for state, key, reviews, rank in rows:
+        rank_label = f"{rank}=" if shared[(state, rank)] > 1 else str(rank)
+        state_label = f"{state:<7}" if per_state else ""
+        print(f"{rank_label:<7}{state_label}{key:<16}{reviews:>10,}")
+
+
+def compare_sources(args: argparse.Namespace):
+    """Run the board from every available source in its own process; report latency, peak memory and agreement."""
+    con = connect_cached()
+    sources = ['join', 'aggregate'] + (['summaries'] if has_summaries(con) else [])
+    con.close()
+
+    options = ['--top', str(args.top), '--by', args.by] + (['--per-state'] if args.per_state else [])
+    boards = {}
+    print(f"{'source':<12}{'latency':>10}{'peak RSS':>12}")
+    for source in sources:
+        # Cache and service bypassed, so each process runs and pays for the query itself
+        result = run_process([sys.executable, os.path.abspath(__file__), '--source', source] + options,
+                             os.getcwd(), env=dict(os.environ, AIRBNB_CACHE='0', AIRBNB_SERVICE='0'))
+        match = EXECUTION_TIME.search(result["output"])
+        seconds = float(match.group(1)) if match else result["wall_seconds"]
+        boards[source] = result["output"].split("Execution time")[0].split("\n", 1)[1]
+        print(f"{source:<12}{seconds:>9.3f}s{result['peak_rss_bytes'] / 1024 ** 2:>10.0f}MB")
+
+    differing = [source for source in sources if boards[source] != boards['join']]
+    if differing:
+        print(f"Boards differ from the join: {', '.join(differing)} "
+              f"(the join counts a review id once per host even when it is listed under several of its listings)")
+    else:
+        print("All sources give the same board")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank hosts or listings by review count.")
+    parser.add_argument('--top', type=int, default=10, help="Ranks to show, ties included (default: 10)")
+    parser.add_argument('--by', choices=['host', 'listing'], default='host', help="Rank hosts or listings (default: host)")
+    parser.add_argument('--per-state', action='store_true', help="One board per state")
+    parser.add_argument('--source', choices=SOURCES, default='auto',
+                        help="Where the per-listing counts come from (default: auto)")
+    parser.add_argument('--compare', action='store_true',
+                        help="Time every source in its own process and report latency and peak memory")
+    args = parser.parse_args()
+    if args.top < 1:
+        parser.error("--top must be at least 1")
+
+    if args.compare:
+        compare_sources(args)
+        return
+
+    start_time = time.time()
+    con = connect_cached()
+    source = args.source
+    if source == 'auto':
+        source = 'summaries' if has_summaries(con) else 'aggregate'
+    elif source == 'summaries' and not has_summaries(con):
+        parser.error("the database has no summary tables (run preprocessing first)")
+
+    rows = con.execute(leaderboard_sql(source, args.by, args.per_state, args.top)).fetchall()
+    print(f"Top {args.top} {args.by}s by reviews{' per state' if args.per_state else ''} (source: {source})")
+    print_board(rows, args.by, args.per_state)
+    con.close()
+
+    end_time = time.time()
+    print(f"Execution time: {end_time - start_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
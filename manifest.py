@@ -0,0 +1,142 @@
+"""
+Ingest manifest: which CSV files have been loaded, and from which version.
+
+Every input file gets a row in ``ingest_manifest`` with its size, mtime,
+content hash, row count and status. Loaded rows carry the file's
+``file_id`` so a file can be replaced (or a crashed load retried) by
+deleting exactly its rows inside the same transaction as the reload.
+Plain, gzip and zstd forms of a file (``x.csv``, ``x.csv.gz``, ``x.csv.zst``)
+share one entry, so switching to a compressed copy reloads the file in
+place instead of loading its rows twice.
+
+Status values:
+    pending  registered, not (fully) loaded yet
+    loaded   rows committed and counted
+    failed   last load attempt raised an error
+"""
+
+import hashlib
+import os
+from typing import List, Tuple
+
+import duckdb
+
+from schema import CSV_SUFFIXES, csv_stem
+
+HASH_BLOCK_SIZE = 8 * 1024 * 1024  # 8MB reads while hashing
+
+
+def create_manifest(con: duckdb.DuckDBPyConnection):
+    """Create the manifest table and its id sequence if they do not exist yet."""
+    con.execute("CREATE SEQUENCE IF NOT EXISTS ingest_file_id START 1")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_manifest (
+            file_id INTEGER,
+            path TEXT,
+            table_name TEXT,
+            size BIGINT,
+            mtime DOUBLE,
+            content_hash TEXT,
+            row_count BIGINT,
+            status TEXT,
+            error TEXT,
+            updated_at TIMESTAMP
+        )
+    """)
+
+
+def file_hash(file_path: str) -> str:
+    """BLAKE2b digest of a file's contents."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def plan_files(con: duckdb.DuckDBPyConnection, files: List[str], table_name: str) -> Tuple[List[Tuple[str, int]], List[str]]:
+    """
+    Decide which files need (re)loading and register them in the manifest.
+
+    A loaded file is skipped when its size and mtime are unchanged; if only
+    the stat changed, the content hash decides. New, changed, pending and
+    failed files are (re)marked pending and returned for loading. An entry
+    recorded under another compression form of the same file is taken over.
+
+    Args:
+        con: DuckDB connection holding the manifest
+        files: CSV paths for one table
+        table_name: Target table name
+
+    Returns:
+        Tuple of ([(file_path, file_id), ...] to load, [file_path, ...] skipped)
+    """
+    to_load, skipped = [], []
+
+    for file_path in files:
+        stat = os.stat(file_path)
+        forms = [csv_stem(file_path) + suffix for suffix in CSV_SUFFIXES]
+        entry = con.execute(f"""
+            SELECT file_id, size, mtime, content_hash, status
+            FROM ingest_manifest WHERE path IN ({', '.join('?' for _ in forms)})
+            ORDER BY path = ? DESC, updated_at DESC
+            LIMIT 1
+        """, forms + [file_path]).fetchone()
+
+        if entry is None:
+            file_id = con.execute("SELECT nextval('ingest_file_id')").fetchone()[0]
+            con.execute("""
+                INSERT INTO ingest_manifest
+                VALUES (?, ?, ?, ?, ?, ?, NULL, 'pending', NULL, now())
+            """, [file_id, file_path, table_name, stat.st_size, stat.st_mtime, file_hash(file_path)])
+            to_load.append((file_path, file_id))
+            continue
+
+        file_id, size, mtime, content_hash, status = entry
+        if status == 'loaded' and (size, mtime) == (stat.st_size, stat.st_mtime):
+            skipped.append(file_path)
+            continue
+
+        new_hash = file_hash(file_path)
+        if status == 'loaded' and new_hash == content_hash:
+            # Touched but identical (e.g. re-downloaded): just refresh the stat
+            con.execute("UPDATE ingest_manifest SET path = ?, size = ?, mtime = ? WHERE file_id = ?",
+                        [file_path, stat.st_size, stat.st_mtime, file_id])
+            skipped.append(file_path)
+            continue
+
+        con.execute("""
+            UPDATE ingest_manifest
+            SET path = ?, size = ?, mtime = ?, content_hash = ?, row_count = NULL,
+                status = 'pending', error = NULL, updated_at = now()
+            WHERE file_id = ?
+        """, [file_path, stat.st_size, stat.st_mtime, new_hash, file_id])
+        to_load.append((file_path, file_id))
+
+    return to_load, skipped
+
+
+def mark_loaded(con: duckdb.DuckDBPyConnection, file_id: int, row_count: int):
+    """Record a successfully committed file load."""
+    con.execute("""
+        UPDATE ingest_manifest
+        SET status = 'loaded', row_count = ?, error = NULL, updated_at = now()
+        WHERE file_id = ?
+    """, [row_count, file_id])
+
+
+def mark_failed(con: duckdb.DuckDBPyConnection, file_id: int, error: str):
+    """Record a failed file load so the next run retries it."""
+    con.execute("""
+        UPDATE ingest_manifest
+        SET status = 'failed', error = ?, updated_at = now()
+        WHERE file_id = ?
+    """, [error, file_id])
+
+
+def loaded_row_count(con: duckdb.DuckDBPyConnection, table_name: str) -> int:
+    """Total rows recorded in the manifest for a table's loaded files."""
+    return con.execute("""
+        SELECT COALESCE(SUM(row_count), 0) FROM ingest_manifest
+        WHERE table_name = ? AND status = 'loaded'
+    """, [table_name]).fetchone()[0]
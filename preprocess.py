@@ -1,49 +1,113 @@
 import duckdb
 import os
-import glob
-import pandas as pd
+import argparse
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from tqdm import tqdm
 import concurrent.futures
 import multiprocessing
+import queue
 import time
-from typing import List, Tuple
+from multiprocessing import shared_memory
+from typing import Iterator, List, Optional, Tuple
+
+from amenities import create_amenities, refresh_amenities
+from coldstore import apply_text_split
+from db import PARQUET_DIR, attach_parquet, parquet_path
+from dedup import apply_dedup, drop_canonical
+from keywords import add_flag_columns, flag_select_sql
+from layout import DEFAULT_INDEX_PROFILE, INDEX_PROFILES, apply_layout, create_indexes, drop_indexes
+from manifest import create_manifest, loaded_row_count, mark_failed, mark_loaded, plan_files
+from resources import add_resource_arguments, apply_resource_arguments, configure, describe, detect_resources
+from schema import create_tables, csv_columns, csv_select_sql, find_csv_files, state_from_filename
+from sketches import create_sketches, refresh_sketches
+from summaries import create_summaries, mark_summaries_stale, refresh_pending_summaries
+from telemetry import IngestTelemetry, Stage, add_telemetry_arguments, peak_rss_bytes
+
+# Parse processes, batch size and queue depth, sized to this host (see resources.py).
+# main() re-derives it after applying command line overrides.
+RESOURCES = detect_resources()
+
+# DDL type -> Arrow type used when parsing the CSV files
+ARROW_TYPES = {
+    "BIGINT": pa.int64(),
+    "INTEGER": pa.int32(),
+    "DOUBLE": pa.float64(),
+    "DATE": pa.date32(),
+    "BOOLEAN": pa.bool_(),
+    "TEXT": pa.string(),
+}
+
+def open_csv_stream(file_path: str, table_name: str, use_threads: bool = True) -> pacsv.CSVStreamingReader:
+    """
+    Open an incremental Arrow CSV reader typed from the table DDL.
+
+    Columns are selected by header name and come out in DDL order, so the
+    batches line up with the table apart from the derived columns. Opening
+    the reader already parses the first block.
 
-# Configuration
-CHUNK_SIZE = 50000  # Process 50k rows at a time
-MAX_WORKERS = min(multiprocessing.cpu_count(), 4)  # Limit workers to avoid overwhelming the system
+    Args:
+        file_path: Path to CSV file
+        table_name: Table whose layout the file follows
+        use_threads: Let Arrow read ahead and parse on background threads;
+            with False each block is parsed inside read_next_batch()
 
-def process_file_chunked(con: duckdb.DuckDBPyConnection, file_path: str, state_code: str, table_name: str) -> int:
+    Returns:
+        Streaming reader yielding one record batch per RESOURCES.block_size of input
+    """
+    columns = csv_columns(table_name)
+    return pacsv.open_csv(
+        file_path,
+        read_options=pacsv.ReadOptions(block_size=RESOURCES.block_size, use_threads=use_threads),
+        # Listing descriptions and review comments contain quoted newlines
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: ARROW_TYPES[col_type] for name, col_type in columns.items()},
+            include_columns=list(columns),
+            true_values=["t", "true", "True"],
+            false_values=["f", "false", "False"],
+            strings_can_be_null=True,
+        ),
+    )
+
+def process_file_chunked(con: duckdb.DuckDBPyConnection, file_path: str, state_code: str, table_name: str,
+                         file_id: Optional[int] = None, stats: Optional[dict] = None) -> int:
     """
-    Process a CSV file in chunks to reduce memory usage.
+    Parse a CSV file into an Arrow table and insert it into DuckDB.
+
+    The file is parsed in full before the insert, so the two stages are
+    timed separately (a streamed scan would parse on Arrow's readahead
+    threads while DuckDB inserts). DuckDB scans the registered table
+    directly (no pandas conversion or extra copy), and the state/provenance
+    columns are added as constants in the INSERT. Text columns are converted
+    to their stored types and keyword mention flags are computed in the same
+    pass while the text is in memory.
 
     Args:
         con: DuckDB connection
         file_path: Path to CSV file
         state_code: State code to add to each row
         table_name: Target table name
+        file_id: Manifest id of the file, stored with each row
+        stats: Telemetry dict receiving parse and insert time
 
     Returns:
         Number of rows processed
     """
-    total_rows = 0
-
+    stats = {} if stats is None else stats
     try:
-        # First, get the total number of rows for progress reporting
-        # Use shell command to count lines (faster than pandas)
-        import subprocess
-        result = subprocess.run(['wc', '-l', file_path],
-                              capture_output=True, text=True)
-        total_file_rows = int(result.stdout.split()[0]) - 1  # Subtract header
-
-        # Read CSV in chunks
-        for chunk_num, chunk in enumerate(pd.read_csv(file_path, chunksize=CHUNK_SIZE, low_memory=False)):
-            # Add state column
-            chunk['state'] = state_code
-
-            # Insert chunk into DuckDB
-            con.execute(f"INSERT INTO {table_name} SELECT * FROM chunk")
-
-            total_rows += len(chunk)
+        with Stage(stats, 'parse'):
+            csv_table = open_csv_stream(file_path, table_name).read_all()
+        con.register('csv_table', csv_table)
+        try:
+            with Stage(stats, 'insert'):
+                total_rows = con.execute(
+                    f"INSERT INTO {table_name} BY NAME "
+                    f"SELECT {csv_select_sql(table_name)}, ? AS state, ? AS file_id{flag_select_sql(table_name)} FROM csv_table",
+                    [state_code, file_id],
+                ).fetchone()[0]
+        finally:
+            con.unregister('csv_table')
 
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
@@ -51,29 +115,307 @@ def process_file_chunked(con: duckdb.DuckDBPyConnection, file_path: str, state_c
 
     return total_rows
 
-def process_file_parallel(args: Tuple[str, str, str]) -> Tuple[str, int, str]:
+def write_parquet(con: duckdb.DuckDBPyConnection, table_name: str, output_path: str):
+    """
+    Write a staged table to a zstd-compressed Parquet file.
+
+    The ``state`` column is left out: it is encoded in the partition
+    directory and restored by ``hive_partitioning`` when reading. The
+    file itself is the unit of provenance, so ``file_id`` is dropped too.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    con.execute(f"""
+        COPY (SELECT * EXCLUDE (state, file_id) FROM {table_name})
+        TO '{tmp_path}' (FORMAT parquet, COMPRESSION zstd)
+    """)
+    # Rename into place so readers never see a half-written file
+    os.replace(tmp_path, output_path)
+
+def write_ipc(sink: pa.NativeFile, batch: pa.RecordBatch):
+    """Write a single record batch to a sink as an Arrow IPC stream."""
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+
+def share_batch(batch: pa.RecordBatch) -> str:
     """
-    Process a single file (for parallel execution).
+    Copy a record batch into a new shared memory segment as an Arrow IPC stream.
+
+    Returns:
+        Name of the segment; the reader is responsible for unlinking it
+    """
+    sizer = pa.MockOutputStream()
+    write_ipc(sizer, batch)
+
+    shm = shared_memory.SharedMemory(create=True, size=sizer.size())
+    # The temporary views of shm.buf must be gone before the mapping is closed
+    write_ipc(pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf)), batch)
+    shm.close()
+    return shm.name
+
+def insert_ipc(con: duckdb.DuckDBPyConnection, table_name: str, data: memoryview, state_code: str,
+               file_id: int) -> int:
+    """Insert an Arrow IPC stream held in memory without copying it first."""
+    ipc_batch = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+    # Resolved by DuckDB's replacement scan: a registered view would stay
+    # pinned (and keep the shared memory mapped) until the transaction ends
+    return con.execute(
+        f"INSERT INTO {table_name} BY NAME "
+        f"SELECT {csv_select_sql(table_name)}, ? AS state, ? AS file_id{flag_select_sql(table_name)} FROM ipc_batch",
+        [state_code, file_id],
+    ).fetchone()[0]
+
+def insert_shared_batch(con: duckdb.DuckDBPyConnection, table_name: str, shm_name: str, state_code: str,
+                        file_id: int) -> int:
+    """Insert a batch published by share_batch() and free its segment."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return insert_ipc(con, table_name, shm.buf, state_code, file_id)
+    finally:
+        shm.close()
+        shm.unlink()
+
+def discard_shared_batch(shm_name: str):
+    """Free a batch published by share_batch() without reading it."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    shm.close()
+    shm.unlink()
+
+def parse_worker(task_queue: multiprocessing.Queue, batch_queue: multiprocessing.Queue):
+    """
+    Parse process: turn CSV files into typed Arrow batches in shared memory.
+
+    Reads (file_path, table_name) tasks until a None sentinel and reports
+    ('batch', file_path, shm_name), then ('done', file_path, stats) or
+    ('error', file_path, message) for each file, where stats holds the
+    parser's telemetry. The batch queue is bounded, so parsers block instead
+    of running ahead of the writer.
+
+    Blocks are parsed inline rather than on Arrow's readahead threads: the
+    parsers already take one core each, and parsing ahead while blocked on
+    the queue would leave parse_seconds measuring only the hand-off.
+    """
+    for file_path, table_name in iter(task_queue.get, None):
+        try:
+            stats = {'started_at': time.time(), 'backpressure_seconds': 0.0}
+            with Stage(stats, 'parse'):
+                reader = open_csv_stream(file_path, table_name, use_threads=False)
+            while True:
+                with Stage(stats, 'parse'):
+                    try:
+                        shm_name = share_batch(reader.read_next_batch())
+                    except StopIteration:
+                        break
+                wait_start = time.perf_counter()
+                batch_queue.put(('batch', file_path, shm_name))
+                stats['backpressure_seconds'] += time.perf_counter() - wait_start
+            stats['peak_rss_bytes'] = peak_rss_bytes()
+            batch_queue.put(('done', file_path, stats))
+        except Exception as e:
+            batch_queue.put(('error', file_path, f"error: {str(e)}"))
+
+def load_files_pipelined(con: duckdb.DuckDBPyConnection, tasks: List[Tuple[str, str, str, int, Optional[str]]],
+                         telemetry: IngestTelemetry) -> Iterator[Tuple[str, int, str]]:
+    """
+    Load files with RESOURCES.workers parse processes feeding this process as the only writer.
+
+    Each file is (re)loaded in its own transaction on a dedicated cursor:
+    rows left by an earlier version of the file are deleted and the new
+    batches appended, then committed when the parser reports the end of the
+    file. A crash never leaves a partially loaded file behind and a re-run
+    never duplicates rows.
+
+    Args:
+        con: DuckDB connection that owns the database
+        tasks: Tuples of (file_path, state_code, table_name, file_id, parquet_dir)
+        telemetry: Receives each file's parse, queue, insert and commit measurements
+
+    Yields:
+        Tuple of (file_path, rows_processed, status) as files complete
+    """
+    ctx = multiprocessing.get_context('spawn')
+    task_queue = ctx.Queue()
+    batch_queue = ctx.Queue(maxsize=RESOURCES.queue_depth)
+    for file_path, _, table_name, _, _ in tasks:
+        task_queue.put((file_path, table_name))
+
+    workers = [ctx.Process(target=parse_worker, args=(task_queue, batch_queue), daemon=True)
+               for _ in range(min(RESOURCES.workers, len(tasks)))]
+    for worker in workers:
+        task_queue.put(None)
+        worker.start()
+
+    task_by_file = {task[0]: task for task in tasks}
+    cursors = {}  # file_path -> cursor holding the file's open transaction
+    rows = {}
+    errors = {}  # file_path -> insert error; the file's remaining batches are discarded
+    remaining = len(tasks)
+    wait_start = None
+
+    try:
+        while remaining:
+            wait_start = wait_start or time.perf_counter()
+            try:
+                kind, file_path, payload = batch_queue.get(timeout=1)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError("parse workers exited before finishing all files")
+                continue
+
+            _, state_code, table_name, file_id, _ = task_by_file[file_path]
+            # The writer was idle until this file's message arrived
+            stats = telemetry.start(file_path, table_name, state_code)
+            stats['queue_wait_seconds'] += time.perf_counter() - wait_start
+            wait_start = None
+            if file_path not in cursors:
+                cursors[file_path] = con.cursor()
+                cursors[file_path].execute("BEGIN TRANSACTION")
+                cursors[file_path].execute(f"DELETE FROM {table_name} WHERE file_id = ?", [file_id])
+                rows[file_path] = 0
+            cur = cursors[file_path]
+
+            if kind == 'batch':
+                if file_path in errors:
+                    discard_shared_batch(payload)
+                    continue
+                try:
+                    with Stage(stats, 'insert'):
+                        rows[file_path] += insert_shared_batch(cur, table_name, payload, state_code, file_id)
+                except Exception as e:
+                    # Keep draining the parser's batches; the file is rolled back when it reports in
+                    errors[file_path] = f"error: {str(e)}"
+                continue
+
+            remaining -= 1
+            cursors.pop(file_path)
+            if kind == 'done' and file_path not in errors:
+                telemetry.add(file_path, payload)
+                with Stage(stats, 'commit'):
+                    cur.execute("COMMIT")
+                yield file_path, rows[file_path], "success"
+            else:
+                cur.execute("ROLLBACK")
+                yield file_path, 0, payload if kind == 'error' else errors[file_path]
+            cur.close()
+    finally:
+        for cur in cursors.values():
+            cur.execute("ROLLBACK")
+            cur.close()
+        for worker in workers:
+            worker.terminate()
+
+def process_file_parallel(args: Tuple[str, str, str, int, Optional[str]]) -> Tuple[str, int, str, dict]:
+    """
+    Convert a single file to Parquet (for parallel execution in a process pool).
 
     Args:
-        args: Tuple of (file_path, state_code, table_name)
+        args: Tuple of (file_path, state_code, table_name, file_id, parquet_dir)
 
     Returns:
-        Tuple of (file_path, rows_processed, status)
+        Tuple of (file_path, rows_processed, status, telemetry stats)
     """
-    file_path, state_code, table_name = args
+    file_path, state_code, table_name, file_id, parquet_dir = args
+    stats = {'started_at': time.time()}
 
     try:
-        # Create a separate connection for each worker
-        con = duckdb.connect('airbnb.db')
-        rows_processed = process_file_chunked(con, file_path, state_code, table_name)
+        # Stage the file in a private in-memory database, then write it out
+        con = duckdb.connect()
+        configure(con, RESOURCES, processes=RESOURCES.workers)
+        create_tables(con)
+        add_flag_columns(con)
+        rows_processed = process_file_chunked(con, file_path, state_code, table_name, stats=stats)
+        with Stage(stats, 'insert'):
+            write_parquet(con, table_name, parquet_path(parquet_dir, table_name, state_code, file_path))
         con.close()
-        return file_path, rows_processed, "success"
+        stats['peak_rss_bytes'] = peak_rss_bytes()
+        return file_path, rows_processed, "success", stats
     except Exception as e:
-        return file_path, 0, f"error: {str(e)}"
+        return file_path, 0, f"error: {str(e)}", stats
+
+def load_files(con: duckdb.DuckDBPyConnection, tasks: List[Tuple[str, str, str, int, Optional[str]]],
+               parquet_dir: Optional[str], telemetry: IngestTelemetry) -> Iterator[Tuple[str, int, str]]:
+    """
+    Load files into airbnb.db, or convert them to Parquet when parquet_dir is set.
+
+    Yields:
+        Tuple of (file_path, rows_processed, status) as files complete
+    """
+    if parquet_dir is None:
+        # Indexes would be maintained row by row; create_indexes rebuilds them after the run
+        for table_name in {task[2] for task in tasks}:
+            drop_indexes(con, table_name)
+        yield from load_files_pipelined(con, tasks, telemetry)
+        return
+
+    # Parquet files are independent, so each process owns its whole file
+    with concurrent.futures.ProcessPoolExecutor(max_workers=RESOURCES.workers,
+                                                mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(process_file_parallel, task) for task in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            file_path, rows_processed, status, stats = future.result()
+            _, state_code, table_name, _, _ = next(task for task in tasks if task[0] == file_path)
+            telemetry.start(file_path, table_name, state_code, started_at=stats['started_at'])
+            telemetry.add(file_path, stats)
+            yield file_path, rows_processed, status
+
+def mark_file_loaded(con: duckdb.DuckDBPyConnection, table_name: str, file_path: str, file_id: int,
+                     rows_processed: int, state_code: str, parquet_dir: Optional[str], stats: dict):
+    """
+    Record a committed file in the manifest, bring the sketches and amenity
+    bitmaps up to date, mark its state's summaries pending and drop the
+    table's (now stale) canonical tables.
+
+    All of it happens in one transaction, so the manifest never lists a file
+    as loaded whose state is not either summarized or pending. The work is
+    timed as the file's refresh stage and the COMMIT as its commit stage.
+    """
+    con.execute("BEGIN TRANSACTION")
+    try:
+        with Stage(stats, 'refresh'):
+            if parquet_dir is None:
+                mark_summaries_stale(con, table_name, [state_code])
+                refresh_sketches(con, table_name, [file_id])
+                refresh_amenities(con, table_name, [file_id])
+                drop_canonical(con, table_name)
+            mark_loaded(con, file_id, rows_processed)
+        with Stage(stats, 'commit'):
+            con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Load the Airbnb CSV files into DuckDB or Parquet.")
+    parser.add_argument('--format', choices=['duckdb', 'parquet'], default='duckdb',
+                        help="duckdb: build airbnb.db (default); parquet: write a state-partitioned Parquet staging directory")
+    parser.add_argument('--parquet-dir', default=PARQUET_DIR,
+                        help=f"Output directory for --format parquet (default: {PARQUET_DIR})")
+    parser.add_argument('--sort', action='store_true',
+                        help="Store listings sorted by (state, id) and reviews by (state, listing_id) (duckdb format only)")
+    parser.add_argument('--indexes', choices=list(INDEX_PROFILES), default=DEFAULT_INDEX_PROFILE,
+                        help=f"Index profile: none, point-lookup (ids only) or full (default: {DEFAULT_INDEX_PROFILE})")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Build the id-deduplicated canonical tables after loading (duckdb format only)")
+    parser.add_argument('--split-text', action='store_true',
+                        help="Move the wide text columns to a zstd Parquet cold store after loading (duckdb format only)")
+    add_telemetry_arguments(parser)
+    add_resource_arguments(parser, pipeline=True)
+    args = parser.parse_args()
+    if args.sort and args.format != 'duckdb':
+        parser.error("--sort is only supported with --format duckdb")
+    if args.dedup and args.format != 'duckdb':
+        parser.error("--dedup is only supported with --format duckdb")
+    if args.split_text and args.format != 'duckdb':
+        parser.error("--split-text is only supported with --format duckdb")
+    return args
 
 def main():
     """Main preprocessing function with error handling and timing."""
+    global RESOURCES
+    args = parse_args()
+    RESOURCES = apply_resource_arguments(args)
+    parquet_dir = args.parquet_dir if args.format == 'parquet' else None
     start_time = time.time()
 
     try:
@@ -82,194 +424,111 @@ def main():
         print("-" * 50)
 
         # Connect to DuckDB with performance optimizations
-        con = duckdb.connect('airbnb.db')
+        # (in Parquet mode this database only holds the ingest manifest)
+        if parquet_dir is None:
+            con = duckdb.connect('airbnb.db')
+        else:
+            os.makedirs(parquet_dir, exist_ok=True)
+            con = duckdb.connect(os.path.join(parquet_dir, 'manifest.db'))
 
-        # Performance optimizations
-        con.execute("PRAGMA threads=4")  # Use multiple threads for queries
-        con.execute("PRAGMA memory_limit='4GB'")  # Limit memory usage
-        con.execute("PRAGMA temp_directory='/tmp'")  # Use faster temp storage if available
+        # Threads, memory limit and spill directory sized to this host
+        configure(con, RESOURCES)
 
-        # Get all CSV files
-        listings_files = glob.glob('*_listings.csv')
-        reviews_files = glob.glob('*_reviews.csv')
+        # Get all CSV files (plain, .gz or .zst; parse processes decompress while parsing)
+        listings_files = find_csv_files('listings')
+        reviews_files = find_csv_files('reviews')
 
         print(f"Found {len(listings_files)} listings files and {len(reviews_files)} reviews files")
-        print(f"Using {MAX_WORKERS} parallel workers for processing")
-        print(f"Processing files in chunks of {CHUNK_SIZE:,} rows")
+        print(describe(RESOURCES))
+        print(f"Using {RESOURCES.workers} parse processes feeding a single writer")
+        if parquet_dir is not None:
+            print(f"Writing zstd Parquet partitioned by state to {parquet_dir}/")
         print("-" * 50)
 
         # Create state mapping
         state_mapping = {}
         for file in listings_files + reviews_files:
             # Extract state from filename (e.g., albany_ny_listings.csv -> NY)
-            parts = file.split('_')
-            if len(parts) >= 2:
-                state_code = parts[-2].upper() if len(parts[-2]) == 2 else parts[-3].upper()
-                state_mapping[file] = state_code
+            if len(file.split('_')) >= 2:
+                state_mapping[file] = state_from_filename(file)
 
         print("State mapping:", state_mapping)
 
+        telemetry = IngestTelemetry('preprocess.py')
+
         # Create tables
-        con.execute("""
-            CREATE TABLE IF NOT EXISTS listings (
-                id BIGINT,
-                listing_url TEXT,
-                scrape_id BIGINT,
-                last_scraped DATE,
-                source TEXT,
-                name TEXT,
-                description TEXT,
-                neighborhood_overview TEXT,
-                picture_url TEXT,
-                host_id BIGINT,
-                host_url TEXT,
-                host_name TEXT,
-                host_since DATE,
-                host_location TEXT,
-                host_about TEXT,
-                host_response_time TEXT,
-                host_response_rate TEXT,
-                host_acceptance_rate TEXT,
-                host_is_superhost BOOLEAN,
-                host_thumbnail_url TEXT,
-                host_picture_url TEXT,
-                host_neighbourhood TEXT,
-                host_listings_count INTEGER,
-                host_total_listings_count INTEGER,
-                host_verifications TEXT,
-                host_has_profile_pic BOOLEAN,
-                host_identity_verified BOOLEAN,
-                neighbourhood TEXT,
-                neighbourhood_cleansed TEXT,
-                neighbourhood_group_cleansed TEXT,
-                latitude DOUBLE,
-                longitude DOUBLE,
-                property_type TEXT,
-                room_type TEXT,
-                accommodates INTEGER,
-                bathrooms DOUBLE,
-                bathrooms_text TEXT,
-                bedrooms INTEGER,
-                beds INTEGER,
-                amenities TEXT,
-                price TEXT,
-                minimum_nights INTEGER,
-                maximum_nights INTEGER,
-                minimum_minimum_nights INTEGER,
-                maximum_minimum_nights INTEGER,
-                minimum_maximum_nights INTEGER,
-                maximum_maximum_nights INTEGER,
-                minimum_nights_avg_ntm DOUBLE,
-                maximum_nights_avg_ntm DOUBLE,
-                calendar_updated TEXT,
-                has_availability BOOLEAN,
-                availability_30 INTEGER,
-                availability_60 INTEGER,
-                availability_90 INTEGER,
-                availability_365 INTEGER,
-                calendar_last_scraped DATE,
-                number_of_reviews INTEGER,
-                number_of_reviews_ltm INTEGER,
-                number_of_reviews_l30d INTEGER,
-                availability_eoy INTEGER,
-                number_of_reviews_ly INTEGER,
-                estimated_occupancy_l365d DOUBLE,
-                estimated_revenue_l365d DOUBLE,
-                first_review DATE,
-                last_review DATE,
-                review_scores_rating DOUBLE,
-                review_scores_accuracy DOUBLE,
-                review_scores_cleanliness DOUBLE,
-                review_scores_checkin DOUBLE,
-                review_scores_communication DOUBLE,
-                review_scores_location DOUBLE,
-                review_scores_value DOUBLE,
-                license TEXT,
-                instant_bookable BOOLEAN,
-                calculated_host_listings_count INTEGER,
-                calculated_host_listings_count_entire_homes INTEGER,
-                calculated_host_listings_count_private_rooms INTEGER,
-                calculated_host_listings_count_shared_rooms INTEGER,
-                reviews_per_month DOUBLE,
-                state TEXT
-            )
-        """)
-
-        con.execute("""
-            CREATE TABLE IF NOT EXISTS reviews (
-                listing_id BIGINT,
-                id BIGINT,
-                date DATE,
-                reviewer_id BIGINT,
-                reviewer_name TEXT,
-                comments TEXT,
-                state TEXT
-            )
-        """)
-
-        # Load listings data in parallel
-        print(f"Loading listings data using {MAX_WORKERS} parallel workers...")
-        listings_tasks = [(file, state_mapping[file], 'listings') for file in listings_files]
+        if parquet_dir is None:
+            create_tables(con)
+            add_flag_columns(con)
+            create_summaries(con)
+            create_sketches(con)
+            create_amenities(con)
+        create_manifest(con)
+
+        # Load listings data in parallel, skipping files the manifest says are current
+        listings_plan, listings_skipped = plan_files(con, listings_files, 'listings')
+        file_ids = dict(listings_plan)
+        print(f"Loading {len(listings_plan)} listings files using {RESOURCES.workers} parse processes "
+              f"({len(listings_skipped)} already loaded)...")
+        listings_tasks = [(file, state_mapping[file], 'listings', file_id, parquet_dir) for file, file_id in listings_plan]
 
         total_listings_rows = 0
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            # Submit all tasks
-            future_to_file = {executor.submit(process_file_parallel, task): task[0]
-                             for task in listings_tasks}
-
-            # Process results as they complete
-            with tqdm(total=len(listings_tasks), desc="Processing listings") as pbar:
-                for future in concurrent.futures.as_completed(future_to_file):
-                    file_path, rows_processed, status = future.result()
-                    if status == "success":
-                        total_listings_rows += rows_processed
-                        pbar.set_postfix({"file": os.path.basename(file_path), "rows": rows_processed})
-                    else:
-                        print(f"Failed to process {file_path}: {status}")
-                    pbar.update(1)
-
-        # Load reviews data in parallel
-        print(f"Loading reviews data using {MAX_WORKERS} parallel workers...")
-        reviews_tasks = [(file, state_mapping[file], 'reviews') for file in reviews_files]
+        # Process results as they complete
+        with tqdm(total=len(listings_tasks), desc="Processing listings") as pbar:
+            for file_path, rows_processed, status in load_files(con, listings_tasks, parquet_dir, telemetry):
+                if status == "success":
+                    mark_file_loaded(con, 'listings', file_path, file_ids[file_path], rows_processed,
+                                     state_mapping[file_path], parquet_dir, telemetry.files[file_path])
+                    total_listings_rows += rows_processed
+                else:
+                    mark_failed(con, file_ids[file_path], status)
+                    print(f"Failed to process {file_path}: {status}")
+                telemetry.finish(file_path, rows_processed, status)
+                record = telemetry.files[file_path]
+                pbar.set_postfix({"file": record["file"], "rows": rows_processed,
+                                  "MB/s": f"{record['mb_per_second'] or 0:.1f}"})
+                pbar.update(1)
+
+        # Load reviews data in parallel, skipping files the manifest says are current
+        reviews_plan, reviews_skipped = plan_files(con, reviews_files, 'reviews')
+        file_ids = dict(reviews_plan)
+        print(f"Loading {len(reviews_plan)} reviews files using {RESOURCES.workers} parse processes "
+              f"({len(reviews_skipped)} already loaded)...")
+        reviews_tasks = [(file, state_mapping[file], 'reviews', file_id, parquet_dir) for file, file_id in reviews_plan]
 
         total_reviews_rows = 0
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            # Submit all tasks
-            future_to_file = {executor.submit(process_file_parallel, task): task[0]
-                             for task in reviews_tasks}
-
-            # Process results as they complete
-            with tqdm(total=len(reviews_tasks), desc="Processing reviews") as pbar:
-                for future in concurrent.futures.as_completed(future_to_file):
-                    file_path, rows_processed, status = future.result()
-                    if status == "success":
-                        total_reviews_rows += rows_processed
-                        pbar.set_postfix({"file": os.path.basename(file_path), "rows": rows_processed})
-                    else:
-                        print(f"Failed to process {file_path}: {status}")
-                    pbar.update(1)
-
-        print("Creating indexes...")
-
-        # Create indexes with progress reporting
-        indexes = [
-            ("idx_listings_id", "listings", "id"),
-            ("idx_listings_host_id", "listings", "host_id"),
-            ("idx_listings_state", "listings", "state"),
-            ("idx_reviews_id", "reviews", "id"),
-            ("idx_reviews_listing_id", "reviews", "listing_id"),
-            ("idx_reviews_reviewer_id", "reviews", "reviewer_id"),
-            ("idx_reviews_state", "reviews", "state"),
-        ]
-
-        for index_name, table_name, column_name in tqdm(indexes, desc="Creating indexes"):
-            try:
-                con.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({column_name})")
-            except Exception as e:
-                print(f"Warning: Failed to create index {index_name}: {e}")
-                # Continue with other indexes
+        # Process results as they complete
+        with tqdm(total=len(reviews_tasks), desc="Processing reviews") as pbar:
+            for file_path, rows_processed, status in load_files(con, reviews_tasks, parquet_dir, telemetry):
+                if status == "success":
+                    mark_file_loaded(con, 'reviews', file_path, file_ids[file_path], rows_processed,
+                                     state_mapping[file_path], parquet_dir, telemetry.files[file_path])
+                    total_reviews_rows += rows_processed
+                else:
+                    mark_failed(con, file_ids[file_path], status)
+                    print(f"Failed to process {file_path}: {status}")
+                telemetry.finish(file_path, rows_processed, status)
+                record = telemetry.files[file_path]
+                pbar.set_postfix({"file": record["file"], "rows": rows_processed,
+                                  "MB/s": f"{record['mb_per_second'] or 0:.1f}"})
+                pbar.update(1)
+
+        if parquet_dir is None:
+            # Each state touched by the run is summarized once, not once per file
+            refresh_pending_summaries(con)
+            loaded_tables = [table_name for table_name, rows in
+                             (('listings', total_listings_rows), ('reviews', total_reviews_rows)) if rows]
+            apply_text_split(con, args.split_text)
+            apply_layout(con, args.sort, loaded_tables)
+            apply_dedup(con, args.dedup)
+            print("Creating indexes...")
+            create_indexes(con, args.indexes)
+        else:
+            # Parquet files are not indexed; expose them for the verification counts
+            attach_parquet(con, parquet_dir)
 
         print("Preprocessing complete!")
+        telemetry.write(args.metrics_json, args.metrics_prom)
 
         # Print some basic stats
         print(f"Total listings processed: {total_listings_rows:,}")
@@ -281,6 +540,8 @@ def main():
 
         print(f"Database listings count: {listings_count:,}")
         print(f"Database reviews count: {reviews_count:,}")
+        print(f"Manifest listings count: {loaded_row_count(con, 'listings'):,}")
+        print(f"Manifest reviews count: {loaded_row_count(con, 'reviews'):,}")
 
         con.close()
 
@@ -294,7 +555,7 @@ def main():
         # Performance summary
         total_files = len(listings_files) + len(reviews_files)
         avg_time_per_file = total_time / total_files if total_files > 0 else 0
-        print(".3f")
+        print(f"Average time per file: {avg_time_per_file:.3f} seconds")
 
     except Exception as e:
         print(f"❌ Error during preprocessing: {e}")
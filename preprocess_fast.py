@@ -6,159 +6,237 @@ Alternative to preprocess.py - may be faster on some systems.
 
 import duckdb
 import os
-import glob
 import time
+import argparse
 from tqdm import tqdm
 
-# Configuration
-MAX_WORKERS = 2  # DuckDB handles parallelism internally
-
-def create_tables(con):
-    """Create the database tables."""
-    con.execute("""
-        CREATE TABLE IF NOT EXISTS listings (
-            id BIGINT,
-            listing_url TEXT,
-            scrape_id BIGINT,
-            last_scraped DATE,
-            source TEXT,
-            name TEXT,
-            description TEXT,
-            neighborhood_overview TEXT,
-            picture_url TEXT,
-            host_id BIGINT,
-            host_url TEXT,
-            host_name TEXT,
-            host_since DATE,
-            host_location TEXT,
-            host_about TEXT,
-            host_response_time TEXT,
-            host_response_rate TEXT,
-            host_acceptance_rate TEXT,
-            host_is_superhost BOOLEAN,
-            host_thumbnail_url TEXT,
-            host_picture_url TEXT,
-            host_neighbourhood TEXT,
-            host_listings_count INTEGER,
-            host_total_listings_count INTEGER,
-            host_verifications TEXT,
-            host_has_profile_pic BOOLEAN,
-            host_identity_verified BOOLEAN,
-            neighbourhood TEXT,
-            neighbourhood_cleansed TEXT,
-            neighbourhood_group_cleansed TEXT,
-            latitude DOUBLE,
-            longitude DOUBLE,
-            property_type TEXT,
-            room_type TEXT,
-            accommodates INTEGER,
-            bathrooms DOUBLE,
-            bathrooms_text TEXT,
-            bedrooms INTEGER,
-            beds INTEGER,
-            amenities TEXT,
-            price TEXT,
-            minimum_nights INTEGER,
-            maximum_nights INTEGER,
-            minimum_minimum_nights INTEGER,
-            maximum_minimum_nights INTEGER,
-            minimum_maximum_nights INTEGER,
-            maximum_maximum_nights INTEGER,
-            minimum_nights_avg_ntm DOUBLE,
-            maximum_nights_avg_ntm DOUBLE,
-            calendar_updated TEXT,
-            has_availability BOOLEAN,
-            availability_30 INTEGER,
-            availability_60 INTEGER,
-            availability_90 INTEGER,
-            availability_365 INTEGER,
-            calendar_last_scraped DATE,
-            number_of_reviews INTEGER,
-            number_of_reviews_ltm INTEGER,
-            number_of_reviews_l30d INTEGER,
-            availability_eoy INTEGER,
-            number_of_reviews_ly INTEGER,
-            estimated_occupancy_l365d DOUBLE,
-            estimated_revenue_l365d DOUBLE,
-            first_review DATE,
-            last_review DATE,
-            review_scores_rating DOUBLE,
-            review_scores_accuracy DOUBLE,
-            review_scores_cleanliness DOUBLE,
-            review_scores_checkin DOUBLE,
-            review_scores_communication DOUBLE,
-            review_scores_location DOUBLE,
-            review_scores_value DOUBLE,
-            license TEXT,
-            instant_bookable BOOLEAN,
-            calculated_host_listings_count INTEGER,
-            calculated_host_listings_count_entire_homes INTEGER,
-            calculated_host_listings_count_private_rooms INTEGER,
-            calculated_host_listings_count_shared_rooms INTEGER,
-            reviews_per_month DOUBLE,
-            state TEXT
-        )
-    """)
-
-    con.execute("""
-        CREATE TABLE IF NOT EXISTS reviews (
-            listing_id BIGINT,
-            id BIGINT,
-            date DATE,
-            reviewer_id BIGINT,
-            reviewer_name TEXT,
-            comments TEXT,
-            state TEXT
-        )
-    """)
-
-def import_csv_files(con, file_pattern, state_mapping, table_name):
-    """Import CSV files using DuckDB's native CSV reader."""
-    files = glob.glob(file_pattern)
+from amenities import create_amenities, refresh_amenities
+from coldstore import apply_text_split
+from db import PARQUET_DIR, parquet_path
+from dedup import apply_dedup, drop_canonical
+from keywords import add_flag_columns, flag_select_sql
+from layout import DEFAULT_INDEX_PROFILE, INDEX_PROFILES, apply_layout, create_indexes, drop_indexes
+from manifest import create_manifest, mark_failed, mark_loaded, plan_files
+from resources import add_resource_arguments, apply_resource_arguments, configure, describe
+from schema import (create_tables, create_types, csv_columns, csv_select_sql, find_csv_files, state_from_filename,
+                    state_from_filename_sql)
+from sketches import create_sketches, refresh_sketches
+from summaries import create_summaries, mark_summaries_stale, refresh_pending_summaries
+from telemetry import IngestTelemetry, Stage, add_telemetry_arguments
+
+def import_csv_files(con, file_paths, state_mapping, table_name, telemetry):
+    """
+    Import CSV files using DuckDB's native CSV reader.
+
+    Files the ingest manifest already records as loaded (and unchanged) are
+    skipped; each remaining file replaces its previous rows, marks its state's
+    summaries pending and refreshes its distinct-count sketches in one
+    transaction.
+    The import (parse and insert) and the refresh/commit are timed per file.
+    """
+    files, skipped = plan_files(con, file_paths, table_name)
     total_rows = 0
 
-    for file_path in tqdm(files, desc=f"Importing {table_name}"):
+    if skipped:
+        print(f"Skipping {len(skipped)} {table_name} files that are already loaded")
+
+    # Explicit column names and types let the rows be inserted BY NAME
+    columns = ", ".join(f"'{name}': '{col_type}'" for name, col_type in csv_columns(table_name).items())
+
+    if files:
+        # Indexes would be maintained row by row; create_indexes rebuilds them after the run
+        drop_indexes(con, table_name)
+
+    for file_path, file_id in tqdm(files, desc=f"Importing {table_name}"):
+        state_code = state_mapping[file_path]
+        stats = telemetry.start(file_path, table_name, state_code, parses=False)
         try:
-            state_code = state_mapping[file_path]
+            con.execute("BEGIN TRANSACTION")
 
-            # Use DuckDB's native CSV import with state column added
-            query = f"""
-                INSERT INTO {table_name}
-                SELECT *, '{state_code}' as state
-                FROM read_csv_auto('{file_path}')
-            """
-            con.execute(query)
+            with Stage(stats, 'insert'):
+                # Replace any rows from an earlier version of this file
+                con.execute(f"DELETE FROM {table_name} WHERE file_id = ?", [file_id])
 
-            # Count rows in this file
-            file_rows = con.execute(f"SELECT COUNT(*) FROM {table_name} WHERE state = '{state_code}'").fetchone()[0]
+                # Use DuckDB's native CSV import, converting typed columns and adding state, provenance and keyword flags
+                query = f"""
+                    INSERT INTO {table_name} BY NAME
+                    SELECT {csv_select_sql(table_name)}, '{state_code}' as state, {file_id} as file_id{flag_select_sql(table_name)}
+                    FROM read_csv('{file_path}', header = true, columns = {{{columns}}})
+                """
+                file_rows = con.execute(query).fetchone()[0]
+            with Stage(stats, 'refresh'):
+                mark_summaries_stale(con, table_name, [state_code])
+                refresh_sketches(con, table_name, [file_id])
+                refresh_amenities(con, table_name, [file_id])
+                drop_canonical(con, table_name)
+                mark_loaded(con, file_id, file_rows)
+            with Stage(stats, 'commit'):
+                con.execute("COMMIT")
             total_rows += file_rows
+            telemetry.finish(file_path, file_rows, "success")
 
         except Exception as e:
+            con.execute("ROLLBACK")
+            mark_failed(con, file_id, str(e))
+            telemetry.finish(file_path, 0, "failed")
             print(f"Error importing {file_path}: {e}")
             continue
 
     return total_rows
 
-def create_indexes(con):
-    """Create database indexes."""
-    indexes = [
-        ("idx_listings_id", "listings", "id"),
-        ("idx_listings_host_id", "listings", "host_id"),
-        ("idx_listings_state", "listings", "state"),
-        ("idx_reviews_id", "reviews", "id"),
-        ("idx_reviews_listing_id", "reviews", "listing_id"),
-        ("idx_reviews_reviewer_id", "reviews", "reviewer_id"),
-        ("idx_reviews_state", "reviews", "state"),
-    ]
-
-    for index_name, table_name, column_name in tqdm(indexes, desc="Creating indexes"):
+def import_csv_files_single_scan(con, file_paths, table_name, telemetry):
+    """
+    Import all pending CSV files of a table with a single multi-file scan.
+
+    DuckDB reads the files in parallel and the state code is derived from each
+    row's source file name in SQL. The whole import is one transaction: if any
+    file fails, nothing is loaded and the error is raised. Being one
+    statement, it is timed as a single telemetry entry for the table.
+
+    Each row gets its file_id by joining its source file name to the ingest
+    manifest. The join is a LEFT JOIN and the split per file is read back
+    from the file_id column (narrow, and nearly constant per row group), so
+    rows whose file name matches no manifest path, or a planned file that
+    contributed no rows, fail the import instead of silently going missing.
+    ``INSERT ... RETURNING`` buffers every inserted row in full before
+    returning any, and a tally taken while streaming the scan through Python
+    serializes the insert.
+    """
+    files, skipped = plan_files(con, file_paths, table_name)
+    entry = f"{table_name}: {len(files)} files in one scan"
+
+    if skipped:
+        print(f"Skipping {len(skipped)} {table_name} files that are already loaded")
+    if not files:
+        return 0
+    drop_indexes(con, table_name)  # rebuilt by create_indexes after the run
+
+    file_list = ", ".join(f"'{file_path}'" for file_path, _ in files)
+    file_ids = ", ".join(str(file_id) for _, file_id in files)
+    columns = ", ".join(f"'{name}': '{col_type}'" for name, col_type in csv_columns(table_name).items())
+
+    stats = telemetry.start(entry, table_name, None, parses=False)
+    stats['bytes'] = sum(os.path.getsize(file_path) for file_path, _ in files)
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        with Stage(stats, 'insert'):
+            con.execute(f"DELETE FROM {table_name} WHERE file_id IN ({file_ids})")
+            print(f"Importing {len(files)} {table_name} files in one scan...")
+            con.execute(f"""
+                INSERT INTO {table_name} BY NAME
+                SELECT {csv_select_sql(table_name, 'csv.* EXCLUDE (filename)')},
+                       {state_from_filename_sql('csv.filename')} AS state,
+                       m.file_id
+                       {flag_select_sql(table_name)}
+                FROM read_csv([{file_list}], header = true, filename = true, columns = {{{columns}}}) csv
+                LEFT JOIN ingest_manifest m ON m.path = csv.filename
+            """)
+
+        with Stage(stats, 'refresh'):
+            file_rows = dict(con.execute(f"""
+                SELECT file_id, COUNT(*) FROM {table_name}
+                WHERE file_id IN ({file_ids}) OR file_id IS NULL
+                GROUP BY file_id
+            """).fetchall())
+            if None in file_rows:
+                raise RuntimeError(f"{file_rows[None]:,} scanned {table_name} rows come from a file name "
+                                   f"that matches no ingest manifest path")
+            missing = [file_path for file_path, file_id in files if file_id not in file_rows]
+            if missing:
+                raise RuntimeError(f"the scan loaded no rows for {', '.join(missing)}")
+            mark_summaries_stale(con, table_name, [state_from_filename(file_path) for file_path, _ in files])
+            refresh_sketches(con, table_name, [file_id for _, file_id in files])
+            refresh_amenities(con, table_name, [file_id for _, file_id in files])
+            drop_canonical(con, table_name)
+            for _, file_id in files:
+                mark_loaded(con, file_id, file_rows.get(file_id, 0))
+        with Stage(stats, 'commit'):
+            con.execute("COMMIT")
+
+    except Exception as e:
+        con.execute("ROLLBACK")
+        for _, file_id in files:
+            mark_failed(con, file_id, str(e))
+        telemetry.finish(entry, 0, "failed")
+        raise
+
+    telemetry.finish(entry, sum(file_rows.values()), "success")
+    return sum(file_rows.values())
+
+def export_csv_files(con, file_paths, state_mapping, table_name, parquet_dir, telemetry):
+    """Convert CSV files to state-partitioned, zstd-compressed Parquet."""
+    files, skipped = plan_files(con, file_paths, table_name)
+    total_rows = 0
+
+    if skipped:
+        print(f"Skipping {len(skipped)} {table_name} files that are already exported")
+
+    # Explicit column types keep the schema identical across all files
+    columns = ", ".join(f"'{name}': '{col_type}'" for name, col_type in csv_columns(table_name).items())
+
+    for file_path, file_id in tqdm(files, desc=f"Exporting {table_name}"):
+        state_code = state_mapping[file_path]
+        stats = telemetry.start(file_path, table_name, state_code, parses=False)
         try:
-            con.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({column_name})")
+            output_path = parquet_path(parquet_dir, table_name, state_code, file_path)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+            # state is encoded in the partition directory, not stored in the file
+            query = f"""
+                COPY (SELECT {csv_select_sql(table_name)}{flag_select_sql(table_name)}
+                      FROM read_csv('{file_path}', header = true, columns = {{{columns}}}))
+                TO '{output_path}.tmp' (FORMAT parquet, COMPRESSION zstd)
+            """
+            with Stage(stats, 'insert'):
+                file_rows = con.execute(query).fetchone()[0]
+            with Stage(stats, 'commit'):
+                os.replace(f"{output_path}.tmp", output_path)
+                mark_loaded(con, file_id, file_rows)
+            total_rows += file_rows
+            telemetry.finish(file_path, file_rows, "success")
+
         except Exception as e:
-            print(f"Warning: Failed to create index {index_name}: {e}")
+            mark_failed(con, file_id, str(e))
+            telemetry.finish(file_path, 0, "failed")
+            print(f"Error exporting {file_path}: {e}")
+            continue
+
+    return total_rows
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Load the Airbnb CSV files with DuckDB's native CSV reader.")
+    parser.add_argument('--format', choices=['duckdb', 'parquet'], default='duckdb',
+                        help="duckdb: build airbnb.db (default); parquet: write a state-partitioned Parquet staging directory")
+    parser.add_argument('--parquet-dir', default=PARQUET_DIR,
+                        help=f"Output directory for --format parquet (default: {PARQUET_DIR})")
+    parser.add_argument('--single-scan', action='store_true',
+                        help="Import all files of a table with one multi-file read_csv scan (duckdb format only)")
+    parser.add_argument('--sort', action='store_true',
+                        help="Store listings sorted by (state, id) and reviews by (state, listing_id) (duckdb format only)")
+    parser.add_argument('--indexes', choices=list(INDEX_PROFILES), default=DEFAULT_INDEX_PROFILE,
+                        help=f"Index profile: none, point-lookup (ids only) or full (default: {DEFAULT_INDEX_PROFILE})")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Build the id-deduplicated canonical tables after loading (duckdb format only)")
+    parser.add_argument('--split-text', action='store_true',
+                        help="Move the wide text columns to a zstd Parquet cold store after loading (duckdb format only)")
+    add_telemetry_arguments(parser)
+    add_resource_arguments(parser)
+    args = parser.parse_args()
+    if args.single_scan and args.format != 'duckdb':
+        parser.error("--single-scan is only supported with --format duckdb")
+    if args.sort and args.format != 'duckdb':
+        parser.error("--sort is only supported with --format duckdb")
+    if args.dedup and args.format != 'duckdb':
+        parser.error("--dedup is only supported with --format duckdb")
+    if args.split_text and args.format != 'duckdb':
+        parser.error("--split-text is only supported with --format duckdb")
+    return args
 
 def main():
     """Main preprocessing function using DuckDB native CSV import."""
+    args = parse_args()
     start_time = time.time()
 
     try:
@@ -167,41 +245,83 @@ def main():
         print("-" * 50)
 
         # Connect to DuckDB with optimizations
-        con = duckdb.connect('airbnb.db')
-        con.execute("PRAGMA threads=4")
-        con.execute("PRAGMA memory_limit='4GB'")
+        # (in Parquet mode this database only holds the ingest manifest)
+        if args.format == 'duckdb':
+            con = duckdb.connect('airbnb.db')
+        else:
+            os.makedirs(args.parquet_dir, exist_ok=True)
+            con = duckdb.connect(os.path.join(args.parquet_dir, 'manifest.db'))
+        resources = apply_resource_arguments(args)
+        configure(con, resources)
         con.execute("SET enable_progress_bar=true")
+        print(describe(resources))
 
         # Get all CSV files
-        listings_files = glob.glob('*_listings.csv')
-        reviews_files = glob.glob('*_reviews.csv')
+        listings_files = find_csv_files('listings')
+        reviews_files = find_csv_files('reviews')
 
         print(f"Found {len(listings_files)} listings files and {len(reviews_files)} reviews files")
+        compressed = [file for file in listings_files + reviews_files if not file.endswith('.csv')]
+        if compressed and args.format == 'duckdb' and not args.single_scan:
+            # A compressed file cannot be split between threads; a multi-file scan spreads the files instead
+            print(f"{len(compressed)} files are compressed and are decompressed one at a time on a single thread; "
+                  f"--single-scan decompresses them in parallel")
 
         # Create state mapping
         state_mapping = {}
         for file in listings_files + reviews_files:
-            parts = file.split('_')
-            if len(parts) >= 2:
-                state_code = parts[-2].upper() if len(parts[-2]) == 2 else parts[-3].upper()
-                state_mapping[file] = state_code
+            if len(file.split('_')) >= 2:
+                state_mapping[file] = state_from_filename(file)
+
+        telemetry = IngestTelemetry('preprocess_fast.py')
+
+        if args.format == 'parquet':
+            # Write Parquet staging files instead of airbnb.db
+            create_types(con)  # The export casts to the ENUM types
+            create_manifest(con)
+            print(f"Exporting listings data to {args.parquet_dir}/...")
+            total_listings = export_csv_files(con, listings_files, state_mapping, 'listings', args.parquet_dir, telemetry)
+
+            print(f"Exporting reviews data to {args.parquet_dir}/...")
+            total_reviews = export_csv_files(con, reviews_files, state_mapping, 'reviews', args.parquet_dir, telemetry)
+        else:
+            # Create tables
+            print("Creating tables...")
+            create_tables(con)
+            add_flag_columns(con)
+            create_summaries(con)
+            create_sketches(con)
+            create_amenities(con)
+            create_manifest(con)
+
+            # Import data using DuckDB native CSV reader
+            if args.single_scan:
+                print("Importing listings data...")
+                total_listings = import_csv_files_single_scan(con, listings_files, 'listings', telemetry)
 
-        # Create tables
-        print("Creating tables...")
-        create_tables(con)
+                print("Importing reviews data...")
+                total_reviews = import_csv_files_single_scan(con, reviews_files, 'reviews', telemetry)
+            else:
+                print("Importing listings data...")
+                total_listings = import_csv_files(con, listings_files, state_mapping, 'listings', telemetry)
 
-        # Import data using DuckDB native CSV reader
-        print("Importing listings data...")
-        total_listings = import_csv_files(con, '*_listings.csv', state_mapping, 'listings')
+                print("Importing reviews data...")
+                total_reviews = import_csv_files(con, reviews_files, state_mapping, 'reviews', telemetry)
 
-        print("Importing reviews data...")
-        total_reviews = import_csv_files(con, '*_reviews.csv', state_mapping, 'reviews')
+            # Each state touched by the run is summarized once, not once per file
+            refresh_pending_summaries(con)
+            loaded_tables = [table_name for table_name, rows in
+                             (('listings', total_listings), ('reviews', total_reviews)) if rows]
+            apply_text_split(con, args.split_text)
+            apply_layout(con, args.sort, loaded_tables)
+            apply_dedup(con, args.dedup)
 
-        # Create indexes
-        create_indexes(con)
+            # Create indexes
+            create_indexes(con, args.indexes)
 
         # Final statistics
         print("Preprocessing complete!")
+        telemetry.write(args.metrics_json, args.metrics_prom)
         print(f"Total listings: {total_listings:,}")
         print(f"Total reviews: {total_reviews:,}")
 
@@ -0,0 +1,192 @@
+"""
+Persistent query result cache for the analysis scripts.
+
+``airbnb.db`` only changes when ingest (or another build step) writes to it,
+yet every script run pays for its scans again. ``connect_cached()`` returns a
+drop-in replacement for ``db.connect()`` whose ``execute(...).fetchone()`` /
+``fetchall()`` results are stored on disk, keyed by
+
+- the normalized SQL text (whitespace collapsed outside string literals) and
+  its parameters, and
+- a fingerprint of the data: size and mtime of the database file and its WAL
+  for the ``duckdb`` backend, of every Parquet file for ``parquet``.
+
+Any write to the data changes the fingerprint, so stale results are never
+returned; they are dropped the next time the cache is opened. The cache
+itself is a small SQLite file (safe for concurrent script runs) bounded to
+AIRBNB_CACHE_MAX_MB, evicting least recently used results first. The DuckDB
+connection is only opened on a cache miss, so a fully cached run does not
+touch the database at all.
+
+Environment:
+    AIRBNB_CACHE          set to 0 to bypass the cache (default: 1)
+    AIRBNB_CACHE_PATH     cache file (default: .query_cache.sqlite)
+    AIRBNB_CACHE_MAX_MB   size bound in MB (default: 64)
+"""
+
+import glob
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import time
+
+import duckdb
+
+from db import BACKEND, DB_PATH, PARQUET_DIR, connect, parquet_glob
+from schema import TABLES
+
+CACHE_ENABLED = os.environ.get('AIRBNB_CACHE', '1') != '0'
+CACHE_PATH = os.environ.get('AIRBNB_CACHE_PATH', '.query_cache.sqlite')
+CACHE_MAX_BYTES = int(float(os.environ.get('AIRBNB_CACHE_MAX_MB', '64')) * 1024 * 1024)
+
+# String literals and quoted identifiers are kept verbatim when normalizing
+QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside quoted text and drop a trailing semicolon."""
+    parts = QUOTED.split(sql)
+    for index in range(0, len(parts), 2):
+        parts[index] = " ".join(parts[index].split())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def data_files(backend: str) -> list:
+    """Files whose contents the query results depend on."""
+    if backend == 'duckdb':
+        return [DB_PATH, DB_PATH + '.wal']
+    return sorted(path for table_name in TABLES for path in glob.glob(parquet_glob(table_name, PARQUET_DIR)))
+
+
+def fingerprint(backend: str) -> str:
+    """Digest of the size and mtime of every data file (missing files included)."""
+    digest = hashlib.sha256(backend.encode())
+    for path in data_files(backend):
+        try:
+            stat = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        except FileNotFoundError:
+            digest.update(f"{os.path.abspath(path)}:missing;".encode())
+    return digest.hexdigest()
+
+
+class CachedResult:
+    """Rows of a cached query, with the fetch methods the scripts use."""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.position = 0
+
+    def fetchone(self):
+        if self.position >= len(self.rows):
+            return None
+        self.position += 1
+        return self.rows[self.position - 1]
+
+    def fetchall(self) -> list:
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+
+class CachedConnection:
+    """
+    A read-only stand-in for a DuckDB connection that caches query results.
+
+    Only ``execute`` (followed by ``fetchone``/``fetchall``) and ``close`` are
+    supported, which is all the analysis scripts use.
+    """
+
+    def __init__(self, backend: str = None, cache_path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.backend = backend or BACKEND
+        self.max_bytes = max_bytes
+        self.source = os.path.abspath(DB_PATH if self.backend == 'duckdb' else PARQUET_DIR)
+        self.fingerprint = fingerprint(self.backend)
+        self.con = None
+        self.hits = self.misses = 0
+
+        self.cache = sqlite3.connect(cache_path, timeout=30)
+        self.cache.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                source TEXT,
+                fingerprint TEXT,
+                sql TEXT,
+                rows BLOB,
+                size INTEGER,
+                last_used REAL
+            )
+        """)
+        # Results computed from an earlier version of this data can never be hit again
+        self.cache.execute("DELETE FROM results WHERE source = ? AND fingerprint != ?",
+                           [self.source, self.fingerprint])
+        self.cache.commit()
+
+    def connection(self) -> duckdb.DuckDBPyConnection:
+        """The underlying connection, opened on first use."""
+        if self.con is None:
+            self.con = connect(self.backend)
+        return self.con
+
+    def execute(self, sql: str, parameters=None) -> CachedResult:
+        """Return the cached rows of a query, running and storing it on a miss."""
+        normalized = normalize_sql(sql)
+        key = hashlib.sha256(
+            f"{self.source}\0{self.fingerprint}\0{normalized}\0{parameters!r}".encode()
+        ).hexdigest()
+
+        entry = self.cache.execute("SELECT rows FROM results WHERE key = ?", [key]).fetchone()
+        if entry is not None:
+            self.hits += 1
+            self.cache.execute("UPDATE results SET last_used = ? WHERE key = ?", [time.time(), key])
+            self.cache.commit()
+            return CachedResult(pickle.loads(entry[0]))
+
+        self.misses += 1
+        rows = self.connection().execute(sql, parameters).fetchall()
+        self.store(key, normalized, rows)
+        return CachedResult(rows)
+
+    def store(self, key: str, normalized: str, rows: list):
+        """Save a result and evict least recently used ones beyond the size bound."""
+        blob = pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        self.cache.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [key, self.source, self.fingerprint, normalized, blob, len(blob), time.time()],
+        )
+        total = self.cache.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        for old_key, size in self.cache.execute(
+            "SELECT key, size FROM results ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self.cache.execute("DELETE FROM results WHERE key = ?", [old_key])
+            total -= size
+        self.cache.commit()
+
+    def close(self):
+        if self.con is not None:
+            self.con.close()
+        self.cache.close()
+
+
+def connect_cached(backend: str = None):
+    """
+    Open a connection for the analysis scripts.
+
+    Returns a connection to the query service when one is running (see
+    query_service.py), otherwise a CachedConnection, or a plain DuckDB
+    connection when the cache is disabled with AIRBNB_CACHE=0.
+    """
+    from query_service import service_connection  # query_service imports this module
+
+    service = service_connection()
+    if service is not None:
+        return service
+    if not CACHE_ENABLED:
+        return connect(backend)
+    return CachedConnection(backend)
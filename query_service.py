@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Long-running local query service over a warm, read-only airbnb.db.
+
+Every analysis script otherwise opens airbnb.db itself, pays connection
+startup and a cold buffer pool again, and, opening the file read-write,
+locks every other script out while it runs. The service opens the database
+once, read-only, keeps a pool of cursors on that one connection (so its
+buffer pool stays warm between requests), and answers on a Unix socket.
+
+Protocol: one JSON object per line in each direction.
+
+    {"sql": "SELECT ...", "parameters": [...], "label": "..."}   ad-hoc SQL
+    {"question": "top_host"}                                    a run_all.py question
+    {"stats": true}                                             latency report
+
+Answers are ``{"columns": [...], "rows": [[...], ...], "seconds": ...}`` or
+``{"error": "..."}``. Values that JSON has no type for (decimals, dates)
+are sent as text. Clients are served concurrently by an asyncio server; each
+request borrows a cursor from the pool and runs on a worker thread, and its
+latency is recorded under its label (the question name, or the normalized
+SQL). run_all.py's shared sub-results are computed once at startup, so the
+questions are answered from small in-memory tables.
+
+While the service runs, ``connect_cached()`` hands the analysis scripts a
+ServiceConnection instead of opening the database, so they become thin
+clients (set AIRBNB_SERVICE=0 to bypass it). Ingest cannot write airbnb.db
+while the service holds it open; stop the service (Ctrl-C) before
+preprocessing.
+
+Usage:
+    python3 query_service.py serve                     # run the service
+    python3 query_service.py ask                       # every question, concurrently
+    python3 query_service.py sql "SELECT state, COUNT(*) FROM listings GROUP BY state"
+    python3 query_service.py stats
+
+Environment:
+    AIRBNB_SERVICE          set to 0 to make the scripts ignore the service (default: 1)
+    AIRBNB_SERVICE_SOCKET   socket path (default: .airbnb_query.sock)
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import signal
+import socket
+import statistics
+import time
+from collections import defaultdict, deque
+from typing import Optional
+
+import duckdb
+
+from db import connect
+from query_cache import CachedResult, normalize_sql
+from resources import detect_resources
+from run_all import QUESTIONS, SCRATCH, shared_results
+
+SERVICE_ENABLED = os.environ.get('AIRBNB_SERVICE', '1') != '0'
+SOCKET_PATH = os.environ.get('AIRBNB_SERVICE_SOCKET', '.airbnb_query.sock')
+LATENCY_SAMPLES = 1000  # Most recent latencies kept per label
+
+
+def encode(message: dict) -> bytes:
+    """One protocol line."""
+    return json.dumps(message, default=str).encode() + b"\n"
+
+
+class LatencyStats:
+    """Per-label query latencies (the most recent LATENCY_SAMPLES of each)."""
+
+    def __init__(self):
+        self.samples = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+        self.counts = defaultdict(int)
+        self.errors = defaultdict(int)
+
+    def record(self, label: str, seconds: float, failed: bool = False):
+        self.samples[label].append(seconds)
+        self.counts[label] += 1
+        self.errors[label] += failed
+
+    def report(self) -> dict:
+        """Label -> count, errors and mean/p50/p95/max latency in milliseconds."""
+        report = {}
+        for label, samples in self.samples.items():
+            ordered = sorted(samples)
+            report[label] = {
+                "count": self.counts[label],
+                "errors": self.errors[label],
+                "mean_ms": statistics.fmean(ordered) * 1000,
+                "p50_ms": ordered[len(ordered) // 2] * 1000,
+                "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return report
+
+
+def print_stats(report: dict):
+    """Print a latency report, busiest labels first."""
+    print(f"{'query':<50}{'count':>8}{'errors':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for label, row in sorted(report.items(), key=lambda item: item[1]["count"], reverse=True):
+        print(f"{label[:49]:<50}{row['count']:>8}{row['errors']:>8}{row['mean_ms']:>10.2f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['max_ms']:>10.2f}")
+
+
+def execute_on(cursor: duckdb.DuckDBPyConnection, sql: str, parameters) -> tuple:
+    """Run a query on a cursor; return (column names, rows)."""
+    result = cursor.execute(sql, parameters)
+    columns = [column[0] for column in result.description] if result.description else []
+    return columns, result.fetchall()
+
+
+class QueryService:
+    """A read-only connection, its cursor pool and the latency statistics."""
+
+    def __init__(self, backend: str = None, pool_size: int = None):
+        self.pool_size = pool_size or detect_resources().threads
+        self.con = connect(backend, read_only=True)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size)
+        self.cursors = asyncio.Queue()
+        # Cursors start in the default database; point them where connect() left the connection
+        database = self.con.execute("SELECT current_database()").fetchone()[0]
+        for _ in range(self.pool_size):
+            cursor = self.con.cursor()
+            cursor.execute(f"USE {database}")
+            self.cursors.put_nowait(cursor)
+        self.stats = LatencyStats()
+
+    def prepare_questions(self):
+        """Compute run_all's shared sub-results once; this also warms the buffer pool."""
+        self.con.execute(f"ATTACH ':memory:' AS {SCRATCH}")
+        for sub_result, sql in shared_results(self.con).items():
+            start_time = time.time()
+            self.con.execute(f"CREATE TABLE {SCRATCH}.{sub_result} AS {sql}")
+            print(f"Shared result {sub_result} took {time.time() - start_time:.3f} seconds")
+
+    async def run(self, sql: str, parameters, label: str) -> dict:
+        """Run a query on a pooled cursor and record its latency."""
+        cursor = await self.cursors.get()
+        start_time = time.perf_counter()
+        try:
+            columns, rows = await asyncio.get_running_loop().run_in_executor(
+                self.executor, execute_on, cursor, sql, parameters)
+        except duckdb.Error as e:
+            self.stats.record(label, time.perf_counter() - start_time, failed=True)
+            return {"error": str(e)}
+        finally:
+            self.cursors.put_nowait(cursor)
+        seconds = time.perf_counter() - start_time
+        self.stats.record(label, seconds)
+        return {"columns": columns, "rows": rows, "seconds": seconds}
+
+    async def answer(self, request: dict) -> dict:
+        """Answer one protocol request."""
+        if request.get("stats"):
+            return {"stats": self.stats.report()}
+        if "question" in request:
+            name = request["question"]
+            if name not in QUESTIONS:
+                return {"error": f"unknown question: {name} (expected one of {', '.join(QUESTIONS)})"}
+            return await self.run(QUESTIONS[name]['sql'], None, name)
+        if "sql" in request:
+            label = request.get("label") or normalize_sql(request["sql"])
+            return await self.run(request["sql"], request.get("parameters"), label)
+        return {"error": "expected a 'sql', 'question' or 'stats' request"}
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one client connection until it disconnects."""
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.answer(json.loads(line))
+                except (ValueError, TypeError) as e:
+                    response = {"error": f"bad request: {e}"}
+                writer.write(encode(response))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str):
+        """Listen on the socket until interrupted, then print the latency report."""
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Left behind by a service that did not shut down cleanly
+        server = await asyncio.start_unix_server(self.handle_client, path=socket_path)
+        stop = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(signal_number, stop.set)
+        print(f"Serving on {socket_path} with {self.pool_size} cursors (Ctrl-C to stop)")
+
+        async with server:
+            await stop.wait()
+        os.remove(socket_path)
+        self.executor.shutdown()
+        self.con.close()
+        if self.stats.counts:
+            print_stats(self.stats.report())
+
+
+class ServiceConnection:
+    """
+    A stand-in for a DuckDB connection that sends queries to the service.
+
+    Supports ``execute`` (followed by ``fetchone``/``fetchall``) and
+    ``close``, like query_cache's CachedConnection.
+    """
+
+    def __init__(self, socket_path: str = SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.stream = self.sock.makefile('rwb')
+
+    def request(self, message: dict) -> dict:
+        """Send one request and wait for its answer."""
+        self.stream.write(encode(message))
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("query service closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise duckdb.Error(response["error"])
+        return response
+
+    def execute(self, sql: str, parameters=None) -> CachedResult:
+        response = self.request({"sql": sql, "parameters": parameters})
+        return CachedResult([tuple(row) for row in response["rows"]])
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+
+def service_connection(socket_path: str = SOCKET_PATH) -> Optional[ServiceConnection]:
+    """A connection to the running service, or None when there is none (or AIRBNB_SERVICE=0)."""
+    if not SERVICE_ENABLED or not os.path.exists(socket_path):
+        return None
+    try:
+        return ServiceConnection(socket_path)
+    except OSError:
+        return None
+
+
+async def ask(socket_path: str, names: list) -> list:
+    """
+    Send questions to the service concurrently, one client connection each.
+
+    Returns:
+        List of (question name, response, round-trip seconds) in request order
+    """
+    async def one(name: str):
+        start_time = time.perf_counter()
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(encode({"question": name}))
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        writer.close()
+        await writer.wait_closed()
+        return name, response, time.perf_counter() - start_time
+
+    return await asyncio.gather(*(one(name) for name in names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the challenge queries from a warm, read-only airbnb.db.")
+    parser.add_argument('--socket', default=SOCKET_PATH, help=f"Unix socket path (default: {SOCKET_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="Run the service")
+    serve_parser.add_argument('--pool', type=int, help="Cursors serving queries at once (default: DuckDB threads)")
+    serve_parser.add_argument('--backend', choices=['duckdb', 'parquet'], help="Storage backend (default: AIRBNB_BACKEND)")
+
+    ask_parser = commands.add_parser('ask', help="Answer challenge questions through the service")
+    ask_parser.add_argument('questions', nargs='*', help=f"Questions to ask (default: all of {', '.join(QUESTIONS)})")
+
+    sql_parser = commands.add_parser('sql', help="Run an ad-hoc query through the service")
+    sql_parser.add_argument('query', help="SQL to run")
+
+    commands.add_parser('stats', help="Print the service's per-query latency report")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        async def serve():
+            service = QueryService(args.backend, args.pool)
+            start_time = time.time()
+            service.prepare_questions()
+            print(f"Warmed up in {time.time() - start_time:.3f} seconds")
+            await service.serve(args.socket)
+
+        asyncio.run(serve())
+        return
+
+    if not os.path.exists(args.socket):
+        parser.error(f"no query service at {args.socket} (start one with: python3 query_service.py serve)")
+
+    if args.command == 'ask':
+        unknown = [name for name in args.questions if name not in QUESTIONS]
+        if unknown:
+            parser.error(f"unknown questions: {', '.join(unknown)}")
+        for name, response, seconds in asyncio.run(ask(args.socket, args.questions or list(QUESTIONS))):
+            print(f"\n=== {QUESTIONS[name]['title']} ===")
+            if "error" in response:
+                print(f"Error: {response['error']}")
+                continue
+            for value in response["rows"][0] if response["rows"] else ():
+                print(value)
+            print(f"({name} took {response['seconds'] * 1000:.2f} ms in the service, {seconds * 1000:.2f} ms round trip)")
+        return
+
+    con = ServiceConnection(args.socket)
+    if args.command == 'sql':
+        try:
+            response = con.request({"sql": args.query})
+        except duckdb.Error as e:
+            con.close()
+            raise SystemExit(f"Error: {e}")
+        print("\t".join(response["columns"]))
+        for row in response["rows"]:
+            print("\t".join(str(value) for value in row))
+        print(f"({len(response['rows'])} rows, {response['seconds'] * 1000:.2f} ms)")
+    else:
+        print_stats(con.request({"stats": True})["stats"])
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Resource governor: size threads, memory, spill space and batches to the host.
+
+Instead of fixed ``threads=4`` / ``memory_limit='4GB'`` settings, every
+script derives its limits from what it can actually use:
+
+- cores: the CPU affinity mask, capped by a cgroup CPU quota (v1 or v2)
+- memory: physical memory, capped by a cgroup memory limit (v1 or v2)
+- temp space: free space on the spill directory's filesystem
+
+and from those:
+
+- DuckDB threads = cores
+- DuckDB memory_limit = MEMORY_FRACTION of memory
+- DuckDB spill directory and max_temp_directory_size = TEMP_FRACTION of its free space
+- preprocess.py parse processes = cores - 1 (one core is left for the writer)
+- Arrow batch size, shrunk so the parse pipeline's in-flight batches fit in
+  PIPELINE_FRACTION of memory (at most DEFAULT_BLOCK_SIZE)
+
+Each value can be overridden with an environment variable, or with the
+matching preprocessing option, which sets the variable so parse processes
+see it too:
+
+    AIRBNB_THREADS        --threads         DuckDB threads
+    AIRBNB_MEMORY_LIMIT   --memory-limit    DuckDB memory limit, e.g. 6GB or 512MB
+    AIRBNB_TEMP_DIR       --temp-dir        spill directory
+    AIRBNB_WORKERS        --workers         parse processes (preprocess.py)
+    AIRBNB_BLOCK_MB       --block-mb        Arrow batch size in MB (preprocess.py)
+
+Run ``python3 resources.py`` to print what this host gets.
+"""
+
+import argparse
+import math
+import os
+import re
+import shutil
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+import duckdb
+
+MEMORY_FRACTION = 0.6  # DuckDB's share of memory
+PIPELINE_FRACTION = 0.2  # preprocess.py parse pipeline's share of memory
+TEMP_FRACTION = 0.9  # Share of the spill filesystem's free space DuckDB may fill
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+MIN_BLOCK_SIZE = 1024 * 1024
+BATCH_COPIES = 3  # Raw text, Arrow batch and IPC copy per in-flight batch
+
+# Option -> environment variable overriding it
+OVERRIDES = {
+    "threads": "AIRBNB_THREADS",
+    "memory_limit": "AIRBNB_MEMORY_LIMIT",
+    "temp_dir": "AIRBNB_TEMP_DIR",
+    "workers": "AIRBNB_WORKERS",
+    "block_mb": "AIRBNB_BLOCK_MB",
+}
+
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+@dataclass(frozen=True)
+class Resources:
+    """Detected host resources and the limits derived from them."""
+
+    cores: int
+    memory_bytes: int
+    memory_source: str
+    threads: int
+    memory_limit: int
+    temp_dir: str
+    temp_free_bytes: int
+    max_temp_bytes: int
+    workers: int
+    queue_depth: int
+    block_size: int
+
+
+def read_cgroup(path: str) -> Optional[str]:
+    """Contents of a cgroup control file, or None when it does not exist."""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """CPUs allowed by the cgroup CPU quota, or None without a quota."""
+    cpu_max = read_cgroup('/sys/fs/cgroup/cpu.max')  # v2: "<quota> <period>" or "max <period>"
+    if cpu_max:
+        quota, period = cpu_max.split()[:2]
+        return None if quota == 'max' else int(quota) / int(period)
+
+    quota = read_cgroup('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')  # v1: -1 means no quota
+    period = read_cgroup('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def cgroup_memory_limit() -> Optional[int]:
+    """Bytes allowed by the cgroup memory limit, or None without a limit."""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        limit = read_cgroup(path)
+        # v2 writes "max"; v1 reports an unlimited group as a huge page-aligned number
+        if limit and limit != 'max' and int(limit) < 1 << 60:
+            return int(limit)
+    return None
+
+
+def available_cores() -> int:
+    """Cores this process may run on, after affinity and cgroup quota."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = cgroup_cpu_limit()
+    if quota is not None:
+        cores = min(cores, math.floor(quota))
+    return max(cores, 1)
+
+
+def available_memory() -> tuple:
+    """(bytes, source) of the memory this process may use: physical or cgroup limit."""
+    physical = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    limit = cgroup_memory_limit()
+    if limit is not None and limit < physical:
+        return limit, 'cgroup'
+    return physical, 'physical'
+
+
+def parse_size(value: str) -> int:
+    """Parse a size such as "6GB", "512MiB" or "1073741824" into bytes (1024-based units)."""
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([KMGT]?)(?:I?B)?\s*', value.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value!r} (expected e.g. 6GB or 512MB)")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def detect_resources() -> Resources:
+    """Detect the host's resources and derive limits, applying environment overrides."""
+    cores = available_cores()
+    memory_bytes, memory_source = available_memory()
+
+    threads = int(os.environ.get(OVERRIDES['threads'], cores))
+    memory_limit = (parse_size(os.environ[OVERRIDES['memory_limit']]) if OVERRIDES['memory_limit'] in os.environ
+                    else int(memory_bytes * MEMORY_FRACTION))
+
+    temp_dir = os.environ.get(OVERRIDES['temp_dir'], tempfile.gettempdir())
+    os.makedirs(temp_dir, exist_ok=True)
+    temp_free_bytes = shutil.disk_usage(temp_dir).free
+
+    workers = int(os.environ.get(OVERRIDES['workers'], max(cores - 1, 1)))
+    queue_depth = 2 * workers
+    if OVERRIDES['block_mb'] in os.environ:
+        block_size = int(float(os.environ[OVERRIDES['block_mb']]) * 1024 * 1024)
+    else:
+        # Every parser holds a batch and the queue holds queue_depth more
+        in_flight = workers + queue_depth
+        block_size = memory_bytes * PIPELINE_FRACTION / (BATCH_COPIES * in_flight)
+        block_size = int(min(max(block_size, MIN_BLOCK_SIZE), DEFAULT_BLOCK_SIZE)) // MIN_BLOCK_SIZE * MIN_BLOCK_SIZE
+
+    return Resources(
+        cores=cores,
+        memory_bytes=memory_bytes,
+        memory_source=memory_source,
+        threads=max(threads, 1),
+        memory_limit=memory_limit,
+        temp_dir=temp_dir,
+        temp_free_bytes=temp_free_bytes,
+        max_temp_bytes=int(temp_free_bytes * TEMP_FRACTION),
+        workers=max(workers, 1),
+        queue_depth=max(queue_depth, 2),
+        block_size=max(block_size, MIN_BLOCK_SIZE),
+    )
+
+
+def configure(con: duckdb.DuckDBPyConnection, resources: Resources = None, processes: int = 1):
+    """
+    Apply the thread, memory and spill limits to a DuckDB connection.
+
+    Args:
+        con: Connection to configure
+        resources: Limits to apply (default: detect_resources())
+        processes: Number of processes running a connection like this one
+            at the same time; threads and memory are split evenly among them
+    """
+    resources = resources or detect_resources()
+    con.execute(f"SET threads = {max(resources.threads // processes, 1)}")
+    con.execute(f"SET memory_limit = '{resources.memory_limit // processes // 1024 ** 2}MiB'")
+    con.execute(f"SET temp_directory = '{resources.temp_dir}'")
+    con.execute(f"SET max_temp_directory_size = '{resources.max_temp_bytes // 1024 ** 2}MiB'")
+
+
+def add_resource_arguments(parser: argparse.ArgumentParser, pipeline: bool = False):
+    """
+    Add the resource override options to a command line parser.
+
+    Args:
+        parser: Parser to extend
+        pipeline: Also add --workers and --block-mb (preprocess.py's parse pipeline)
+    """
+    group = parser.add_argument_group('resources', "Override the auto-detected limits (see resources.py)")
+    group.add_argument('--threads', type=int, help="DuckDB threads (default: available cores)")
+    group.add_argument('--memory-limit', help=f"DuckDB memory limit, e.g. 6GB (default: {MEMORY_FRACTION * 100:.0f}%% of memory)")
+    group.add_argument('--temp-dir', help="Spill directory (default: the system temp directory)")
+    if pipeline:
+        group.add_argument('--workers', type=int, help="Parse processes (default: cores - 1)")
+        group.add_argument('--block-mb', type=float, help="Arrow batch size in MB (default: sized to memory, at most 16)")
+
+
+def apply_resource_arguments(args: argparse.Namespace) -> Resources:
+    """
+    Apply command line overrides and return the resulting resources.
+
+    Overrides are written to the environment so that child processes
+    (e.g. parse processes) derive the same limits.
+    """
+    for option, variable in OVERRIDES.items():
+        value = getattr(args, option, None)
+        if value is not None:
+            os.environ[variable] = str(value)
+    return detect_resources()
+
+
+def describe(resources: Resources) -> str:
+    """One-paragraph summary of the detected resources and derived limits."""
+    gib = 1024 ** 3
+    return (
+        f"Resources: {resources.cores} cores, {resources.memory_bytes / gib:.1f}GB memory ({resources.memory_source})\n"
+        f"DuckDB: {resources.threads} threads, {resources.memory_limit / gib:.1f}GB memory limit, "
+        f"spilling to {resources.temp_dir} (up to {resources.max_temp_bytes / gib:.1f}GB)\n"
+        f"Parse pipeline: {resources.workers} processes, {resources.block_size // 1024 ** 2}MB batches, "
+        f"queue depth {resources.queue_depth}"
+    )
+
+
+if __name__ == "__main__":
+    print(describe(detect_resources()))
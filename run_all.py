@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Run all challenge questions in one process, sharing intermediate results.
+
+The individual scripts each open the database and recompute overlapping
+work: the camera-review set, per-state distinct counts, full scans for the
+row and unique counts. Here every question declares the shared sub-results
+it needs; each needed sub-result is computed once per run into an in-memory
+scratch database (one grouped pass over reviews covers the row counts,
+unique review counts, per-state and per-listing review counts and the camera
+mentions; the distinct reviewer count is a second scan of just reviewer_id,
+run concurrently, because a distinct aggregate in the grouped pass would be
+kept for every listing group too), and the questions then run concurrently
+on their own cursors against those small tables.
+
+Usage:
+    python3 run_all.py                       # every question
+    python3 run_all.py top_host state_analysis
+"""
+
+import argparse
+import concurrent.futures
+import time
+
+import duckdb
+
+from db import connect
+from keywords import mention_filter
+
+SCRATCH = 'scratch'
+
+
+def shared_results(con: duckdb.DuckDBPyConnection) -> dict:
+    """Shared sub-result name -> query materialized into the scratch database."""
+    review_mentions_camera = mention_filter(con, 'reviews', 'camera')
+    listing_mentions_camera = mention_filter(con, 'listings', 'camera')
+
+    return {
+        # level: 'all' (one row) or 'state'
+        'listing_counts': """
+            SELECT CASE GROUPING(state) WHEN 1 THEN 'all' ELSE 'state' END AS level,
+                   state,
+                   COUNT(*) AS listing_rows,
+                   COUNT(DISTINCT id) AS listings
+            FROM listings
+            GROUP BY GROUPING SETS ((), (state))
+        """,
+        'listing_hosts': """
+            SELECT DISTINCT id, host_id FROM listings
+        """,
+        'camera_listings': f"""
+            SELECT DISTINCT id, state FROM listings WHERE {listing_mentions_camera}
+        """,
+        # The grouped pass over reviews; level: 'all', 'state', 'listing' or 'listing_state'
+        'review_counts': f"""
+            SELECT CASE GROUPING(state, listing_id)
+                       WHEN 3 THEN 'all' WHEN 1 THEN 'state'
+                       WHEN 2 THEN 'listing' ELSE 'listing_state' END AS level,
+                   state,
+                   listing_id,
+                   COUNT(*) AS review_rows,
+                   COUNT(DISTINCT id) AS reviews,
+                   COUNT(DISTINCT id) FILTER (WHERE {review_mentions_camera}) AS camera_reviews
+            FROM reviews
+            GROUP BY GROUPING SETS ((), (state), (listing_id), (listing_id, state))
+        """,
+        'reviewer_count': """
+            SELECT COUNT(DISTINCT reviewer_id) AS reviewers FROM reviews
+        """,
+    }
+
+
+# Question name -> title, shared sub-results it reads, and the query for its printed values
+QUESTIONS = {
+    'count_rows': {
+        'title': "Count rows",
+        'needs': ['listing_counts', 'review_counts'],
+        'sql': """
+            SELECT (SELECT listing_rows FROM scratch.listing_counts WHERE level = 'all'),
+                   (SELECT review_rows FROM scratch.review_counts WHERE level = 'all')
+        """,
+    },
+    'count_unique': {
+        'title': "Count unique listings and reviews",
+        'needs': ['listing_counts', 'review_counts', 'reviewer_count'],
+        'sql': """
+            SELECT (SELECT listings FROM scratch.listing_counts WHERE level = 'all'),
+                   (SELECT reviews FROM scratch.review_counts WHERE level = 'all'),
+                   (SELECT reviewers FROM scratch.reviewer_count)
+        """,
+    },
+    'state_analysis': {
+        'title': "Identify the state with the most/least number of listings",
+        'needs': ['listing_counts'],
+        'sql': """
+            SELECT arg_max(state, listings), arg_min(state, listings)
+            FROM scratch.listing_counts WHERE level = 'state'
+        """,
+    },
+    'top_host': {
+        'title': "Host with the most number of reviews",
+        'needs': ['listing_hosts', 'review_counts'],
+        # Review ids belong to one listing, so summing per-listing distinct
+        # counts over a host's distinct listings equals COUNT(DISTINCT r.id)
+        'sql': """
+            SELECT SUM(r.reviews) AS review_count
+            FROM scratch.listing_hosts h
+            JOIN scratch.review_counts r ON r.level = 'listing' AND r.listing_id = h.id
+            GROUP BY h.host_id
+            ORDER BY review_count DESC
+            LIMIT 1
+        """,
+    },
+    'camera_listings': {
+        'title': "Listings that mention 'cameras'",
+        'needs': ['camera_listings'],
+        'sql': """
+            SELECT COUNT(DISTINCT id) FROM scratch.camera_listings
+        """,
+    },
+    'top_camera_states': {
+        'title': "Top states with camera listings",
+        'needs': ['review_counts'],
+        'sql': """
+            SELECT state, camera_reviews
+            FROM scratch.review_counts
+            WHERE level = 'state' AND camera_reviews > 0
+            ORDER BY camera_reviews * 100.0 / reviews DESC
+            LIMIT 1
+        """,
+    },
+    'secret_cameras': {
+        'title': "Secret cameras",
+        'needs': ['review_counts', 'camera_listings', 'listing_counts'],
+        'sql': """
+            WITH secret_camera_listings AS (
+                SELECT r.listing_id, r.state
+                FROM scratch.review_counts r
+                LEFT JOIN scratch.camera_listings l ON r.listing_id = l.id
+                WHERE r.level = 'listing_state' AND r.camera_reviews > 0 AND l.id IS NULL
+            ),
+            state_counts AS (
+                SELECT state, COUNT(*) AS count FROM secret_camera_listings GROUP BY state
+            )
+            SELECT s.state, s.count
+            FROM state_counts s
+            JOIN scratch.listing_counts t ON t.level = 'state' AND s.state = t.state
+            ORDER BY s.count * 100.0 / t.listings DESC
+            LIMIT 1
+        """,
+    },
+}
+
+
+def timed_on_cursor(con: duckdb.DuckDBPyConnection, sql: str, fetch: bool):
+    """Run a statement on a fresh cursor; return (rows or None, seconds)."""
+    cur = con.cursor()
+    try:
+        start_time = time.time()
+        result = cur.execute(sql)
+        rows = result.fetchall() if fetch else None
+        return rows, time.time() - start_time
+    finally:
+        cur.close()
+
+
+def run(con: duckdb.DuckDBPyConnection, names: list, workers: int) -> dict:
+    """
+    Compute the shared sub-results needed by the questions, then the questions.
+
+    Returns:
+        Dict of question name -> (first result row, seconds)
+    """
+    con.execute(f"ATTACH ':memory:' AS {SCRATCH}")
+    available = shared_results(con)
+    needed = sorted({sub_result for name in names for sub_result in QUESTIONS[name]['needs']})
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        # Sub-results are independent of each other, so they run concurrently too
+        futures = {
+            executor.submit(timed_on_cursor, con,
+                            f"CREATE TABLE {SCRATCH}.{sub_result} AS {available[sub_result]}", False): sub_result
+            for sub_result in needed
+        }
+        for future in concurrent.futures.as_completed(futures):
+            print(f"Shared result {futures[future]} took {future.result()[1]:.3f} seconds")
+
+        futures = {executor.submit(timed_on_cursor, con, QUESTIONS[name]['sql'], True): name for name in names}
+        results = {}
+        for future in concurrent.futures.as_completed(futures):
+            rows, seconds = future.result()
+            results[futures[future]] = (rows[0] if rows else None, seconds)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the challenge questions with shared intermediate results.")
+    parser.add_argument('questions', nargs='*', help=f"Questions to run (default: all of {', '.join(QUESTIONS)})")
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent cursors (default: 4)")
+    args = parser.parse_args()
+    unknown = [name for name in args.questions if name not in QUESTIONS]
+    if unknown:
+        parser.error(f"unknown questions: {', '.join(unknown)}")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    names = args.questions or list(QUESTIONS)
+
+    start_time = time.time()
+    con = connect()
+    results = run(con, names, args.workers)
+    con.close()
+
+    for name in names:
+        row, seconds = results[name]
+        print(f"\n=== {QUESTIONS[name]['title']} ===")
+        for value in row or ():
+            print(value)
+        print(f"({name} took {seconds:.3f} seconds)")
+
+    end_time = time.time()
+    print(f"\nExecution time: {end_time - start_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
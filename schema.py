@@ -0,0 +1,275 @@
+"""
+Table definitions shared by the preprocessing scripts and query backends.
+
+The CSV files carry every column below except the derived ones: ``state``
+comes from the file name (e.g. albany_ny_listings.csv -> NY) and
+``file_id`` points at the file's row in the ingest manifest. Input files may
+be gzip- or zstd-compressed (``albany_ny_listings.csv.gz``/``.csv.zst``);
+both readers decompress them while parsing.
+
+Columns are stored compactly typed rather than as the CSV text: prices and
+rates are numeric, JSON-ish arrays are ``VARCHAR[]`` lists, and the
+low-cardinality dimensions with a fixed vocabulary are ENUMs, so filters and
+group-bys on them compare 1-byte dictionary codes. Such columns are read from
+the files as text and converted by the expressions in PARSED_COLUMNS.
+"""
+
+import glob
+import os
+from typing import List
+
+# Input file suffixes, most compact first: a file present in several forms is read from the first
+CSV_SUFFIXES = (".csv.zst", ".csv.gz", ".csv")
+
+# ENUM types used in the DDL. Parsed CSV values outside a vocabulary are stored as NULL;
+# state codes come from file names, so an unknown one fails the file's load.
+ENUM_TYPES = {
+    "state_code": (
+        "AK", "AL", "AR", "AZ", "CA", "CO", "CT", "DC", "DE", "FL", "GA", "HI", "IA", "ID", "IL",
+        "IN", "KS", "KY", "LA", "MA", "MD", "ME", "MI", "MN", "MO", "MS", "MT", "NC", "ND", "NE",
+        "NH", "NJ", "NM", "NV", "NY", "OH", "OK", "OR", "PA", "PR", "RI", "SC", "SD", "TN", "TX",
+        "UT", "VA", "VT", "WA", "WI", "WV", "WY",
+    ),
+    "room_type": ("Entire home/apt", "Private room", "Shared room", "Hotel room"),
+    "response_time": ("within an hour", "within a few hours", "within a day", "a few days or more"),
+}
+
+LISTINGS_COLUMNS = [
+    ("id", "BIGINT"),
+    ("listing_url", "TEXT"),
+    ("scrape_id", "BIGINT"),
+    ("last_scraped", "DATE"),
+    ("source", "TEXT"),
+    ("name", "TEXT"),
+    ("description", "TEXT"),
+    ("neighborhood_overview", "TEXT"),
+    ("picture_url", "TEXT"),
+    ("host_id", "BIGINT"),
+    ("host_url", "TEXT"),
+    ("host_name", "TEXT"),
+    ("host_since", "DATE"),
+    ("host_location", "TEXT"),
+    ("host_about", "TEXT"),
+    ("host_response_time", "response_time"),
+    ("host_response_rate", "DOUBLE"),
+    ("host_acceptance_rate", "DOUBLE"),
+    ("host_is_superhost", "BOOLEAN"),
+    ("host_thumbnail_url", "TEXT"),
+    ("host_picture_url", "TEXT"),
+    ("host_neighbourhood", "TEXT"),
+    ("host_listings_count", "INTEGER"),
+    ("host_total_listings_count", "INTEGER"),
+    ("host_verifications", "VARCHAR[]"),
+    ("host_has_profile_pic", "BOOLEAN"),
+    ("host_identity_verified", "BOOLEAN"),
+    ("neighbourhood", "TEXT"),
+    ("neighbourhood_cleansed", "TEXT"),
+    ("neighbourhood_group_cleansed", "TEXT"),
+    ("latitude", "DOUBLE"),
+    ("longitude", "DOUBLE"),
+    ("property_type", "TEXT"),
+    ("room_type", "room_type"),
+    ("accommodates", "INTEGER"),
+    ("bathrooms", "DOUBLE"),
+    ("bathrooms_text", "TEXT"),
+    ("bedrooms", "INTEGER"),
+    ("beds", "INTEGER"),
+    ("amenities", "VARCHAR[]"),
+    ("price", "DECIMAL(10,2)"),
+    ("minimum_nights", "INTEGER"),
+    ("maximum_nights", "INTEGER"),
+    ("minimum_minimum_nights", "INTEGER"),
+    ("maximum_minimum_nights", "INTEGER"),
+    ("minimum_maximum_nights", "INTEGER"),
+    ("maximum_maximum_nights", "INTEGER"),
+    ("minimum_nights_avg_ntm", "DOUBLE"),
+    ("maximum_nights_avg_ntm", "DOUBLE"),
+    ("calendar_updated", "TEXT"),
+    ("has_availability", "BOOLEAN"),
+    ("availability_30", "INTEGER"),
+    ("availability_60", "INTEGER"),
+    ("availability_90", "INTEGER"),
+    ("availability_365", "INTEGER"),
+    ("calendar_last_scraped", "DATE"),
+    ("number_of_reviews", "INTEGER"),
+    ("number_of_reviews_ltm", "INTEGER"),
+    ("number_of_reviews_l30d", "INTEGER"),
+    ("availability_eoy", "INTEGER"),
+    ("number_of_reviews_ly", "INTEGER"),
+    ("estimated_occupancy_l365d", "DOUBLE"),
+    ("estimated_revenue_l365d", "DOUBLE"),
+    ("first_review", "DATE"),
+    ("last_review", "DATE"),
+    ("review_scores_rating", "DOUBLE"),
+    ("review_scores_accuracy", "DOUBLE"),
+    ("review_scores_cleanliness", "DOUBLE"),
+    ("review_scores_checkin", "DOUBLE"),
+    ("review_scores_communication", "DOUBLE"),
+    ("review_scores_location", "DOUBLE"),
+    ("review_scores_value", "DOUBLE"),
+    ("license", "TEXT"),
+    ("instant_bookable", "BOOLEAN"),
+    ("calculated_host_listings_count", "INTEGER"),
+    ("calculated_host_listings_count_entire_homes", "INTEGER"),
+    ("calculated_host_listings_count_private_rooms", "INTEGER"),
+    ("calculated_host_listings_count_shared_rooms", "INTEGER"),
+    ("reviews_per_month", "DOUBLE"),
+    ("state", "state_code"),
+    ("file_id", "INTEGER"),
+]
+
+REVIEWS_COLUMNS = [
+    ("listing_id", "BIGINT"),
+    ("id", "BIGINT"),
+    ("date", "DATE"),
+    ("reviewer_id", "BIGINT"),
+    ("reviewer_name", "TEXT"),
+    ("comments", "TEXT"),
+    ("state", "state_code"),
+    ("file_id", "INTEGER"),
+]
+
+# Columns added at ingest time rather than read from the CSV files
+DERIVED_COLUMNS = ("state", "file_id")
+
+TABLES = {
+    "listings": LISTINGS_COLUMNS,
+    "reviews": REVIEWS_COLUMNS,
+}
+
+# Columns read as text and converted at ingest: name -> expression over the raw value.
+# ENUM columns parse with TRY_CAST so placeholders such as "N/A" become NULL.
+PARSED_COLUMNS = {
+    "listings": {
+        "host_response_time": "TRY_CAST(host_response_time AS response_time)",
+        # "95%" -> 0.95; "N/A" -> NULL
+        "host_response_rate": "TRY_CAST(rtrim(host_response_rate, '%') AS DOUBLE) / 100",
+        "host_acceptance_rate": "TRY_CAST(rtrim(host_acceptance_rate, '%') AS DOUBLE) / 100",
+        # "['email', 'phone']" (Python list syntax) -> [email, phone]; "None" -> NULL
+        "host_verifications": """CASE WHEN host_verifications IS NULL OR host_verifications = 'None' THEN NULL
+             ELSE list_filter(string_split(regexp_replace(host_verifications, '[\\[\\]'' ]', '', 'g'), ','),
+                              item -> item <> '') END""",
+        # '["Wifi", "Kitchen"]' (JSON) -> [Wifi, Kitchen]
+        "amenities": """TRY(from_json(amenities, '["VARCHAR"]'))""",
+        "room_type": "TRY_CAST(room_type AS room_type)",
+        # "$1,234.00" -> 1234.00
+        "price": "TRY_CAST(replace(replace(price, '$', ''), ',', '') AS DECIMAL(10,2))",
+    },
+    "reviews": {},
+}
+
+
+def table_ddl(table_name: str) -> str:
+    """Return the CREATE TABLE statement for one of the tables in TABLES."""
+    columns = ",\n    ".join(f"{name} {col_type}" for name, col_type in TABLES[table_name])
+    return f"CREATE TABLE IF NOT EXISTS {table_name} (\n    {columns}\n)"
+
+
+def create_types(con):
+    """Create the ENUM types used by the DDL if they do not exist yet."""
+    for type_name, values in ENUM_TYPES.items():
+        labels = ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+        con.execute(f"CREATE TYPE IF NOT EXISTS {type_name} AS ENUM ({labels})")
+
+
+def create_tables(con):
+    """Create the listings and reviews tables if they do not exist yet."""
+    create_types(con)
+    for table_name in TABLES:
+        con.execute(table_ddl(table_name))
+        # Databases built before the ingest manifest lack the provenance column
+        con.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS file_id INTEGER")
+        convert_text_columns(con, table_name)
+
+
+def convert_text_columns(con, table_name: str):
+    """
+    Convert columns that databases built before the typed schema store as text.
+
+    Indexes on the table are dropped first (DuckDB cannot retype an indexed
+    column); the preprocessing scripts recreate them at the end of ingest.
+    """
+    current = dict(con.execute(f"SELECT column_name, data_type FROM duckdb_columns() "
+                               f"WHERE database_name = current_database() AND schema_name = 'main' "
+                               f"AND table_name = '{table_name}'").fetchall())
+    stale = [(name, col_type) for name, col_type in TABLES[table_name]
+             if csv_type(table_name, name) == "TEXT" and col_type != "TEXT" and current.get(name) == "VARCHAR"]
+    if not stale:
+        return
+
+    for (index_name,) in con.execute(f"SELECT index_name FROM duckdb_indexes() "
+                                     f"WHERE database_name = current_database() AND table_name = '{table_name}'").fetchall():
+        con.execute(f"DROP INDEX {index_name}")
+    for name, col_type in stale:
+        print(f"Converting {table_name}.{name} to {col_type}...")
+        expression = PARSED_COLUMNS[table_name].get(name, name)
+        con.execute(f"ALTER TABLE {table_name} ALTER COLUMN {name} TYPE {col_type} USING ({expression})::{col_type}")
+
+
+def csv_type(table_name: str, column: str) -> str:
+    """Type a column is read as from the CSV files: text for converted and ENUM columns."""
+    col_type = dict(TABLES[table_name])[column]
+    if column in PARSED_COLUMNS[table_name] or col_type in ENUM_TYPES:
+        return "TEXT"
+    return col_type
+
+
+def csv_columns(table_name: str) -> dict:
+    """
+    Column name -> type mapping for the CSV files of a table.
+
+    This is the table layout minus the derived columns, in file order, with
+    converted columns read as text (see csv_select_sql), suitable for
+    DuckDB's ``read_csv(columns=...)``.
+    """
+    return {name: csv_type(table_name, name) for name, _ in TABLES[table_name] if name not in DERIVED_COLUMNS}
+
+
+def csv_select_sql(table_name: str, star: str = "*") -> str:
+    """
+    Select-list head turning raw CSV columns into the stored types.
+
+    Args:
+        table_name: Table the rows are for
+        star: Star expression to extend, e.g. "csv.* EXCLUDE (filename)"
+
+    Returns:
+        ``star`` with a REPLACE clause applying PARSED_COLUMNS; other
+        expressions in the same select list still see the raw text
+    """
+    conversions = ", ".join(f"{expression} AS {name}" for name, expression in PARSED_COLUMNS[table_name].items())
+    return f"{star} REPLACE ({conversions})" if conversions else star
+
+
+def csv_stem(file_path: str) -> str:
+    """Input file path without its .csv[.gz|.zst] suffix (e.g. data/albany_ny_listings.csv.gz -> data/albany_ny_listings)."""
+    for suffix in CSV_SUFFIXES:
+        if file_path.endswith(suffix):
+            return file_path[:-len(suffix)]
+    return os.path.splitext(file_path)[0]
+
+
+def find_csv_files(table_name: str, directory: str = "") -> List[str]:
+    """
+    Input files of a table: ``*_<table>.csv``, optionally gzip- or zstd-compressed.
+
+    A file present both plain and compressed is listed once, in the first
+    form of CSV_SUFFIXES (the fewest bytes to read).
+    """
+    found = {}
+    for suffix in CSV_SUFFIXES:
+        for file_path in sorted(glob.glob(os.path.join(directory, f"*_{table_name}{suffix}"))):
+            found.setdefault(csv_stem(file_path), file_path)
+    return sorted(found.values())
+
+
+def state_from_filename(file_path: str) -> str:
+    """Extract the state code from a file name (e.g. albany_ny_listings.csv.gz -> NY)."""
+    parts = os.path.basename(file_path).split('_')
+    return parts[-2].upper() if len(parts[-2]) == 2 else parts[-3].upper()
+
+
+def state_from_filename_sql(column: str = "filename") -> str:
+    """SQL expression doing what state_from_filename() does, for a file name column."""
+    parts = f"string_split(parse_filename({column}), '_')"
+    return f"upper(CASE WHEN length({parts}[-2]) = 2 THEN {parts}[-2] ELSE {parts}[-3] END)"
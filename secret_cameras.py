@@ -1,23 +1,26 @@
-import duckdb
+from query_cache import connect_cached
+from keywords import mention_filter
 import time
 
 start_time = time.time()
 
-con = duckdb.connect('airbnb.db')
+con = connect_cached()
+
+# Precomputed flag columns when ingest created them, LIKE scans otherwise
+review_mentions_camera = mention_filter(con, 'reviews', 'camera')
+listing_mentions_camera = mention_filter(con, 'listings', 'camera')
 
 # Find state with highest percentage of secret camera listings
-secret_cameras = con.execute("""
+secret_cameras = con.execute(f"""
     WITH camera_in_reviews AS (
         SELECT DISTINCT listing_id, state
         FROM reviews
-        WHERE LOWER(comments) LIKE '%camera%'
+        WHERE {review_mentions_camera}
     ),
     camera_in_listings AS (
         SELECT DISTINCT id, state
         FROM listings
-        WHERE LOWER(description) LIKE '%camera%'
-           OR LOWER(host_about) LIKE '%camera%'
-           OR LOWER(amenities) LIKE '%camera%'
+        WHERE {listing_mentions_camera}
     ),
     secret_camera_listings AS (
         SELECT c.listing_id, c.state
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Per-state sharded databases with parallel fan-out queries.
+
+airbnb.db has one writer, so ingest loads one file at a time, and one
+process answers every query. The sharded layout keeps one DuckDB file per
+state instead:
+
+    shards/NY.db, shards/CA.db, ...
+
+Each shard is an ordinary airbnb.db for its state's files (same tables,
+keyword flags, summaries, sketches, amenity bitmaps and ingest manifest),
+loaded by preprocess_fast's importer in its own process, so shards load in
+parallel and one state can be rebuilt without touching the others.
+
+Queries fan out to the shards in a process pool. Every shard opens its file
+read-only and returns small partial results, which are merged in an
+in-memory DuckDB into run_all.py's scratch tables, so run_all's question SQL
+runs unchanged on the merged results:
+
+- row counts and per-state counts: a state lives in exactly one shard, so
+  its counts are final; totals are sums
+- distinct counts across states: the union of each shard's distinct ids, or
+  with ``--approx`` the merged HyperLogLog registers of sketches.py
+- the host ranking: hosts span states, so per-shard top-k lists cannot be
+  merged exactly; shards return one row per (listing, state) instead, and
+  the top hosts are ranked from those after the merge
+- per-listing review counts: a listing (and its reviews) can appear in the
+  files of several states, so counts of such a listing cannot be summed
+  over shards. A second fan-out fetches just those listings' review ids,
+  and they are recounted distinct after the merge
+
+Usage:
+    python3 shards.py build                      # load every state's files into shards/
+    python3 shards.py build --states NY --rebuild
+    python3 shards.py query                      # every question, like run_all.py
+    python3 shards.py query count_unique --approx
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import duckdb
+import pyarrow as pa
+
+from amenities import create_amenities
+from keywords import add_flag_columns, mention_filter
+from layout import INDEX_PROFILES, create_indexes
+from manifest import create_manifest
+from preprocess_fast import import_csv_files
+from resources import add_resource_arguments, apply_resource_arguments, configure, describe, detect_resources
+from run_all import QUESTIONS, SCRATCH, timed_on_cursor
+from schema import create_tables, find_csv_files, state_from_filename
+from sketches import approx_distinct, create_sketches
+from summaries import create_summaries, refresh_pending_summaries
+from telemetry import IngestTelemetry, add_telemetry_arguments
+
+SHARD_DIR = os.environ.get('AIRBNB_SHARD_DIR', 'shards')
+
+
+def shard_path(state_code: str, shard_dir: str = SHARD_DIR) -> str:
+    """Database file of a state's shard, e.g. shards/NY.db."""
+    return os.path.join(shard_dir, f"{state_code}.db")
+
+
+def shard_states(shard_dir: str = SHARD_DIR) -> List[str]:
+    """States that have a shard."""
+    return sorted(os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(shard_dir, '*.db')))
+
+
+def load_shard(state_code: str, files: Dict[str, List[str]], shard_dir: str, rebuild: bool,
+               index_profile: str, processes: int) -> dict:
+    """
+    Load a state's CSV files into its shard (runs in a worker process).
+
+    Args:
+        state_code: State of the shard
+        files: Table name -> CSV files of the state
+        shard_dir: Directory holding the shards
+        rebuild: Delete the shard first instead of loading only new/changed files
+        index_profile: Index profile to build (see layout.py)
+        processes: Shards loading at the same time (they split threads and memory)
+
+    Returns:
+        The shard's per-file telemetry records
+    """
+    path = shard_path(state_code, shard_dir)
+    if rebuild:
+        for stale in (path, path + '.wal'):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    telemetry = IngestTelemetry('shards.py')
+    con = duckdb.connect(path)
+    configure(con, detect_resources(), processes=processes)
+    create_tables(con)
+    add_flag_columns(con)
+    create_summaries(con)
+    create_sketches(con)
+    create_amenities(con)
+    create_manifest(con)
+
+    state_mapping = {file_path: state_code for file_paths in files.values() for file_path in file_paths}
+    for table_name in ('listings', 'reviews'):
+        import_csv_files(con, files.get(table_name, []), state_mapping, table_name, telemetry)
+    refresh_pending_summaries(con)
+    create_indexes(con, index_profile)
+    con.close()
+    return telemetry.files
+
+
+def build(args: argparse.Namespace):
+    """Load (or rebuild) the shards of the requested states in parallel."""
+    files = defaultdict(lambda: defaultdict(list))
+    for table_name in ('listings', 'reviews'):
+        for file_path in find_csv_files(table_name):
+            files[state_from_filename(file_path)][table_name].append(file_path)
+
+    states = sorted(args.states or files)
+    missing = [state_code for state_code in states if state_code not in files]
+    if missing:
+        raise FileNotFoundError(f"no CSV files for states: {', '.join(missing)}")
+
+    resources = apply_resource_arguments(args)
+    workers = max(min(len(states), resources.cores), 1)
+    print(describe(resources))
+    print(f"Loading {len(states)} shards into {args.shard_dir}/ with {workers} processes...")
+    os.makedirs(args.shard_dir, exist_ok=True)
+
+    start_time = time.time()
+    telemetry = IngestTelemetry('shards.py')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {
+            executor.submit(load_shard, state_code, dict(files[state_code]), args.shard_dir, args.rebuild,
+                            args.indexes, workers): state_code
+            for state_code in states
+        }
+        for future in concurrent.futures.as_completed(futures):
+            records = future.result()
+            telemetry.files.update(records)
+            rows = sum(record["rows"] for record in records.values())
+            print(f"Shard {futures[future]}: {len(records)} files, {rows:,} rows loaded")
+
+    telemetry.write(args.metrics_json, args.metrics_prom)
+    print(f"Built {len(states)} shards in {time.time() - start_time:.2f} seconds")
+
+
+def shard_partials(con: duckdb.DuckDBPyConnection) -> dict:
+    """Partial result name -> query run on every shard."""
+    review_mentions_camera = mention_filter(con, 'reviews', 'camera')
+    listing_mentions_camera = mention_filter(con, 'listings', 'camera')
+
+    return {
+        'listing_states': """
+            SELECT state, COUNT(*) AS listing_rows, COUNT(DISTINCT id) AS listings
+            FROM listings GROUP BY state
+        """,
+        'listing_ids': "SELECT DISTINCT id FROM listings",
+        'listing_hosts': "SELECT DISTINCT id, host_id FROM listings",
+        'camera_listings': f"SELECT DISTINCT id, state FROM listings WHERE {listing_mentions_camera}",
+        'review_states': f"""
+            SELECT state, COUNT(*) AS review_rows, COUNT(DISTINCT id) AS reviews,
+                   COUNT(DISTINCT id) FILTER (WHERE {review_mentions_camera}) AS camera_reviews
+            FROM reviews GROUP BY state
+        """,
+        'listing_reviews': f"""
+            SELECT listing_id, state, COUNT(*) AS review_rows, COUNT(DISTINCT id) AS reviews,
+                   COUNT(DISTINCT id) FILTER (WHERE {review_mentions_camera}) AS camera_reviews
+            FROM reviews GROUP BY listing_id, state
+        """,
+        # Reads the spanning_listings table registered by query_shard
+        'spanning_reviews': f"""
+            SELECT listing_id, id, bool_or({review_mentions_camera}) AS camera
+            FROM reviews
+            WHERE listing_id IN (SELECT listing_id FROM spanning_listings)
+            GROUP BY listing_id, id
+        """,
+        'review_ids': "SELECT DISTINCT id FROM reviews",
+        'reviewer_ids': "SELECT DISTINCT reviewer_id FROM reviews",
+        'sketches': """
+            SELECT NULL::INTEGER AS file_id, state, table_name, column_name, register, max(rho) AS rho
+            FROM hll_sketches GROUP BY ALL
+        """,
+    }
+
+
+def merged_results(approx: Dict[str, str] = None) -> dict:
+    """
+    Scratch table name -> (partials it reads, query building it from them).
+
+    Args:
+        approx: Total distinct count name -> SQL literal replacing the exact
+            count over the merged id sets (--approx)
+    """
+    approx = approx or {}
+    listings = approx.get('listings', "(SELECT COUNT(DISTINCT id) FROM listing_ids)")
+    reviews = approx.get('reviews', "(SELECT COUNT(DISTINCT id) FROM review_ids)")
+    reviewers = approx.get('reviewers', "(SELECT COUNT(DISTINCT reviewer_id) FROM reviewer_ids)")
+
+    return {
+        # Same columns and levels as run_all's shared results
+        'listing_counts': (['listing_states'] + ([] if 'listings' in approx else ['listing_ids']), f"""
+            SELECT 'state' AS level, state, listing_rows, listings FROM listing_states
+            UNION ALL
+            SELECT 'all', NULL, (SELECT SUM(listing_rows) FROM listing_states), {listings}
+        """),
+        'listing_hosts': (['listing_hosts'], "SELECT DISTINCT id, host_id FROM listing_hosts"),
+        'camera_listings': (['camera_listings'], "SELECT id, state FROM camera_listings"),
+        # A review id belongs to one listing, but a listing can be in several shards: per-listing
+        # counts are summed over shards, except for listings in spanning_reviews, whose review ids
+        # are recounted. No question reads the global camera count, so it is left NULL rather
+        # than collecting camera review ids.
+        'review_counts': (['review_states', 'listing_reviews', 'spanning_reviews']
+                          + ([] if 'reviews' in approx else ['review_ids']), f"""
+            SELECT 'all' AS level, NULL AS state, NULL::BIGINT AS listing_id,
+                   (SELECT SUM(review_rows) FROM review_states) AS review_rows,
+                   {reviews} AS reviews, NULL::BIGINT AS camera_reviews
+            UNION ALL
+            SELECT 'state', state, NULL, review_rows, reviews, camera_reviews FROM review_states
+            UNION ALL
+            SELECT 'listing', NULL, l.listing_id, l.review_rows,
+                   COALESCE(s.reviews, l.reviews), COALESCE(s.camera_reviews, l.camera_reviews)
+            FROM (
+                SELECT listing_id, SUM(review_rows) AS review_rows, SUM(reviews) AS reviews,
+                       SUM(camera_reviews) AS camera_reviews
+                FROM listing_reviews GROUP BY listing_id
+            ) l
+            LEFT JOIN (
+                SELECT listing_id, COUNT(DISTINCT id) AS reviews,
+                       COUNT(DISTINCT id) FILTER (WHERE camera) AS camera_reviews
+                FROM spanning_reviews GROUP BY listing_id
+            ) s USING (listing_id)
+            UNION ALL
+            SELECT 'listing_state', state, listing_id, review_rows, reviews, camera_reviews FROM listing_reviews
+        """),
+        'reviewer_count': ([] if 'reviewers' in approx else ['reviewer_ids'], f"SELECT {reviewers} AS reviewers"),
+    }
+
+
+def query_shard(path: str, names: List[str], processes: int,
+                spanning: Optional[pa.Table] = None) -> Dict[str, pa.Table]:
+    """
+    Run the named partial queries on one shard, read-only (runs in a worker process).
+
+    spanning holds the listing_id of listings found in several shards, for
+    the spanning_reviews partial.
+    """
+    con = duckdb.connect(path, read_only=True)
+    configure(con, detect_resources(), processes=processes)
+    if spanning is not None:
+        con.register('spanning_listings', spanning)
+    partials = shard_partials(con)
+    results = {name: con.execute(partials[name]).fetch_arrow_table() for name in names}
+    con.close()
+    return results
+
+
+def fan_out(paths: List[str], names: List[str], spanning: Optional[pa.Table] = None) -> Dict[str, pa.Table]:
+    """Run partial queries on every shard in a process pool and concatenate the results per partial."""
+    workers = max(min(len(paths), detect_resources().cores), 1)
+    results = defaultdict(list)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=multiprocessing.get_context('spawn')) as executor:
+        for partials in executor.map(query_shard, paths, [names] * len(paths), [workers] * len(paths),
+                                     [spanning] * len(paths)):
+            for name, table in partials.items():
+                results[name].append(table)
+    return {name: pa.concat_tables(tables) for name, tables in results.items()}
+
+
+def query(args: argparse.Namespace) -> dict:
+    """
+    Answer the questions by fanning out to the shards and merging.
+
+    Returns:
+        Dict of question name -> (first result row, seconds)
+    """
+    paths = [shard_path(state_code, args.shard_dir) for state_code in shard_states(args.shard_dir)]
+    if not paths:
+        raise FileNotFoundError(f"no shards in {args.shard_dir}/ (run: python3 shards.py build)")
+    names = args.questions or list(QUESTIONS)
+
+    con = duckdb.connect()
+    configure(con)
+    approx = {}
+    if args.approx:
+        # Merge the shards' sketches; exact id sets are then not collected
+        start_time = time.time()
+        sketches = fan_out(paths, ['sketches'])['sketches']
+        con.execute("CREATE TABLE hll_sketches AS SELECT * FROM sketches")
+        for key, table_name, column in (('listings', 'listings', 'id'), ('reviews', 'reviews', 'id'),
+                                        ('reviewers', 'reviews', 'reviewer_id')):
+            approx[key] = str(approx_distinct(con, table_name, column)[0][1])
+        print(f"Merged sketches of {len(paths)} shards in {time.time() - start_time:.3f} seconds")
+
+    merged = merged_results(approx)
+    needed = sorted({sub_result for name in names for sub_result in QUESTIONS[name]['needs']})
+    partial_names = sorted({partial for sub_result in needed for partial in merged[sub_result][0]})
+
+    start_time = time.time()
+    partials = fan_out(paths, [name for name in partial_names if name != 'spanning_reviews'])
+    for name, partial in partials.items():
+        # Tables rather than registered views, which the cursors would not see
+        con.execute(f"CREATE TABLE {name} AS SELECT * FROM partial")
+    partial_rows = sum(table.num_rows for table in partials.values())
+
+    if 'spanning_reviews' in partial_names:
+        # A shard holds one state, so a listing with several (listing, state) rows is in several shards
+        spanning = con.execute("""
+            SELECT listing_id FROM listing_reviews GROUP BY listing_id HAVING COUNT(*) > 1
+        """).fetch_arrow_table()
+        con.execute("CREATE TABLE spanning_reviews (listing_id BIGINT, id BIGINT, camera BOOLEAN)")
+        if spanning.num_rows:
+            partial = fan_out(paths, ['spanning_reviews'], spanning)['spanning_reviews']
+            con.execute("INSERT INTO spanning_reviews SELECT * FROM partial")
+            partial_rows += partial.num_rows
+        print(f"{spanning.num_rows:,} listings span more than one shard")
+
+    print(f"Fan-out to {len(paths)} shards took {time.time() - start_time:.3f} seconds "
+          f"({partial_rows:,} partial rows)")
+
+    con.execute(f"ATTACH ':memory:' AS {SCRATCH}")
+    for sub_result in needed:
+        _, seconds = timed_on_cursor(con, f"CREATE TABLE {SCRATCH}.{sub_result} AS {merged[sub_result][1]}", False)
+        print(f"Merged result {sub_result} took {seconds:.3f} seconds")
+
+    results = {}
+    for name in names:
+        rows, seconds = timed_on_cursor(con, QUESTIONS[name]['sql'], True)
+        results[name] = (rows[0] if rows else None, seconds)
+    con.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build per-state shard databases and query them in parallel.")
+    parser.add_argument('--shard-dir', default=SHARD_DIR, help=f"Directory holding the shards (default: {SHARD_DIR})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help="Load the CSV files into one database per state")
+    build_parser.add_argument('--states', nargs='+', type=str.upper, help="Only load these states (default: all)")
+    build_parser.add_argument('--rebuild', action='store_true', help="Delete the shards first instead of loading only new files")
+    build_parser.add_argument('--indexes', choices=list(INDEX_PROFILES), default='none',
+                              help="Index profile of each shard (default: none; the fan-out queries are scans)")
+    add_telemetry_arguments(build_parser)
+    add_resource_arguments(build_parser)
+
+    query_parser = commands.add_parser('query', help="Answer the challenge questions across the shards")
+    query_parser.add_argument('questions', nargs='*', help=f"Questions to run (default: all of {', '.join(QUESTIONS)})")
+    query_parser.add_argument('--approx', action='store_true',
+                              help="Merge the shards' HyperLogLog sketches instead of their id sets for total distinct counts")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.command == 'build':
+        build(args)
+        return
+
+    unknown = [name for name in args.questions if name not in QUESTIONS]
+    if unknown:
+        parser.error(f"unknown questions: {', '.join(unknown)}")
+    results = query(args)
+    for name in args.questions or QUESTIONS:
+        row, seconds = results[name]
+        print(f"\n=== {QUESTIONS[name]['title']} ===")
+        for value in row or ():
+            print(value)
+        print(f"({name} took {seconds:.3f} seconds)")
+
+    end_time = time.time()
+    print(f"\nExecution time: {end_time - start_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,43 @@
-import duckdb
+from dedup import has_canonical
+from query_cache import connect_cached
+from sketches import approx_distinct
+from summaries import has_summaries
+import argparse
 import time
 
+parser = argparse.ArgumentParser(description="Find the states with the most and least listings.")
+parser.add_argument('--approx', action='store_true',
+                    help="Estimate per-state listing counts from HyperLogLog sketches, with a ~95%% error bound")
+args = parser.parse_args()
+
 start_time = time.time()
 
-con = duckdb.connect('airbnb.db')
+con = connect_cached()
 
-# Count unique listings by state
-state_counts = con.execute("""
-    SELECT state, COUNT(DISTINCT id) as listing_count
-    FROM listings
-    GROUP BY state
-    ORDER BY listing_count DESC
-""").fetchall()
+# Count unique listings by state (kept up to date by ingest when the summary tables exist)
+if args.approx:
+    state_counts = sorted(approx_distinct(con, "listings", "id", by_state=True), key=lambda row: row[1], reverse=True)
+elif has_summaries(con):
+    state_counts = con.execute("""
+        SELECT state, listings as listing_count
+        FROM state_listing_counts
+        ORDER BY listing_count DESC
+    """).fetchall()
+elif has_canonical(con, "listings"):
+    # One row per listing id and state it appears in
+    state_counts = con.execute("""
+        SELECT state, COUNT(*) as listing_count
+        FROM listing_id_states
+        GROUP BY state
+        ORDER BY listing_count DESC
+    """).fetchall()
+else:
+    state_counts = con.execute("""
+        SELECT state, COUNT(DISTINCT id) as listing_count
+        FROM listings
+        GROUP BY state
+        ORDER BY listing_count DESC
+    """).fetchall()
 
 # State with most listings
 print(state_counts[0][0])
@@ -19,6 +45,10 @@ print(state_counts[0][0])
 # State with least listings
 print(state_counts[-1][0])
 
+if args.approx:
+    for state, estimate, bound in (state_counts[0], state_counts[-1]):
+        print(f"{state}: {estimate} ± {bound} listings")
+
 con.close()
 
 end_time = time.time()
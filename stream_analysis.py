@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Answer every challenge question straight from the CSV files, without airbnb.db.
+
+For a one-off look at a fresh data drop, building the database costs far
+more than the eight numbers it is needed for. This reads each listings and
+reviews file exactly once, in parallel (one process per file), and keeps
+only what the questions use:
+
+    listings  id, host_id, state, mentions_camera
+    reviews   id, listing_id, reviewer_id, state, mentions_camera
+
+The camera flags are evaluated while the text is in memory, so the long
+description/host_about/amenities/comments columns are dropped right after
+parsing. The narrow rows go to zstd Parquet runs in a temporary spill
+directory (a few percent of the CSV size), and the questions are answered
+from those by run_all.py's shared sub-results in an in-memory DuckDB. Exact
+distinct counts need every id, and the spill plus DuckDB's memory limit (see
+resources.py) keep memory bounded while they are counted. The spill
+directory is removed at the end.
+
+Usage:
+    python3 stream_analysis.py                       # every question, like analysis.py
+    python3 stream_analysis.py top_host count_unique
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from typing import Tuple
+
+import duckdb
+from tqdm import tqdm
+
+from keywords import flag_column, mention_expression
+from resources import configure, detect_resources
+from run_all import QUESTIONS, run
+from schema import csv_columns, csv_stem, find_csv_files, state_from_filename
+
+KEYWORD = 'camera'
+
+# Table -> columns the questions read (besides state and the camera flag)
+KEPT_COLUMNS = {
+    "listings": ("id", "host_id"),
+    "reviews": ("id", "listing_id", "reviewer_id"),
+}
+
+RESOURCES = detect_resources()
+
+
+def spill_file(task: Tuple[str, str, str]) -> Tuple[str, int]:
+    """
+    Reduce one CSV file to its narrow spill run (runs in a worker process).
+
+    Args:
+        task: Tuple of (file_path, table_name, spill_dir)
+
+    Returns:
+        Tuple of (file_path, rows)
+    """
+    file_path, table_name, spill_dir = task
+    columns = ", ".join(f"'{name}': '{col_type}'" for name, col_type in csv_columns(table_name).items())
+    stem = os.path.basename(csv_stem(file_path))
+    output_path = os.path.join(spill_dir, table_name, f"{stem}.parquet")
+
+    con = duckdb.connect()
+    configure(con, RESOURCES, processes=RESOURCES.workers)
+    rows = con.execute(f"""
+        COPY (
+            SELECT {', '.join(KEPT_COLUMNS[table_name])},
+                   '{state_from_filename(file_path)}' AS state,
+                   COALESCE({mention_expression(table_name, KEYWORD)}, false) AS {flag_column(KEYWORD)}
+            FROM read_csv('{file_path}', header = true, columns = {{{columns}}})
+        ) TO '{output_path}' (FORMAT parquet, COMPRESSION zstd)
+    """).fetchone()[0]
+    con.close()
+    return file_path, rows
+
+
+def spill_all(spill_dir: str) -> dict:
+    """
+    Read every CSV file once, in parallel, into the spill directory.
+
+    Returns:
+        Dict of table name -> rows read
+    """
+    tasks = []
+    for table_name in KEPT_COLUMNS:
+        os.makedirs(os.path.join(spill_dir, table_name), exist_ok=True)
+        tasks += [(file_path, table_name, spill_dir) for file_path in find_csv_files(table_name)]
+    if not tasks:
+        raise FileNotFoundError("no *_listings.csv or *_reviews.csv files in the current directory")
+
+    rows = dict.fromkeys(KEPT_COLUMNS, 0)
+    table_of = {file_path: table_name for file_path, table_name, _ in tasks}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=RESOURCES.workers,
+                                                mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(spill_file, task) for task in tasks]
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Reading CSV files"):
+            file_path, file_rows = future.result()
+            rows[table_of[file_path]] += file_rows
+    return rows
+
+
+def attach_spill(con: duckdb.DuckDBPyConnection, spill_dir: str):
+    """Expose the spill runs as ``listings`` and ``reviews`` views for run_all's queries."""
+    for table_name in KEPT_COLUMNS:
+        pattern = os.path.join(spill_dir, table_name, '*.parquet')
+        con.execute(f"CREATE OR REPLACE VIEW {table_name} AS SELECT * FROM read_parquet('{pattern}')")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer the challenge questions directly from the CSV files.")
+    parser.add_argument('questions', nargs='*', help=f"Questions to run (default: all of {', '.join(QUESTIONS)})")
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent cursors for the questions (default: 4)")
+    args = parser.parse_args()
+    unknown = [name for name in args.questions if name not in QUESTIONS]
+    if unknown:
+        parser.error(f"unknown questions: {', '.join(unknown)}")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    names = args.questions or list(QUESTIONS)
+
+    start_time = time.time()
+    spill_dir = tempfile.mkdtemp(prefix='airbnb_stream_', dir=RESOURCES.temp_dir)
+    try:
+        rows = spill_all(spill_dir)
+        read_time = time.time() - start_time
+        spill_bytes = sum(os.path.getsize(path) for path in glob.glob(os.path.join(spill_dir, '*', '*.parquet')))
+        print(f"Read {rows['listings']:,} listings and {rows['reviews']:,} reviews in {read_time:.2f} seconds "
+              f"({spill_bytes / 1024 ** 2:,.1f} MB spilled)")
+
+        con = duckdb.connect()
+        configure(con, RESOURCES)
+        attach_spill(con, spill_dir)
+        results = run(con, names, args.workers)
+        con.close()
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    for name in names:
+        row, seconds = results[name]
+        print(f"\n=== {QUESTIONS[name]['title']} ===")
+        for value in row or ():
+            print(value)
+        print(f"({name} took {seconds:.3f} seconds)")
+
+    end_time = time.time()
+    print(f"\nExecution time: {end_time - start_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
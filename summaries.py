@@ -0,0 +1,264 @@
+"""
+Summary tables maintained during ingest.
+
+``state_analysis.py`` and ``top_host.py`` otherwise recompute a distinct
+count per state and a full ``listings JOIN reviews`` on every run. Ingest
+keeps their answers in small tables instead:
+
+    state_listing_counts   (state, listing_rows, listings)
+    state_review_counts    (state, review_rows, reviews, reviewers)
+    listing_hosts          (listing_id, host_id, state)
+    listing_review_counts  (listing_id, state, reviews)
+    listing_review_totals  (listing_id, reviews)
+    host_review_counts     (host_id, reviews)
+    summary_pending        (table_name, state)  states loaded since the last refresh
+
+Every input file belongs to one state, so a (re)load only makes its own
+state's rows stale. Loading a file records its state in ``summary_pending``,
+and once the files of a run are in, each pending state is recomputed once
+from its rows of the base table. A state with several files (CA has nine
+cities) is not rescanned after every one of them.
+
+A listing and its reviews can appear in the files of several states, so
+summing ``listing_review_counts`` over states would count such a review once
+per state. ``listing_review_totals`` holds each listing's distinct review
+count across all states instead: a listing seen in one state keeps that
+state's count, and only listings seen in several are recounted from
+``reviews``. The per-host totals are rolled up from ``listing_hosts`` and
+``listing_review_totals``, which hold one row per listing rather than per
+review. A review id belongs to exactly one listing, so summing per-listing
+distinct counts over a host's listings equals ``COUNT(DISTINCT r.id)`` of the
+join.
+
+A file's state is recorded as pending in the same transaction that marks it
+loaded in the ingest manifest, and the refresh clears the pending rows in the
+transaction that recomputes them. Summaries with pending states count as
+absent (see has_summaries()), so after a crash between the two the readers
+fall back to the base tables until the next run completes the refresh.
+"""
+
+import time
+from typing import Iterable
+
+import duckdb
+
+SUMMARY_TABLES = (
+    "state_listing_counts",
+    "state_review_counts",
+    "listing_hosts",
+    "listing_review_counts",
+    "listing_review_totals",
+    "host_review_counts",
+    "summary_pending",
+)
+
+# Table -> statements recomputing its per-state summaries for the state bound to $state
+STATE_REFRESH = {
+    "listings": [
+        "DELETE FROM state_listing_counts WHERE state = $state",
+        """
+        INSERT INTO state_listing_counts
+        SELECT $state, COUNT(*), COUNT(DISTINCT id) FROM listings WHERE state = $state
+        """,
+        "DELETE FROM listing_hosts WHERE state = $state",
+        """
+        INSERT INTO listing_hosts
+        SELECT DISTINCT id, host_id, state FROM listings WHERE state = $state
+        """,
+    ],
+    "reviews": [
+        "DELETE FROM state_review_counts WHERE state = $state",
+        """
+        INSERT INTO state_review_counts
+        SELECT $state, COUNT(*), COUNT(DISTINCT id), COUNT(DISTINCT reviewer_id)
+        FROM reviews WHERE state = $state
+        """,
+        "DELETE FROM listing_review_counts WHERE state = $state",
+        """
+        INSERT INTO listing_review_counts
+        SELECT listing_id, state, COUNT(DISTINCT id)
+        FROM reviews WHERE state = $state
+        GROUP BY listing_id, state
+        """,
+    ],
+}
+
+
+# Table -> listings whose totals reloading the state bound to $state can change (taken before and after)
+AFFECTED_LISTINGS = {
+    "listings": "SELECT listing_id FROM listing_hosts WHERE state = $state",
+    "reviews": "SELECT listing_id FROM listing_review_counts WHERE state = $state",
+}
+
+
+def summaries_exist(con: duckdb.DuckDBPyConnection) -> bool:
+    """Whether the connected database carries the summary tables (up to date or not)."""
+    found = con.execute(f"""
+        SELECT COUNT(*) FROM duckdb_tables()
+        WHERE database_name = current_database() AND schema_name = 'main'
+          AND table_name IN ({', '.join(f"'{table}'" for table in SUMMARY_TABLES)})
+    """).fetchone()[0]
+    return found == len(SUMMARY_TABLES)
+
+
+def has_summaries(con: duckdb.DuckDBPyConnection) -> bool:
+    """Whether the connected database carries summary tables that are up to date."""
+    return summaries_exist(con) and con.execute("SELECT COUNT(*) FROM summary_pending").fetchone()[0] == 0
+
+
+def refresh_listing_totals(con: duckdb.DuckDBPyConnection):
+    """Recompute the cross-state review totals of the listings in summary_listings."""
+    affected = "listing_id IN (SELECT listing_id FROM summary_listings)"
+    con.execute(f"DELETE FROM listing_review_totals WHERE {affected}")
+    # Seen in one state: that state's distinct count is the total
+    con.execute(f"""
+        INSERT INTO listing_review_totals
+        SELECT listing_id, reviews FROM listing_review_counts
+        WHERE {affected}
+        QUALIFY COUNT(*) OVER (PARTITION BY listing_id) = 1
+    """)
+    # Seen in several: recount, so a review present in more than one state counts once
+    con.execute(f"""
+        INSERT INTO listing_review_totals
+        SELECT listing_id, COUNT(DISTINCT id) FROM reviews
+        WHERE listing_id IN (
+            SELECT listing_id FROM listing_review_counts
+            WHERE {affected}
+            GROUP BY listing_id HAVING COUNT(*) > 1
+        )
+        GROUP BY listing_id
+    """)
+
+
+def refresh_host_counts(con: duckdb.DuckDBPyConnection):
+    """Roll the per-listing review totals up to per-host totals for the hosts in summary_hosts."""
+    con.execute("DELETE FROM host_review_counts WHERE host_id IN (SELECT host_id FROM summary_hosts)")
+    con.execute("""
+        INSERT INTO host_review_counts
+        SELECT h.host_id, SUM(t.reviews)
+        FROM (
+            SELECT DISTINCT listing_id, host_id FROM listing_hosts
+            WHERE host_id IN (SELECT host_id FROM summary_hosts)
+        ) h
+        JOIN listing_review_totals t USING (listing_id)
+        GROUP BY h.host_id
+    """)
+
+
+def collect_hosts(con: duckdb.DuckDBPyConnection):
+    """Add the current hosts of the listings in summary_listings to summary_hosts."""
+    con.execute("""
+        INSERT INTO summary_hosts
+        SELECT DISTINCT host_id FROM listing_hosts
+        WHERE listing_id IN (SELECT listing_id FROM summary_listings)
+    """)
+
+
+def refresh_summaries(con: duckdb.DuckDBPyConnection, table_name: str, states: Iterable[str]):
+    """
+    Recompute the summaries affected by (re)loading files of one table.
+
+    Only the listings of the reloaded states and their hosts, as they were
+    before and after the reload, get new totals, so a run costs about the
+    size of the files it loads rather than the whole host table per file.
+
+    Args:
+        con: DuckDB connection, normally inside the file's load transaction
+        table_name: 'listings' or 'reviews'
+        states: State codes of the loaded files
+    """
+    con.execute("CREATE OR REPLACE TEMP TABLE summary_listings (listing_id BIGINT)")
+    con.execute("CREATE OR REPLACE TEMP TABLE summary_hosts (host_id BIGINT)")
+    for state_code in sorted(set(states)):
+        con.execute(f"INSERT INTO summary_listings {AFFECTED_LISTINGS[table_name]}", {'state': state_code})
+        if table_name == 'listings':
+            # A reloaded listing may have moved to another host, whose total drops
+            collect_hosts(con)
+        for statement in STATE_REFRESH[table_name]:
+            con.execute(statement, {'state': state_code})
+        con.execute(f"INSERT INTO summary_listings {AFFECTED_LISTINGS[table_name]}", {'state': state_code})
+    if table_name == 'reviews':
+        refresh_listing_totals(con)
+    collect_hosts(con)
+    refresh_host_counts(con)
+    con.execute("DROP TABLE summary_listings")
+    con.execute("DROP TABLE summary_hosts")
+
+
+def mark_summaries_stale(con: duckdb.DuckDBPyConnection, table_name: str, states: Iterable[str]):
+    """
+    Record states whose summaries a (re)load of files of one table made stale.
+
+    Args:
+        con: DuckDB connection, normally inside the file's load transaction
+        table_name: 'listings' or 'reviews'
+        states: State codes of the loaded files
+    """
+    for state_code in sorted(set(states)):
+        con.execute("""
+            INSERT INTO summary_pending
+            SELECT $table_name, $state
+            WHERE NOT EXISTS (SELECT 1 FROM summary_pending WHERE table_name = $table_name AND state = $state)
+        """, {'table_name': table_name, 'state': state_code})
+
+
+def refresh_pending_summaries(con: duckdb.DuckDBPyConnection):
+    """Recompute the summaries of every pending state once, in one transaction, and print what ran."""
+    pending = dict(con.execute("""
+        SELECT table_name, list(state ORDER BY state) FROM summary_pending GROUP BY table_name
+    """).fetchall())
+    if not pending:
+        return
+
+    start_time = time.time()
+    con.execute("BEGIN TRANSACTION")
+    try:
+        # Listings first: the reviews pass then rolls up hosts with the final listing -> host pairs
+        for table_name in STATE_REFRESH:
+            if table_name in pending:
+                refresh_summaries(con, table_name, pending[table_name])
+        con.execute("DELETE FROM summary_pending")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    states = sorted({state_code for states in pending.values() for state_code in states})
+    print(f"Refreshed the summaries of {len(states)} states in {time.time() - start_time:.2f} seconds")
+
+
+def create_summaries(con: duckdb.DuckDBPyConnection):
+    """
+    Create the summary tables if they do not exist yet.
+
+    Tables created here are filled from whatever the base tables already
+    hold, so a database loaded before the summaries existed gets complete
+    summaries on its next ingest.
+    """
+    if summaries_exist(con):
+        return
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute("CREATE TABLE IF NOT EXISTS state_listing_counts (state TEXT, listing_rows BIGINT, listings BIGINT)")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS state_review_counts (
+                state TEXT, review_rows BIGINT, reviews BIGINT, reviewers BIGINT
+            )
+        """)
+        con.execute("CREATE TABLE IF NOT EXISTS listing_hosts (listing_id BIGINT, host_id BIGINT, state TEXT)")
+        con.execute("CREATE TABLE IF NOT EXISTS listing_review_counts (listing_id BIGINT, state TEXT, reviews BIGINT)")
+        con.execute("CREATE TABLE IF NOT EXISTS listing_review_totals (listing_id BIGINT, reviews BIGINT)")
+        con.execute("CREATE TABLE IF NOT EXISTS host_review_counts (host_id BIGINT, reviews BIGINT)")
+        con.execute("CREATE TABLE IF NOT EXISTS summary_pending (table_name TEXT, state TEXT)")
+
+        # Rebuilt below from the other tables, so hosts left over from an older layout go
+        con.execute("DELETE FROM host_review_counts")
+        for table_name in STATE_REFRESH:
+            states = [row[0] for row in con.execute(
+                f"SELECT DISTINCT state FROM {table_name} WHERE state IS NOT NULL"
+            ).fetchall()]
+            refresh_summaries(con, table_name, states)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
@@ -0,0 +1,279 @@
+"""
+Ingest telemetry: where the time goes, per input file.
+
+The preprocessing scripts record for every file:
+
+    bytes, rows, status
+    parse_seconds          reading and parsing the CSV into Arrow batches
+    insert_seconds         DuckDB inserting (or writing Parquet) the parsed rows
+    queue_wait_seconds     writer blocked waiting for this file's batches (parsers too slow)
+    backpressure_seconds   parser blocked on a full queue (writer too slow)
+    refresh_seconds        summary, sketch and amenity refreshes and the manifest update
+    commit_seconds         the COMMIT statements themselves (WAL write, checkpoint)
+    wall_seconds           first read to commit
+    cpu_seconds            CPU time of the parse and insert work
+    read_bytes             bytes read from storage (Linux /proc/<pid>/io)
+    peak_rss_bytes         peak resident memory of the processes involved
+    mb_per_second          input MB per wall second
+    bound                  cpu or io (see bottleneck())
+
+DuckDB's native reader (preprocess_fast.py) parses and inserts in one pass,
+so its parse time is part of insert_seconds and parse_seconds is null.
+
+At the end of a run the records go to a JSON report and a Prometheus
+textfile (for node_exporter's textfile collector), and the slowest files are
+printed. A run that loads no files leaves the previous reports in place.
+"""
+
+import json
+import os
+import resource
+import time
+from typing import Dict, Optional
+
+# CPU seconds per busy second at or above which a file counts as CPU bound
+CPU_BOUND_RATIO = 0.5
+
+DEFAULT_JSON_PATH = 'ingest_metrics.json'
+DEFAULT_PROM_PATH = 'ingest_metrics.prom'
+
+# Per-file counters, summed over a file's batches
+COUNTERS = (
+    "parse_seconds", "insert_seconds", "queue_wait_seconds", "backpressure_seconds",
+    "refresh_seconds", "commit_seconds", "cpu_seconds", "read_bytes",
+)
+
+# Per-file Prometheus gauges: record key -> (metric name, help)
+PROM_METRICS = {
+    "rows": ("airbnb_ingest_file_rows", "Rows loaded from the file"),
+    "bytes": ("airbnb_ingest_file_bytes", "Size of the input file"),
+    "parse_seconds": ("airbnb_ingest_file_parse_seconds", "Time parsing CSV into Arrow batches"),
+    "insert_seconds": ("airbnb_ingest_file_insert_seconds", "Time inserting the parsed rows"),
+    "queue_wait_seconds": ("airbnb_ingest_file_queue_wait_seconds", "Writer time blocked waiting for batches"),
+    "backpressure_seconds": ("airbnb_ingest_file_backpressure_seconds", "Parser time blocked on a full queue"),
+    "refresh_seconds": ("airbnb_ingest_file_refresh_seconds", "Time refreshing summaries, sketches and bitmaps"),
+    "commit_seconds": ("airbnb_ingest_file_commit_seconds", "Time in COMMIT statements"),
+    "wall_seconds": ("airbnb_ingest_file_wall_seconds", "Wall time from first read to commit"),
+    "cpu_seconds": ("airbnb_ingest_file_cpu_seconds", "CPU time of the parse and insert work"),
+    "read_bytes": ("airbnb_ingest_file_read_bytes", "Bytes read from storage"),
+    "peak_rss_bytes": ("airbnb_ingest_file_peak_rss_bytes", "Peak resident memory while loading the file"),
+    "mb_per_second": ("airbnb_ingest_file_mb_per_second", "Input MB per wall second"),
+}
+
+
+def io_read_bytes() -> int:
+    """Bytes this process has read from storage so far (0 where unavailable)."""
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('read_bytes:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident memory of this process so far."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KB on Linux
+
+
+class Stage:
+    """
+    Context manager timing a stage of a file's work in this process.
+
+    Adds the stage's wall time to ``<stage>_seconds`` and its CPU time and
+    storage reads to ``cpu_seconds`` / ``read_bytes`` of a stats dict.
+    """
+
+    def __init__(self, stats: dict, stage: str):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.read = io_read_bytes()
+        return self
+
+    def __exit__(self, *exc):
+        key = f"{self.stage}_seconds"
+        self.stats[key] = self.stats.get(key, 0.0) + time.perf_counter() - self.wall
+        self.stats["cpu_seconds"] = self.stats.get("cpu_seconds", 0.0) + time.process_time() - self.cpu
+        self.stats["read_bytes"] = self.stats.get("read_bytes", 0) + io_read_bytes() - self.read
+        return False
+
+
+def bottleneck(record: dict) -> str:
+    """
+    Classify what bounds a file's load.
+
+    ``io`` when COMMIT takes longer than any stage of work (parsing,
+    inserting, refreshing): there is a single writer, so that time is WAL
+    and checkpoint I/O, not lock waits. Otherwise ``cpu`` when the work used
+    at least CPU_BOUND_RATIO CPU seconds per second, else ``io``.
+    """
+    parse, insert, refresh, commit = (record.get(key) or 0.0 for key in
+                                      ("parse_seconds", "insert_seconds", "refresh_seconds", "commit_seconds"))
+    if commit > max(parse, insert, refresh):
+        return "io"
+    busy = parse + insert + refresh
+    if busy and record.get("cpu_seconds", 0.0) / busy >= CPU_BOUND_RATIO:
+        return "cpu"
+    return "io"
+
+
+class IngestTelemetry:
+    """Collects per-file metrics during an ingest run and writes the reports."""
+
+    def __init__(self, script: str):
+        self.script = script
+        self.started_at = time.time()
+        self.files: Dict[str, dict] = {}
+
+    def start(self, file_path: str, table_name: str, state_code: Optional[str], started_at: float = None,
+              parses: bool = True) -> dict:
+        """
+        Register a file (once) and return its record.
+
+        Pass parses=False when the reader parses inside the insert (DuckDB's
+        native reader): the record's parse_seconds is then None, not 0.
+        """
+        if file_path not in self.files:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                size = 0
+            self.files[file_path] = {
+                "file": os.path.basename(file_path),
+                "table": table_name,
+                "state": state_code,
+                "bytes": size,
+                "rows": 0,
+                "status": "pending",
+                "started_at": started_at or time.time(),
+                **{counter: 0 for counter in COUNTERS},
+                "peak_rss_bytes": 0,
+            }
+            if not parses:
+                self.files[file_path]["parse_seconds"] = None
+        record = self.files[file_path]
+        if started_at is not None:
+            record["started_at"] = min(record["started_at"], started_at)
+        return record
+
+    def add(self, file_path: str, stats: dict):
+        """Merge measurements (counters are summed, peak memory maxed) into a file's record."""
+        record = self.files[file_path]
+        for key, value in stats.items():
+            if key in COUNTERS:
+                record[key] = (record[key] or 0) + value
+            elif key == "peak_rss_bytes":
+                record[key] = max(record[key], value)
+            elif key == "started_at":
+                record[key] = min(record[key], value)
+
+    def finish(self, file_path: str, rows: int, status: str):
+        """Close a file's record once it is committed or has failed."""
+        record = self.files[file_path]
+        record["rows"] = rows
+        record["status"] = "loaded" if status == "success" else "failed"
+        record["wall_seconds"] = time.time() - record["started_at"]
+        record["peak_rss_bytes"] = max(record["peak_rss_bytes"], peak_rss_bytes())
+        record["mb_per_second"] = record["bytes"] / 1024 ** 2 / record["wall_seconds"] if record["wall_seconds"] else None
+        record["bound"] = bottleneck(record)
+
+    def report(self) -> dict:
+        """The whole run as a JSON-serializable dict."""
+        files = sorted((record for record in self.files.values() if "wall_seconds" in record),
+                       key=lambda record: record["wall_seconds"], reverse=True)
+        elapsed = time.time() - self.started_at
+        total_bytes = sum(record["bytes"] for record in files)
+        return {
+            "script": self.script,
+            "started_at": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            "wall_seconds": elapsed,
+            "files": len(files),
+            "failed_files": sum(record["status"] == "failed" for record in files),
+            "rows": sum(record["rows"] for record in files),
+            "bytes": total_bytes,
+            "mb_per_second": total_bytes / 1024 ** 2 / elapsed if elapsed else None,
+            "peak_rss_bytes": max([peak_rss_bytes()] + [record["peak_rss_bytes"] for record in files]),
+            "seconds_by_stage": {counter: sum(record[counter] or 0 for record in files)
+                                 for counter in COUNTERS if counter.endswith("_seconds")},
+            "bound_files": {bound: sum(record["bound"] == bound for record in files)
+                            for bound in ("cpu", "io")},
+            "by_file": files,
+        }
+
+    def prometheus(self, report: dict) -> str:
+        """Prometheus text exposition of a report."""
+        lines = []
+
+        def gauge(name: str, help_text: str, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{value_text}"' for key, value_text in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        script = {"script": self.script}
+        gauge("airbnb_ingest_run_seconds", "Wall time of the last ingest run", [(script, report["wall_seconds"])])
+        gauge("airbnb_ingest_run_rows", "Rows loaded by the last ingest run", [(script, report["rows"])])
+        gauge("airbnb_ingest_run_files", "Files processed by the last ingest run, by status",
+              [({**script, "status": "loaded"}, report["files"] - report["failed_files"]),
+               ({**script, "status": "failed"}, report["failed_files"])])
+        gauge("airbnb_ingest_run_peak_rss_bytes", "Peak resident memory of the last ingest run",
+              [(script, report["peak_rss_bytes"])])
+        gauge("airbnb_ingest_run_finished_timestamp_seconds", "Unix time the last ingest run finished",
+              [(script, int(time.time()))])
+
+        for key, (name, help_text) in PROM_METRICS.items():
+            gauge(name, help_text, [
+                ({**script, "file": record["file"], "table": record["table"], "state": record["state"] or "",
+                  "bound": record["bound"]}, record[key])
+                for record in report["by_file"] if record.get(key) is not None
+            ])
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path: Optional[str] = DEFAULT_JSON_PATH, prom_path: Optional[str] = DEFAULT_PROM_PATH):
+        """
+        Write the JSON report and Prometheus textfile (each skipped when its path is empty).
+
+        Nothing is written when no file was loaded, so a no-op re-run keeps
+        the reports of the run that did the work.
+        """
+        report = self.report()
+        if not report["by_file"]:
+            print("No files loaded; keeping the previous ingest reports")
+            return
+        outputs = [(json_path, lambda: json.dumps(report, indent=2)), (prom_path, lambda: self.prometheus(report))]
+        for path, render in outputs:
+            if not path:
+                continue
+            # Rename into place so a collector never reads a half-written file
+            with open(path + '.tmp', 'w') as f:
+                f.write(render())
+            os.replace(path + '.tmp', path)
+        self.print_summary(report)
+
+    def print_summary(self, report: dict, top: int = 5):
+        """Print the slowest files and the time spent per stage."""
+        if not report["by_file"]:
+            return
+        print(f"Slowest files ({report['mb_per_second'] or 0:.1f} MB/s overall):")
+        for record in report["by_file"][:top]:
+            parse = "-" if record['parse_seconds'] is None else f"{record['parse_seconds']:.2f}s"
+            print(f"  {record['file']:<40}{record['wall_seconds']:>8.2f}s{record['mb_per_second'] or 0:>9.1f} MB/s"
+                  f"  parse {parse}  insert {record['insert_seconds']:.2f}s"
+                  f"  wait {record['queue_wait_seconds']:.2f}s  refresh {record['refresh_seconds']:.2f}s"
+                  f"  commit {record['commit_seconds']:.2f}s"
+                  f"  [{record['bound']}]")
+
+
+def add_telemetry_arguments(parser):
+    """Add the report path options to a command line parser."""
+    parser.add_argument('--metrics-json', default=DEFAULT_JSON_PATH,
+                        help=f"Per-file ingest metrics report, '' to skip (default: {DEFAULT_JSON_PATH})")
+    parser.add_argument('--metrics-prom', default=DEFAULT_PROM_PATH,
+                        help=f"Prometheus textfile with the same metrics, '' to skip (default: {DEFAULT_PROM_PATH})")
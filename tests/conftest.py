@@ -0,0 +1,270 @@
+"""
+Shared fixtures: tiny generated datasets and the baseline answers.
+
+Every test builds its own database in a temporary directory from CSV files
+written here, in the text formats of the real files (``t``/``f`` booleans,
+``$1,234.00`` prices, JSON-ish lists, quoted multi-line text). The dataset
+keeps the shapes the stateful features care about:
+
+- a state with two city files (CA), so per-state work spans files
+- listings (and their reviews) repeated in a neighbouring state's file
+  (NY -> NJ), and review rows repeated within a file
+- camera mentions in every text column the questions read
+
+The scripts run as subprocesses in that directory, exactly as from the
+command line, and their answers are compared with the original challenge
+queries run directly on the CSV files (baseline_answers()).
+"""
+
+import csv
+import os
+import random
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import duckdb
+import pytest
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+
+from schema import csv_columns  # noqa: E402
+
+# The challenge questions, in the order answers() and baseline_answers() list them
+ANSWER_SCRIPTS = ('count_rows', 'count_unique', 'state_analysis', 'top_host',
+                  'camera_listings', 'top_camera_states', 'secret_cameras')
+
+# (city, state, listings); jersey_city_nj repeats SHARED_LISTINGS of new_york_city_ny
+CITIES = (
+    ("new_york_city", "ny", 60),
+    ("jersey_city", "nj", 30),
+    ("austin", "tx", 40),
+    ("los_angeles", "ca", 45),
+    ("san_diego", "ca", 25),
+)
+SHARED_LISTINGS = 10
+
+# CSV text of the columns whose file format differs from the stored value
+CSV_TEXT = {
+    "host_response_time": lambda rng: rng.choice(["within an hour", "within a day", "N/A"]),
+    "host_response_rate": lambda rng: f"{rng.randint(0, 100)}%",
+    "host_acceptance_rate": lambda rng: rng.choice([f"{rng.randint(0, 100)}%", "N/A"]),
+    "host_verifications": lambda rng: rng.choice(["['email', 'phone']", "['phone']", "None"]),
+    "room_type": lambda rng: rng.choice(["Entire home/apt", "Private room", "Shared room"]),
+    "price": lambda rng: f"${rng.randint(30, 2500):,}.00",
+}
+
+
+def csv_value(column: str, col_type: str, rng: random.Random) -> str:
+    """A plausible CSV value for a column not set explicitly."""
+    if column in CSV_TEXT:
+        return CSV_TEXT[column](rng)
+    if col_type in ("BIGINT", "INTEGER"):
+        return str(rng.randint(0, 365))
+    if col_type == "DOUBLE":
+        return f"{rng.random() * 5:.2f}"
+    if col_type == "DATE":
+        return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    if col_type == "BOOLEAN":
+        return rng.choice("tf")
+    return rng.choice(["Cozy, quiet", 'A "bright" room', "Line one\nline two", ""])
+
+
+def write_csv(path: Path, table_name: str, rows: List[Dict[str, object]], seed: int = 0):
+    """Write rows (column -> value) as a CSV file of a table; missing columns get generated values."""
+    rng = random.Random(seed)
+    columns = csv_columns(table_name)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row[column] if column in row else csv_value(column, col_type, rng)
+                             for column, col_type in columns.items()])
+
+
+def read_csv(path: Path) -> List[Dict[str, str]]:
+    """Rows of a CSV file written by write_csv()."""
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def edit_csv(path: Path, table_name: str, change: Callable[[List[Dict[str, str]]], List[Dict[str, str]]]):
+    """Rewrite a CSV file with change(rows), as a re-downloaded file would be."""
+    write_csv(path, table_name, change(read_csv(path)))
+
+
+def listing_row(listing_id: int, host_id: int, rng: random.Random) -> Dict[str, object]:
+    """A listing whose text mentions a camera now and then."""
+    amenities = ["Wifi", "Kitchen"] + (["Security cameras on property"] if rng.random() < 0.1 else [])
+    return {
+        "id": listing_id,
+        "host_id": host_id,
+        "description": "Sunny, \"quiet\" flat\nnear the park" + (" with a Camera at the door" if rng.random() < 0.1 else ""),
+        "host_about": "Local host" + (", I use cameras" if rng.random() < 0.05 else ""),
+        "amenities": "[" + ", ".join(f'"{amenity}"' for amenity in amenities) + "]",
+        "last_scraped": f"2024-06-{rng.randint(1, 28):02d}",
+    }
+
+
+def review_row(review_id: int, listing_id: int, rng: random.Random) -> Dict[str, object]:
+    """A review whose comment mentions a camera now and then."""
+    return {
+        "listing_id": listing_id,
+        "id": review_id,
+        "date": f"2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "reviewer_id": rng.randint(1, 900),
+        "reviewer_name": rng.choice(["Ann", "Bo, Jr.", "Chi"]),
+        "comments": "Great stay, would return." + (" Found a hidden camera!" if rng.random() < 0.06 else ""),
+    }
+
+
+def write_dataset(directory: Path, seed: int = 7):
+    """Write the listings and reviews files of CITIES into directory."""
+    rng = random.Random(seed)
+    hosts = list(range(1000, 1040))
+    next_listing, next_review = 1, 1
+    city_listings, city_reviews = {}, {}
+
+    for city, state, count in CITIES:
+        listings = []
+        if city == "jersey_city":
+            # The neighbouring state's file repeats some listings under the same host
+            listings = [dict(row) for row in city_listings["new_york_city"][:SHARED_LISTINGS]]
+        while len(listings) < count:
+            listings.append(listing_row(next_listing, rng.choice(hosts[:rng.randint(1, len(hosts))]), rng))
+            next_listing += 1
+        # A listing row repeated within the file
+        listings.append(dict(listings[-1]))
+
+        reviews = []
+        if city == "jersey_city":
+            shared = {row["id"] for row in listings[:SHARED_LISTINGS]}
+            reviews = [dict(row) for row in city_reviews["new_york_city"] if row["listing_id"] in shared][::2]
+        for listing in listings[:count]:
+            for _ in range(rng.randint(0, 12)):
+                reviews.append(review_row(next_review, listing["id"], rng))
+                next_review += 1
+        reviews.extend(dict(row) for row in reviews[:3])
+
+        city_listings[city], city_reviews[city] = listings, reviews
+        write_csv(directory / f"{city}_{state}_listings.csv", "listings", listings, seed)
+        write_csv(directory / f"{city}_{state}_reviews.csv", "reviews", reviews, seed)
+
+
+@pytest.fixture
+def dataset(tmp_path: Path) -> Path:
+    """Directory holding the standard generated CSV files (and, once loaded, airbnb.db)."""
+    write_dataset(tmp_path)
+    return tmp_path
+
+
+def script_env(**overrides: str) -> Dict[str, str]:
+    """Environment for the scripts: no result cache or query service unless asked for."""
+    return {**os.environ, 'AIRBNB_CACHE': '0', 'AIRBNB_SERVICE': '0', **overrides}
+
+
+def run(directory: Path, script: str, *args: str, env: Dict[str, str] = None) -> str:
+    """Run one of the repo's scripts in directory and return its output; fail the test if it fails."""
+    result = subprocess.run([sys.executable, str(REPO / script), *args], cwd=directory,
+                            capture_output=True, text=True, env=env or script_env())
+    assert result.returncode == 0, f"{script} {' '.join(args)} failed:\n{result.stdout}\n{result.stderr}"
+    return result.stdout
+
+
+def answers(directory: Path, env: Dict[str, str] = None) -> List[str]:
+    """The lines printed by the answer scripts, without their timing lines."""
+    lines = []
+    for script in ANSWER_SCRIPTS:
+        output = run(directory, f"{script}.py", env=env)
+        lines.extend(line for line in output.splitlines() if not line.startswith("Execution time"))
+    return lines
+
+
+def question_answers(output: str) -> List[str]:
+    """The answer lines of run_all.py-style output (the values under each ``=== title ===``)."""
+    lines, in_question = [], False
+    for line in output.splitlines():
+        if line.startswith("=== "):
+            in_question = True
+        elif line.startswith("(") and " took " in line:
+            in_question = False
+        elif in_question and line:
+            lines.append(line)
+    return lines
+
+
+def baseline_answers(directory: Path) -> List[str]:
+    """The original challenge queries, run directly on the CSV files in directory."""
+    con = duckdb.connect()
+    for table_name in ('listings', 'reviews'):
+        con.execute(f"""
+            CREATE VIEW {table_name} AS
+            SELECT *, upper(regexp_extract(filename, '_([a-z]{{2}})_{table_name}\\.csv$', 1)) AS state
+            FROM read_csv('{directory}/*_{table_name}.csv', header = true, all_varchar = true, filename = true)
+        """)
+    camera_listing = """(LOWER(description) LIKE '%camera%'
+                         OR LOWER(host_about) LIKE '%camera%'
+                         OR LOWER(amenities) LIKE '%camera%')"""
+
+    values = []
+    values += [con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0] for table_name in ('listings', 'reviews')]
+    values += [con.execute("SELECT COUNT(DISTINCT id) FROM listings").fetchone()[0],
+               con.execute("SELECT COUNT(DISTINCT id) FROM reviews").fetchone()[0],
+               con.execute("SELECT COUNT(DISTINCT reviewer_id) FROM reviews").fetchone()[0]]
+    states = con.execute("""
+        SELECT state, COUNT(DISTINCT id) AS listing_count FROM listings GROUP BY state ORDER BY listing_count DESC
+    """).fetchall()
+    values += [states[0][0], states[-1][0]]
+    values.append(con.execute("""
+        SELECT host_id, COUNT(DISTINCT r.id) AS review_count
+        FROM listings l JOIN reviews r ON l.id = r.listing_id
+        GROUP BY host_id ORDER BY review_count DESC LIMIT 1
+    """).fetchone()[1])
+    values.append(con.execute(f"SELECT COUNT(DISTINCT id) FROM listings WHERE {camera_listing}").fetchone()[0])
+    values += con.execute("""
+        WITH camera_reviews AS (
+            SELECT DISTINCT id, state FROM reviews WHERE LOWER(comments) LIKE '%camera%'
+        ),
+        total_reviews_by_state AS (
+            SELECT state, COUNT(DISTINCT id) AS total_reviews FROM reviews GROUP BY state
+        ),
+        camera_reviews_count AS (
+            SELECT state, COUNT(*) AS camera_reviews FROM camera_reviews GROUP BY state
+        )
+        SELECT c.state, c.camera_reviews
+        FROM camera_reviews_count c JOIN total_reviews_by_state t ON c.state = t.state
+        ORDER BY c.camera_reviews * 100.0 / t.total_reviews DESC
+        LIMIT 1
+    """).fetchone()
+    values += con.execute(f"""
+        WITH camera_in_reviews AS (
+            SELECT DISTINCT listing_id, state FROM reviews WHERE LOWER(comments) LIKE '%camera%'
+        ),
+        camera_in_listings AS (
+            SELECT DISTINCT id, state FROM listings WHERE {camera_listing}
+        ),
+        secret_camera_listings AS (
+            SELECT c.listing_id, c.state
+            FROM camera_in_reviews c LEFT JOIN camera_in_listings l ON c.listing_id = l.id
+            WHERE l.id IS NULL
+        ),
+        state_counts AS (
+            SELECT state, COUNT(*) AS count FROM secret_camera_listings GROUP BY state
+        ),
+        total_listings_by_state AS (
+            SELECT state, COUNT(DISTINCT id) AS total_listings FROM listings GROUP BY state
+        )
+        SELECT s.state, s.count
+        FROM state_counts s JOIN total_listings_by_state t ON s.state = t.state
+        ORDER BY s.count * 100.0 / t.total_listings DESC
+        LIMIT 1
+    """).fetchone()
+    con.close()
+    return [str(value) for value in values]
+
+
+def connect(directory: Path) -> duckdb.DuckDBPyConnection:
+    """Read-only connection to the airbnb.db built in directory."""
+    return duckdb.connect(str(directory / 'airbnb.db'), read_only=True)
@@ -0,0 +1,53 @@
+"""Amenity bitmaps (amenities.py): lookups agree with scanning the amenity lists, across reloads."""
+
+import json
+
+from amenities import amenity_scan_filter, has_amenities, listings_with_amenities
+from conftest import connect, edit_csv, run
+
+# (names, match_all, contains)
+LOOKUPS = [
+    (["Wifi"], True, False),
+    (["kitchen", "Security cameras on property"], True, False),
+    (["camera", "pool"], False, True),
+    (["Pool", "Wifi"], True, False),
+    (["No such amenity"], False, False),
+]
+
+
+def assert_bitmaps_match_scan(directory):
+    with connect(directory) as con:
+        assert has_amenities(con)
+        for names, match_all, contains in LOOKUPS:
+            scanned = con.execute(f"""
+                SELECT state, COUNT(DISTINCT id) AS listings
+                FROM listings
+                WHERE {amenity_scan_filter(names, match_all, contains)}
+                GROUP BY state
+                ORDER BY listings DESC, state
+            """, [name.lower() for name in names]).fetchall()
+            assert listings_with_amenities(con, names, match_all, contains) == scanned, names
+
+
+def with_pool(rows):
+    """Add a Pool to every third listing and take the cameras away from the rest."""
+    for index, row in enumerate(rows):
+        amenities = [amenity for amenity in json.loads(row["amenities"]) if "camera" not in amenity]
+        row["amenities"] = json.dumps(amenities + ["Pool"] if index % 3 == 0 else amenities)
+    return rows
+
+
+def test_bitmaps_match_scan(dataset):
+    run(dataset, 'preprocess.py')
+    assert_bitmaps_match_scan(dataset)
+
+
+def test_reload_replaces_file_bitmaps(dataset):
+    run(dataset, 'preprocess.py')
+    edit_csv(dataset / "austin_tx_listings.csv", "listings", with_pool)
+    edit_csv(dataset / "los_angeles_ca_listings.csv", "listings", lambda rows: rows[:15])
+
+    run(dataset, 'preprocess_fast.py')
+    assert_bitmaps_match_scan(dataset)
+    with connect(dataset) as con:
+        assert listings_with_amenities(con, ["Pool"]) == [("TX", 14)]
@@ -0,0 +1,51 @@
+"""Cold text store (coldstore.py): text routed to the cold store or the table across splits and reloads."""
+
+import duckdb
+
+from conftest import answers, baseline_answers, connect, edit_csv, run
+
+
+def csv_comments(directory):
+    return sorted(duckdb.sql(f"""
+        SELECT id::BIGINT, reviewer_name, comments
+        FROM read_csv('{directory}/*_reviews.csv', header = true, all_varchar = true)
+    """).fetchall())
+
+
+def test_split_keeps_text_reachable(dataset, monkeypatch):
+    # The full views read the cold store relative to the data directory, as the scripts do
+    monkeypatch.chdir(dataset)
+    run(dataset, 'preprocess.py', '--split-text')
+    with connect(dataset) as con:
+        # Every row's text moved out of the table...
+        assert con.execute("SELECT COUNT(*) FROM reviews WHERE comments IS NOT NULL OR text_id IS NULL").fetchone()[0] == 0
+        assert con.execute("SELECT COUNT(*) FROM listings WHERE description IS NOT NULL").fetchone()[0] == 0
+        # ...and comes back through the full view
+        assert sorted(con.execute("SELECT id, reviewer_name, comments FROM reviews_full").fetchall()) == \
+            csv_comments(dataset)
+    assert answers(dataset) == baseline_answers(dataset)
+
+
+def test_rows_loaded_after_a_split(dataset, monkeypatch):
+    monkeypatch.chdir(dataset)
+    run(dataset, 'preprocess.py', '--split-text')
+
+    # A reloaded file's rows keep their text in the table until the next split
+    edit_csv(dataset / "austin_tx_reviews.csv", "reviews",
+             lambda rows: [dict(row, comments=row["comments"] + " camera?") if index % 4 == 0 else row
+                           for index, row in enumerate(rows)])
+    run(dataset, 'preprocess.py')
+    with connect(dataset) as con:
+        assert con.execute("SELECT COUNT(*) FROM reviews WHERE text_id IS NULL").fetchone()[0] > 0
+        assert con.execute("SELECT COUNT(*) FROM reviews WHERE text_id IS NULL AND state <> 'TX'").fetchone()[0] == 0
+        assert sorted(con.execute("SELECT id, reviewer_name, comments FROM reviews_full").fetchall()) == \
+            csv_comments(dataset)
+    expected = baseline_answers(dataset)
+    assert answers(dataset) == expected
+
+    run(dataset, 'preprocess.py', '--split-text')
+    with connect(dataset) as con:
+        assert con.execute("SELECT COUNT(*) FROM reviews WHERE text_id IS NULL").fetchone()[0] == 0
+        assert sorted(con.execute("SELECT id, reviewer_name, comments FROM reviews_full").fetchall()) == \
+            csv_comments(dataset)
+    assert answers(dataset) == expected
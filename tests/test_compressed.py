@@ -0,0 +1,51 @@
+"""Compressed inputs (schema.py, preprocess*.py): .csv.gz/.csv.zst load like .csv and replace it in place."""
+
+import gzip
+import os
+
+import pyarrow as pa
+
+from conftest import answers, baseline_answers, connect, run
+
+
+def compress(path, codec):
+    """Replace a .csv file with its gzip or zstd form, as a compressed download would be."""
+    data = path.read_bytes()
+    if codec == 'gzip':
+        with gzip.open(f"{path}.gz", 'wb') as f:
+            f.write(data)
+    else:
+        with pa.CompressedOutputStream(f"{path}.zst", 'zstd') as f:
+            f.write(data)
+    os.remove(path)
+
+
+def manifest_paths(directory):
+    with connect(directory) as con:
+        return sorted(os.path.basename(row[0]) for row in con.execute(
+            "SELECT path FROM ingest_manifest WHERE status = 'loaded'"
+        ).fetchall())
+
+
+def test_compressed_files_load_like_plain_ones(dataset):
+    expected = baseline_answers(dataset)
+    compress(dataset / "austin_tx_reviews.csv", 'gzip')
+    compress(dataset / "los_angeles_ca_listings.csv", 'zstd')
+
+    run(dataset, 'preprocess.py')
+    assert answers(dataset) == expected
+    assert "austin_tx_reviews.csv.gz" in manifest_paths(dataset)
+
+
+def test_switching_to_a_compressed_copy_reloads_in_place(dataset):
+    expected = baseline_answers(dataset)
+    run(dataset, 'preprocess.py')
+    compress(dataset / "new_york_city_ny_reviews.csv", 'zstd')
+    compress(dataset / "jersey_city_nj_listings.csv", 'gzip')
+
+    output = run(dataset, 'preprocess_fast.py')
+    assert "Skipping 4 listings files" in output and "Skipping 4 reviews files" in output
+    paths = manifest_paths(dataset)
+    assert len(paths) == 10
+    assert "new_york_city_ny_reviews.csv.zst" in paths and "new_york_city_ny_reviews.csv" not in paths
+    assert answers(dataset) == expected
@@ -0,0 +1,50 @@
+"""Deduplicated canonical tables (dedup.py): exact counts, tie-break, and rebuilds after reloads."""
+
+from conftest import answers, baseline_answers, connect, edit_csv, run
+from dedup import dedup_stats, has_canonical, joins_exactly
+
+
+def assert_canonical_current(con):
+    for table_name, canonical, id_states in (('listings', 'listings_canonical', 'listing_id_states'),
+                                             ('reviews', 'reviews_canonical', 'review_id_states')):
+        assert has_canonical(con, table_name)
+        assert con.execute(f"SELECT COUNT(*), COUNT(DISTINCT id) FROM {canonical}").fetchone() == \
+            con.execute(f"SELECT COUNT(DISTINCT id), COUNT(DISTINCT id) FROM {table_name}").fetchone()
+        assert sorted(con.execute(f"SELECT id, state::VARCHAR, rows FROM {id_states}").fetchall()) == \
+            sorted(con.execute(f"SELECT id, state::VARCHAR, COUNT(*) FROM {table_name} GROUP BY ALL").fetchall())
+
+
+def test_canonical_tables_and_tie_break(dataset):
+    # NJ's copies of the shared listings were scraped later, so they win the tie-break
+    edit_csv(dataset / "jersey_city_nj_listings.csv", "listings",
+             lambda rows: [dict(row, last_scraped="2024-12-31") for row in rows])
+    run(dataset, 'preprocess.py', '--dedup')
+
+    with connect(dataset) as con:
+        assert_canonical_current(con)
+        assert con.execute("""
+            SELECT COUNT(*) FROM listings_canonical c
+            WHERE c.id IN (SELECT id FROM listing_id_states GROUP BY id HAVING COUNT(*) > 1) AND c.state <> 'NJ'
+        """).fetchone()[0] == 0
+        _, _, multi_state_ids, conflicting_ids = dedup_stats(con, 'listings')
+        assert (multi_state_ids, conflicting_ids) == (10, 0)
+    assert answers(dataset) == baseline_answers(dataset)
+
+
+def test_reload_drops_and_rebuild_restores(dataset):
+    run(dataset, 'preprocess.py', '--dedup')
+
+    # One copy of a shared review now names another listing: the canonical row can no longer stand in
+    edit_csv(dataset / "jersey_city_nj_reviews.csv", "reviews",
+             lambda rows: [dict(rows[0], listing_id="15")] + rows[1:])
+    run(dataset, 'preprocess.py')
+    with connect(dataset) as con:
+        assert not has_canonical(con, 'reviews')
+        assert has_canonical(con, 'listings')
+    assert answers(dataset) == baseline_answers(dataset)
+
+    run(dataset, 'preprocess.py', '--dedup')
+    with connect(dataset) as con:
+        assert_canonical_current(con)
+        assert not joins_exactly(con, 'reviews')
+    assert answers(dataset) == baseline_answers(dataset)
@@ -0,0 +1,45 @@
+"""Physical layout (layout.py): clustering, index profiles, and what a reload does to them."""
+
+from conftest import answers, baseline_answers, connect, edit_csv, run
+from layout import INDEX_PROFILES, SORT_KEYS
+
+
+def layout(directory):
+    """(clustered tables, index names) of the database in directory."""
+    with connect(directory) as con:
+        clustered = {row[0] for row in con.execute("SELECT table_name FROM table_layout").fetchall()}
+        indexes = {row[0] for row in con.execute(
+            "SELECT index_name FROM duckdb_indexes() WHERE database_name = current_database()"
+        ).fetchall()}
+    return clustered, indexes
+
+
+def assert_stored_in_order(directory, table_name):
+    keys = ", ".join(SORT_KEYS[table_name])
+    with connect(directory) as con:
+        stored = con.execute(f"SELECT {keys} FROM {table_name} ORDER BY rowid").fetchall()
+    assert stored == sorted(stored), table_name
+
+
+def test_sort_and_index_profile(dataset):
+    run(dataset, 'preprocess.py', '--sort', '--indexes', 'point-lookup')
+    assert layout(dataset) == (set(SORT_KEYS), set(INDEX_PROFILES['point-lookup']))
+    for table_name in SORT_KEYS:
+        assert_stored_in_order(dataset, table_name)
+    assert answers(dataset) == baseline_answers(dataset)
+
+
+def test_reload_unclusters_only_its_table(dataset):
+    run(dataset, 'preprocess.py', '--sort')
+    edit_csv(dataset / "austin_tx_reviews.csv", "reviews", lambda rows: rows[::2])
+
+    # The reload drops the reviews indexes first and the profile's are back afterwards
+    run(dataset, 'preprocess_fast.py')
+    assert layout(dataset) == ({'listings'}, set(INDEX_PROFILES['full']))
+    assert answers(dataset) == baseline_answers(dataset)
+
+    output = run(dataset, 'preprocess_fast.py', '--sort', '--indexes', 'none')
+    assert "Clustering reviews" in output and "Clustering listings" not in output
+    assert layout(dataset) == (set(SORT_KEYS), set())
+    assert_stored_in_order(dataset, 'reviews')
+    assert answers(dataset) == baseline_answers(dataset)
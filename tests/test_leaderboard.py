@@ -0,0 +1,65 @@
+"""Host leaderboard (leaderboard.py): every source agrees, ties share ranks, also after a reload."""
+
+from conftest import connect, read_csv, run, write_csv
+from leaderboard import leaderboard_sql
+
+# listing id -> host id
+HOSTS = {10: 1, 20: 2, 30: 3, 40: 4, 50: 5, 60: 3}
+
+
+def write_tied_dataset(directory):
+    """
+    All states: hosts 1, 2 and 3 tie on 5 reviews, host 4 has 3 and host 5 has 1.
+
+    Listing 10 is also in the TX file, with two of its NY reviews, which
+    count once. Per state, hosts 1 and 2 tie in NY and hosts 1 and 3 in TX.
+    """
+    reviews = {"ny": {10: 5, 20: 5, 30: 3, 40: 3, 50: 1}, "tx": {60: 2}}
+    next_review = 1
+    for city, state in (("new_york_city", "ny"), ("austin", "tx")):
+        rows = []
+        for listing_id, count in reviews[state].items():
+            rows += [{"listing_id": listing_id, "id": next_review + index} for index in range(count)]
+            next_review += count
+        if state == "tx":
+            rows += [row for row in read_csv(directory / "new_york_city_ny_reviews.csv") if row["listing_id"] == "10"][:2]
+        listings = [{"id": listing_id, "host_id": HOSTS[listing_id]}
+                    for listing_id in reviews[state].keys() | ({10} if state == "tx" else set())]
+        write_csv(directory / f"{city}_{state}_listings.csv", "listings", listings)
+        write_csv(directory / f"{city}_{state}_reviews.csv", "reviews", rows)
+
+
+def boards(directory, top, per_state=False):
+    """The board from every source (they must agree) as (state, host, reviews, rank) rows."""
+    with connect(directory) as con:
+        results = {source: con.execute(leaderboard_sql(source, 'host', per_state, top)).fetchall()
+                   for source in ('join', 'aggregate', 'summaries')}
+    assert results['aggregate'] == results['join']
+    assert results['summaries'] == results['join']
+    return results['join']
+
+
+def test_ties_share_ranks(tmp_path):
+    write_tied_dataset(tmp_path)
+    run(tmp_path, 'preprocess.py')
+
+    assert boards(tmp_path, 1) == [(None, 1, 5, 1), (None, 2, 5, 1), (None, 3, 5, 1)]
+    assert boards(tmp_path, 4) == [(None, 1, 5, 1), (None, 2, 5, 1), (None, 3, 5, 1), (None, 4, 3, 4)]
+    assert boards(tmp_path, 1, per_state=True) == [
+        ('NY', 1, 5, 1), ('NY', 2, 5, 1), ('TX', 1, 2, 1), ('TX', 3, 2, 1),
+    ]
+    output = run(tmp_path, 'leaderboard.py', '--top', '1')
+    assert [line.split()[0] for line in output.splitlines()[2:5]] == ["1=", "1=", "1="]
+
+
+def test_reload_breaks_a_tie(tmp_path):
+    write_tied_dataset(tmp_path)
+    run(tmp_path, 'preprocess.py')
+
+    # Host 2 gains a review in a reloaded NY file
+    reviews = read_csv(tmp_path / "new_york_city_ny_reviews.csv")
+    write_csv(tmp_path / "new_york_city_ny_reviews.csv", "reviews", reviews + [{"listing_id": 20, "id": 999}])
+    run(tmp_path, 'preprocess.py')
+
+    assert boards(tmp_path, 2) == [(None, 2, 6, 1), (None, 1, 5, 2), (None, 3, 5, 2)]
+    assert boards(tmp_path, 1, per_state=True) == [('NY', 2, 6, 1), ('TX', 1, 2, 1), ('TX', 3, 2, 1)]
@@ -0,0 +1,65 @@
+"""Ingest manifest (manifest.py): re-runs skip loaded files and reloads replace exactly a file's rows."""
+
+import os
+
+from conftest import answers, baseline_answers, connect, edit_csv, read_csv, run
+
+
+def assert_rows_match_files(directory):
+    """Every file is loaded once: one manifest entry each, holding exactly its CSV rows."""
+    with connect(directory) as con:
+        for table_name in ('listings', 'reviews'):
+            entries = con.execute(f"""
+                SELECT m.path, m.status, m.row_count, (SELECT COUNT(*) FROM {table_name} t WHERE t.file_id = m.file_id)
+                FROM ingest_manifest m WHERE m.table_name = ?
+            """, [table_name]).fetchall()
+            paths = sorted(directory.glob(f"*_{table_name}.csv"))
+            assert sorted(os.path.basename(path) for path, _, _, _ in entries) == [path.name for path in paths]
+            for path, status, row_count, stored in entries:
+                assert status == 'loaded', path
+                assert row_count == stored == len(read_csv(directory / os.path.basename(path))), path
+
+
+def test_rerun_skips_loaded_files(dataset):
+    run(dataset, 'preprocess.py')
+    # Touched but identical: the content hash keeps it skipped
+    os.utime(dataset / "austin_tx_reviews.csv")
+
+    output = run(dataset, 'preprocess.py')
+    assert "Loading 0 listings files" in output and "(5 already loaded)" in output
+    assert "Loading 0 reviews files" in output
+    assert_rows_match_files(dataset)
+    assert answers(dataset) == baseline_answers(dataset)
+
+
+def test_changed_file_replaces_its_rows(dataset):
+    run(dataset, 'preprocess.py')
+    edit_csv(dataset / "new_york_city_ny_reviews.csv", "reviews",
+             lambda rows: [dict(row, comments="Saw a camera in the hall") if index % 5 == 0 else row
+                           for index, row in enumerate(rows) if index % 4])
+    edit_csv(dataset / "austin_tx_listings.csv", "listings", lambda rows: rows[:20])
+
+    output = run(dataset, 'preprocess_fast.py')
+    assert "Skipping 4 listings files" in output and "Skipping 4 reviews files" in output
+    assert_rows_match_files(dataset)
+    assert answers(dataset) == baseline_answers(dataset)
+
+
+def test_failed_file_is_retried(dataset):
+    good = read_csv(dataset / "san_diego_ca_reviews.csv")
+    edit_csv(dataset / "san_diego_ca_reviews.csv", "reviews",
+             lambda rows: [dict(row, id="not a number") if index == 3 else row for index, row in enumerate(rows)])
+
+    run(dataset, 'preprocess.py')
+    with connect(dataset) as con:
+        assert con.execute("""
+            SELECT status FROM ingest_manifest WHERE path LIKE '%san_diego_ca_reviews.csv'
+        """).fetchone()[0] == 'failed'
+        assert con.execute("SELECT COUNT(*) FROM reviews WHERE state = 'CA'").fetchone()[0] == \
+            len(read_csv(dataset / "los_angeles_ca_reviews.csv"))
+
+    edit_csv(dataset / "san_diego_ca_reviews.csv", "reviews", lambda rows: good)
+    output = run(dataset, 'preprocess.py')
+    assert "Loading 1 reviews files" in output
+    assert_rows_match_files(dataset)
+    assert answers(dataset) == baseline_answers(dataset)
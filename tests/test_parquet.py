@@ -0,0 +1,30 @@
+"""Parquet staging backend (db.py, preprocess*.py --format parquet): same answers, one file per CSV."""
+
+from conftest import answers, baseline_answers, edit_csv, run, script_env
+
+
+def staged_files(directory, table_name):
+    return sorted(path.relative_to(directory / 'parquet' / table_name).as_posix()
+                  for path in (directory / 'parquet' / table_name).glob('state=*/*.parquet'))
+
+
+def test_parquet_answers_match(dataset):
+    run(dataset, 'preprocess.py', '--format', 'parquet')
+    assert staged_files(dataset, 'reviews') == [
+        "state=CA/los_angeles_ca_reviews.parquet", "state=CA/san_diego_ca_reviews.parquet",
+        "state=NJ/jersey_city_nj_reviews.parquet", "state=NY/new_york_city_ny_reviews.parquet",
+        "state=TX/austin_tx_reviews.parquet",
+    ]
+    assert answers(dataset, script_env(AIRBNB_BACKEND='parquet')) == baseline_answers(dataset)
+
+
+def test_reexport_replaces_changed_files(dataset):
+    run(dataset, 'preprocess.py', '--format', 'parquet')
+    edit_csv(dataset / "san_diego_ca_listings.csv", "listings", lambda rows: rows[:5])
+    edit_csv(dataset / "austin_tx_reviews.csv", "reviews", lambda rows: rows[::4])
+
+    output = run(dataset, 'preprocess_fast.py', '--format', 'parquet')
+    assert "Skipping 4 listings files that are already exported" in output
+    assert len(staged_files(dataset, 'listings')) == len(staged_files(dataset, 'reviews')) == 5
+    assert not list((dataset / 'parquet').rglob('*.tmp'))
+    assert answers(dataset, script_env(AIRBNB_BACKEND='parquet')) == baseline_answers(dataset)
@@ -0,0 +1,43 @@
+"""Query result cache (query_cache.py): cached answers are reused, and dropped once the data changes."""
+
+import sqlite3
+
+from conftest import answers, baseline_answers, edit_csv, run, script_env
+
+
+def cached_results(directory):
+    """(sql, fingerprint) of every result in the directory's cache file."""
+    with sqlite3.connect(directory / '.query_cache.sqlite') as cache:
+        return sorted(cache.execute("SELECT sql, fingerprint FROM results").fetchall())
+
+
+def test_cached_answers_are_reused(dataset):
+    run(dataset, 'preprocess.py')
+    env = script_env(AIRBNB_CACHE='1')
+
+    assert answers(dataset, env) == baseline_answers(dataset)
+    stored = cached_results(dataset)
+    assert stored and len({fingerprint for _, fingerprint in stored}) == 1
+
+    # A second run answers from the same entries without adding any
+    assert answers(dataset, env) == baseline_answers(dataset)
+    assert cached_results(dataset) == stored
+
+
+def test_reload_invalidates_cached_answers(dataset):
+    run(dataset, 'preprocess.py')
+    env = script_env(AIRBNB_CACHE='1')
+    before = answers(dataset, env)
+    old_fingerprint = cached_results(dataset)[0][1]
+
+    # Half of Austin's listings and every New York review but the first few go away
+    edit_csv(dataset / "austin_tx_listings.csv", "listings", lambda rows: rows[::2])
+    edit_csv(dataset / "new_york_city_ny_reviews.csv", "reviews", lambda rows: rows[:5])
+    run(dataset, 'preprocess.py')
+
+    after = answers(dataset, env)
+    assert after != before
+    assert after == baseline_answers(dataset)
+    # Results of the old data are gone, not just shadowed
+    fingerprints = {fingerprint for _, fingerprint in cached_results(dataset)}
+    assert len(fingerprints) == 1 and old_fingerprint not in fingerprints
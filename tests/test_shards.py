@@ -0,0 +1,34 @@
+"""Per-state shards (shards.py): fan-out answers across incremental and rebuilt shards."""
+
+import random
+
+from conftest import baseline_answers, edit_csv, question_answers, review_row, run, write_csv
+from shards import shard_states
+
+
+def test_fan_out_matches_single_database(dataset):
+    run(dataset, 'shards.py', 'build')
+    assert shard_states(str(dataset / 'shards')) == ['CA', 'NJ', 'NY', 'TX']
+    run(dataset, 'preprocess.py')
+    expected = baseline_answers(dataset)
+    assert question_answers(run(dataset, 'run_all.py')) == expected
+    assert question_answers(run(dataset, 'shards.py', 'query')) == expected
+
+
+def test_incremental_and_rebuilt_shards(dataset):
+    run(dataset, 'shards.py', 'build')
+
+    # Reviews of listings shared by NY and NJ change on the NJ side; CA gets a second reviews file
+    edit_csv(dataset / "jersey_city_nj_reviews.csv", "reviews", lambda rows: rows[1::2] + rows[:4])
+    rng = random.Random(3)
+    write_csv(dataset / "oakland_ca_listings.csv", "listings", [])
+    write_csv(dataset / "oakland_ca_reviews.csv", "reviews",
+              [review_row(70000 + index, int(listing_id), rng)
+               for index, listing_id in enumerate(["1", "2", "61", "62"] * 5)])
+
+    output = run(dataset, 'shards.py', 'build')
+    assert "Skipping" in output
+    assert question_answers(run(dataset, 'shards.py', 'query')) == baseline_answers(dataset)
+
+    run(dataset, 'shards.py', 'build', '--states', 'NY', '--rebuild')
+    assert question_answers(run(dataset, 'shards.py', 'query')) == baseline_answers(dataset)
@@ -0,0 +1,52 @@
+"""HyperLogLog sketches (sketches.py): --approx estimates stay within their bound across reloads."""
+
+from conftest import baseline_answers, connect, edit_csv, run
+from sketches import SKETCHED_COLUMNS, sketch_sql
+
+
+def approx_counts(directory):
+    """(estimate, bound) of each count_unique.py --approx line."""
+    output = run(directory, 'count_unique.py', '--approx')
+    return [tuple(int(value) for value in line.split(" ± "))
+            for line in output.splitlines() if " ± " in line]
+
+
+def assert_within_bounds(directory):
+    exact = [int(value) for value in baseline_answers(directory)[2:5]]
+    estimates = approx_counts(directory)
+    assert len(estimates) == len(exact)
+    for (estimate, bound), count in zip(estimates, exact):
+        assert abs(estimate - count) <= bound, (estimate, bound, count)
+
+
+def assert_sketches_current(directory):
+    """The merged per-file sketches equal one sketch of the whole column."""
+    with connect(directory) as con:
+        for table_name, columns in SKETCHED_COLUMNS.items():
+            for column in columns:
+                merged = con.execute("""
+                    SELECT register, max(rho) FROM hll_sketches
+                    WHERE table_name = ? AND column_name = ?
+                    GROUP BY register ORDER BY register
+                """, [table_name, column]).fetchall()
+                scanned = con.execute(f"SELECT * FROM ({sketch_sql(table_name, column)}) ORDER BY register").fetchall()
+                assert merged == scanned, (table_name, column)
+
+
+def test_estimates_within_bound(dataset):
+    run(dataset, 'preprocess.py')
+    assert_sketches_current(dataset)
+    assert_within_bounds(dataset)
+    output = run(dataset, 'state_analysis.py', '--approx')
+    assert output.splitlines()[:2] == baseline_answers(dataset)[5:7]
+
+
+def test_reload_replaces_file_sketches(dataset):
+    run(dataset, 'preprocess.py')
+    # Reviews (and their reviewers) disappear from one file; a listings file shrinks
+    edit_csv(dataset / "new_york_city_ny_reviews.csv", "reviews", lambda rows: rows[::3])
+    edit_csv(dataset / "los_angeles_ca_listings.csv", "listings", lambda rows: rows[:10])
+
+    run(dataset, 'preprocess_fast.py')
+    assert_sketches_current(dataset)
+    assert_within_bounds(dataset)
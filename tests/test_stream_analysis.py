@@ -0,0 +1,18 @@
+"""Database-free analysis (stream_analysis.py): answers straight from the CSV files."""
+
+import subprocess
+import sys
+
+from conftest import REPO, baseline_answers, question_answers, run, script_env
+
+
+def test_stream_answers_match(dataset):
+    output = run(dataset, 'stream_analysis.py', '--workers', '2')
+    assert question_answers(output) == baseline_answers(dataset)
+    assert not (dataset / 'airbnb.db').exists()
+
+
+def test_rejects_zero_workers(dataset):
+    result = subprocess.run([sys.executable, str(REPO / 'stream_analysis.py'), '--workers', '0'],
+                            cwd=dataset, capture_output=True, text=True, env=script_env())
+    assert result.returncode == 2 and "--workers must be at least 1" in result.stderr
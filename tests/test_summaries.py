@@ -0,0 +1,73 @@
+"""Summary tables (summaries.py): maintained per state across loads and reloads."""
+
+import random
+
+import duckdb
+
+from conftest import answers, baseline_answers, connect, edit_csv, listing_row, review_row, run, write_csv
+from summaries import has_summaries
+
+# Summary table -> the same numbers recomputed from the base tables
+RECOMPUTED = {
+    "state_listing_counts": "SELECT state, COUNT(*), COUNT(DISTINCT id) FROM listings GROUP BY state",
+    "state_review_counts": """
+        SELECT state, COUNT(*), COUNT(DISTINCT id), COUNT(DISTINCT reviewer_id) FROM reviews GROUP BY state
+    """,
+    "listing_hosts": "SELECT DISTINCT id, host_id, state FROM listings",
+    "listing_review_counts": "SELECT listing_id, state, COUNT(DISTINCT id) FROM reviews GROUP BY listing_id, state",
+    "listing_review_totals": "SELECT listing_id, COUNT(DISTINCT id) FROM reviews GROUP BY listing_id",
+    "host_review_counts": """
+        SELECT host_id, COUNT(DISTINCT r.id) FROM listings l JOIN reviews r ON l.id = r.listing_id GROUP BY host_id
+    """,
+}
+
+
+def assert_summaries_current(con: duckdb.DuckDBPyConnection):
+    assert has_summaries(con)
+    for table_name, query in RECOMPUTED.items():
+        stored = sorted(tuple(str(value) for value in row) for row in con.execute(f"SELECT * FROM {table_name}").fetchall())
+        expected = sorted(tuple(str(value) for value in row) for row in con.execute(query).fetchall())
+        assert stored == expected, table_name
+
+
+def test_summaries_match_base_tables(dataset):
+    run(dataset, 'preprocess.py')
+    with connect(dataset) as con:
+        assert_summaries_current(con)
+    assert answers(dataset) == baseline_answers(dataset)
+
+
+def test_reload_refreshes_only_what_changed(dataset):
+    run(dataset, 'preprocess.py')
+
+    # CA files lose reviews and move a listing to another host; a new TX file arrives
+    edit_csv(dataset / "los_angeles_ca_reviews.csv", "reviews", lambda rows: [row for row in rows if int(row["id"]) % 3])
+    edit_csv(dataset / "san_diego_ca_listings.csv", "listings",
+             lambda rows: [dict(row, host_id="1001") if index == 0 else row for index, row in enumerate(rows)])
+    rng = random.Random(1)
+    dallas = [listing_row(listing_id, 1001, rng) for listing_id in range(5000, 5010)]
+    write_csv(dataset / "dallas_tx_listings.csv", "listings", dallas)
+    write_csv(dataset / "dallas_tx_reviews.csv", "reviews",
+              [review_row(90000 + index, 5000 + index % 10, rng) for index in range(40)])
+
+    output = run(dataset, 'preprocess_fast.py')
+    # CA and TX are recomputed once each, however many of their files changed
+    assert "Refreshed the summaries of 2 states" in output
+    with connect(dataset) as con:
+        assert_summaries_current(con)
+        assert con.execute("SELECT COUNT(*) FROM summary_pending").fetchone()[0] == 0
+    assert answers(dataset) == baseline_answers(dataset)
+
+
+def test_pending_summaries_are_not_read(dataset):
+    run(dataset, 'preprocess.py')
+    # As after a crash between a file's load and the end-of-run refresh
+    with duckdb.connect(str(dataset / 'airbnb.db')) as con:
+        con.execute("INSERT INTO summary_pending VALUES ('reviews', 'NY')")
+        con.execute("UPDATE host_review_counts SET reviews = reviews + 1000")
+        assert not has_summaries(con)
+    assert answers(dataset) == baseline_answers(dataset)
+
+    run(dataset, 'preprocess.py')
+    with connect(dataset) as con:
+        assert con.execute("SELECT COUNT(*) FROM summary_pending").fetchone()[0] == 0
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Inverted token index over the review and listing text.
+
+Answering "which listings/states mention X" with LIKE means a full scan of
+the text columns every time. This optional post-ingest stage tokenizes
+``reviews.comments`` and ``listings.description``/``host_about``/``amenities``
+once into postings tables, so term lookups only touch a few row groups:
+
+    index_terms       (term_id, term, review_docs, listing_docs)
+    review_postings   (term_id, review_id, listing_id, state)  sorted by term_id
+    listing_postings  (term_id, listing_id, state)             sorted by term_id
+
+Tokens are lower-cased runs of letters/digits of at least MIN_TERM_LENGTH
+characters, minus STOP_WORDS. Matching is by whole token (``camera`` does not
+match ``cameras``) unless a prefix search is requested, so results can differ
+from the substring LIKE scan. The index is a snapshot; rebuild it after ingest.
+
+Usage:
+    python3 text_index.py build
+    python3 text_index.py search camera hidden --all --compare
+"""
+
+import argparse
+import time
+from typing import List, Tuple
+
+import duckdb
+
+from coldstore import text_source
+from db import BACKEND, connect, database_bytes
+
+MIN_TERM_LENGTH = 2
+STOP_WORDS = (
+    "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "had", "has", "have",
+    "he", "her", "his", "in", "is", "it", "its", "of", "on", "or", "our", "she", "so",
+    "that", "the", "their", "them", "there", "they", "this", "to", "us", "was", "we",
+    "were", "which", "with", "you", "your",
+)
+
+# Table -> (id column, text columns) indexed for it
+INDEXED_TEXT = {
+    "reviews": ("review_id", ("comments",)),
+    "listings": ("listing_id", ("description", "host_about", "amenities")),
+}
+
+
+def tokens_sql(columns: Tuple[str, ...]) -> str:
+    """SQL expression producing the list of raw tokens of one or more text columns."""
+    splits = [f"regexp_split_to_array(lower(COALESCE({column}::VARCHAR, '')), '[^\\p{{L}}\\p{{N}}]+')" for column in columns]
+    return splits[0] if len(splits) == 1 else f"flatten([{', '.join(splits)}])"
+
+
+def build_index(con: duckdb.DuckDBPyConnection):
+    """(Re)build the term dictionary and postings tables, reporting time and size."""
+    start_time = time.time()
+    size_before = database_bytes(con)
+    stop_words = ", ".join(f"'{word}'" for word in STOP_WORDS)
+
+    print("Tokenizing reviews.comments...")
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE review_tokens AS
+        SELECT DISTINCT term, review_id, listing_id, state
+        FROM (
+            SELECT unnest({tokens_sql(INDEXED_TEXT['reviews'][1])}) AS term,
+                   id AS review_id, listing_id, state
+            FROM {text_source(con, 'reviews')}
+        )
+        WHERE length(term) >= {MIN_TERM_LENGTH} AND term NOT IN ({stop_words})
+    """)
+
+    print("Tokenizing listings.description/host_about/amenities...")
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE listing_tokens AS
+        SELECT DISTINCT term, listing_id, state
+        FROM (
+            SELECT unnest({tokens_sql(INDEXED_TEXT['listings'][1])}) AS term,
+                   id AS listing_id, state
+            FROM {text_source(con, 'listings')}
+        )
+        WHERE length(term) >= {MIN_TERM_LENGTH} AND term NOT IN ({stop_words})
+    """)
+
+    print("Building term dictionary and postings...")
+    con.execute("""
+        CREATE OR REPLACE TABLE index_terms AS
+        SELECT row_number() OVER (ORDER BY term)::INTEGER AS term_id,
+               term,
+               COUNT(review_id) AS review_docs,
+               COUNT(listing_id) AS listing_docs
+        FROM (
+            SELECT term, review_id, NULL AS listing_id FROM review_tokens
+            UNION ALL
+            SELECT term, NULL, listing_id FROM listing_tokens
+        )
+        GROUP BY term
+    """)
+    # Sorting by term_id keeps each term's postings in a few row groups,
+    # so zone maps skip everything else at lookup time
+    con.execute("""
+        CREATE OR REPLACE TABLE review_postings AS
+        SELECT t.term_id, r.review_id, r.listing_id, r.state
+        FROM review_tokens r JOIN index_terms t USING (term)
+        ORDER BY t.term_id, r.review_id
+    """)
+    con.execute("""
+        CREATE OR REPLACE TABLE listing_postings AS
+        SELECT t.term_id, l.listing_id, l.state
+        FROM listing_tokens l JOIN index_terms t USING (term)
+        ORDER BY t.term_id, l.listing_id
+    """)
+    con.execute("DROP TABLE review_tokens")
+    con.execute("DROP TABLE listing_tokens")
+
+    build_time = time.time() - start_time
+    index_bytes = database_bytes(con) - size_before
+    terms, review_postings, listing_postings = con.execute("""
+        SELECT (SELECT COUNT(*) FROM index_terms),
+               (SELECT COUNT(*) FROM review_postings),
+               (SELECT COUNT(*) FROM listing_postings)
+    """).fetchone()
+
+    print(f"Terms: {terms:,}")
+    print(f"Review postings: {review_postings:,}")
+    print(f"Listing postings: {listing_postings:,}")
+    print(f"Index size: {index_bytes / 1024 ** 2:,.1f} MB")
+    print(f"Index build time: {build_time:.2f} seconds")
+
+
+def matching_docs_sql(terms: List[str], table_name: str = 'reviews', match_all: bool = False,
+                      prefix: bool = False) -> Tuple[str, list]:
+    """
+    SQL (and parameters) selecting the documents that mention the given terms.
+
+    Args:
+        terms: Terms to look up (lower-cased before matching)
+        table_name: 'reviews' or 'listings'
+        match_all: Require every term (AND) instead of any of them (OR)
+        prefix: Match index terms starting with each term (camera -> cameras)
+
+    Returns:
+        Tuple of (query, parameters); the query yields one row per matching
+        document with its id, state (and listing_id for reviews)
+    """
+    id_column = INDEXED_TEXT[table_name][0]
+    postings = 'review_postings' if table_name == 'reviews' else 'listing_postings'
+    extra = ", any_value(p.listing_id) AS listing_id" if table_name == 'reviews' else ""
+    # starts_with, not LIKE: a '%' or '_' in a term is matched literally
+    term_match = "starts_with(t.term, q.term)" if prefix else "t.term = q.term"
+    values = ", ".join("(?, ?)" for _ in terms)
+    having = f"HAVING COUNT(DISTINCT w.position) = {len(terms)}" if match_all else ""
+
+    query = f"""
+        WITH query_terms(position, term) AS (VALUES {values}),
+        wanted AS (
+            SELECT t.term_id, q.position
+            FROM index_terms t JOIN query_terms q ON {term_match}
+        )
+        SELECT p.{id_column}, any_value(p.state) AS state{extra}
+        FROM {postings} p JOIN wanted w USING (term_id)
+        GROUP BY p.{id_column}
+        {having}
+    """
+    parameters = [value for position, term in enumerate(terms) for value in (position, term.lower())]
+    return query, parameters
+
+
+def like_docs_sql(con: duckdb.DuckDBPyConnection, terms: List[str], table_name: str = 'reviews',
+                  match_all: bool = False) -> Tuple[str, list]:
+    """
+    The equivalent full substring scan over the text columns (cold store included), for comparison.
+
+    Like matching_docs_sql, it yields one row per matching document id. Terms
+    are bound as parameters and matched literally, as ``LIKE '%term%'`` would
+    without its wildcards.
+
+    Returns:
+        Tuple of (query, parameters)
+    """
+    id_column, columns = INDEXED_TEXT[table_name]
+    per_term = [
+        "(" + " OR ".join(f"contains(LOWER({column}::VARCHAR), ?)" for column in columns) + ")"
+        for _ in terms
+    ]
+    condition = (" AND " if match_all else " OR ").join(per_term)
+    query = f"""
+        SELECT id AS {id_column}, any_value(state) AS state
+        FROM {text_source(con, table_name)}
+        WHERE {condition}
+        GROUP BY id
+    """
+    parameters = [term.lower() for term in terms for _ in columns]
+    return query, parameters
+
+
+def timed_fetchall(con: duckdb.DuckDBPyConnection, query: str, parameters: list = None, repeat: int = 3):
+    """Run a query `repeat` times; return its rows and the best (warm) latency."""
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.time()
+        rows = con.execute(query, parameters).fetchall()
+        best = min(best, time.time() - start_time)
+    return rows, best
+
+
+def search(con: duckdb.DuckDBPyConnection, terms: List[str], table_name: str, match_all: bool,
+           prefix: bool, compare: bool, repeat: int = 3):
+    """Print matching document counts per state, with lookup latency."""
+    query, parameters = matching_docs_sql(terms, table_name, match_all, prefix)
+
+    by_state, lookup_time = timed_fetchall(con, f"""
+        SELECT state, COUNT(*) AS docs FROM ({query}) GROUP BY state ORDER BY docs DESC
+    """, parameters, repeat)
+
+    for state, docs in by_state:
+        print(f"{state}\t{docs}")
+    print(f"Total {table_name}: {sum(docs for _, docs in by_state)}")
+    print(f"Index lookup time: {lookup_time:.3f} seconds (best of {repeat})")
+
+    if compare:
+        like_query, like_parameters = like_docs_sql(con, terms, table_name, match_all)
+        rows, like_time = timed_fetchall(con, f"SELECT COUNT(*) FROM ({like_query})", like_parameters, repeat)
+        print(f"LIKE scan total {table_name}: {rows[0][0]} (substring match)")
+        print(f"LIKE scan time: {like_time:.3f} seconds (best of {repeat}, "
+              f"{like_time / max(lookup_time, 1e-6):.1f}x the index lookup)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the inverted token index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help="(Re)build the index from listings and reviews")
+    search_parser = subparsers.add_parser('search', help="Find documents mentioning terms")
+    search_parser.add_argument('terms', nargs='+')
+    search_parser.add_argument('--table', choices=list(INDEXED_TEXT), default='reviews')
+    search_parser.add_argument('--all', action='store_true', help="Require every term (default: any)")
+    search_parser.add_argument('--prefix', action='store_true', help="Match terms by prefix")
+    search_parser.add_argument('--compare', action='store_true', help="Also time the equivalent LIKE scan")
+    search_parser.add_argument('--repeat', type=int, default=3, help="Timed runs per query (default: 3)")
+    args = parser.parse_args()
+    if BACKEND != 'duckdb':
+        parser.error("the text index is stored in airbnb.db; run it with AIRBNB_BACKEND=duckdb")
+
+    con = connect()
+    if args.command == 'build':
+        build_index(con)
+    else:
+        search(con, args.terms, args.table, args.all, args.prefix, args.compare, args.repeat)
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
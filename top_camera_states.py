@@ -1,36 +1,55 @@
-import duckdb
+from dedup import has_canonical
+from query_cache import connect_cached
+from keywords import flag_column, mention_filter, table_columns
 import time
 
 start_time = time.time()
 
-con = duckdb.connect('airbnb.db')
+con = connect_cached()
 
-# Find state with highest percentage of camera reviews
-top_camera_state = con.execute("""
-    WITH camera_reviews AS (
-        SELECT DISTINCT r.id, r.state
-        FROM reviews r
-        WHERE LOWER(r.comments) LIKE '%camera%'
-    ),
-    total_reviews_by_state AS (
-        SELECT state, COUNT(DISTINCT id) as total_reviews
-        FROM reviews
+if has_canonical(con, 'reviews') and flag_column('camera') in table_columns(con, 'review_id_states'):
+    # One row per review id and state, flagged when any copy there mentions a camera
+    top_camera_state = con.execute(f"""
+        SELECT state,
+               COUNT(*) FILTER (WHERE {flag_column('camera')}) as camera_reviews,
+               COUNT(*) as total_reviews,
+               (camera_reviews * 100.0 / total_reviews) as percentage
+        FROM review_id_states
         GROUP BY state
-    ),
-    camera_reviews_count AS (
-        SELECT state, COUNT(*) as camera_reviews
-        FROM camera_reviews
-        GROUP BY state
-    )
-    SELECT c.state,
-           c.camera_reviews,
-           t.total_reviews,
-           (c.camera_reviews * 100.0 / t.total_reviews) as percentage
-    FROM camera_reviews_count c
-    JOIN total_reviews_by_state t ON c.state = t.state
-    ORDER BY percentage DESC
-    LIMIT 1
-""").fetchone()
+        HAVING camera_reviews > 0
+        ORDER BY percentage DESC
+        LIMIT 1
+    """).fetchone()
+else:
+    # Precomputed flag column when ingest created one, LIKE scan otherwise
+    review_mentions_camera = mention_filter(con, 'reviews', 'camera')
+
+    # Find state with highest percentage of camera reviews
+    top_camera_state = con.execute(f"""
+        WITH camera_reviews AS (
+            SELECT DISTINCT r.id, r.state
+            FROM reviews r
+            WHERE {review_mentions_camera}
+        ),
+        total_reviews_by_state AS (
+            SELECT state, COUNT(DISTINCT id) as total_reviews
+            FROM reviews
+            GROUP BY state
+        ),
+        camera_reviews_count AS (
+            SELECT state, COUNT(*) as camera_reviews
+            FROM camera_reviews
+            GROUP BY state
+        )
+        SELECT c.state,
+               c.camera_reviews,
+               t.total_reviews,
+               (c.camera_reviews * 100.0 / t.total_reviews) as percentage
+        FROM camera_reviews_count c
+        JOIN total_reviews_by_state t ON c.state = t.state
+        ORDER BY percentage DESC
+        LIMIT 1
+    """).fetchone()
 
 print(top_camera_state[0])
 print(top_camera_state[1])
@@ -1,19 +1,39 @@
-import duckdb
+from dedup import joins_exactly
+from query_cache import connect_cached
+from summaries import has_summaries
 import time
 
 start_time = time.time()
 
-con = duckdb.connect('airbnb.db')
+con = connect_cached()
 
-# Find host with most reviews
-top_host = con.execute("""
-    SELECT host_id, COUNT(DISTINCT r.id) as review_count
-    FROM listings l
-    JOIN reviews r ON l.id = r.listing_id
-    GROUP BY host_id
-    ORDER BY review_count DESC
-    LIMIT 1
-""").fetchone()
+# Find host with most reviews (kept up to date by ingest when the summary tables exist)
+if has_summaries(con):
+    top_host = con.execute("""
+        SELECT host_id, reviews as review_count
+        FROM host_review_counts
+        ORDER BY review_count DESC
+        LIMIT 1
+    """).fetchone()
+elif joins_exactly(con, "reviews"):
+    # One canonical row per review; a listing id counts once per host it is listed under
+    top_host = con.execute("""
+        SELECT host_id, COUNT(*) as review_count
+        FROM (SELECT DISTINCT id, host_id FROM listings) l
+        JOIN reviews_canonical r ON l.id = r.listing_id
+        GROUP BY host_id
+        ORDER BY review_count DESC
+        LIMIT 1
+    """).fetchone()
+else:
+    top_host = con.execute("""
+        SELECT host_id, COUNT(DISTINCT r.id) as review_count
+        FROM listings l
+        JOIN reviews r ON l.id = r.listing_id
+        GROUP BY host_id
+        ORDER BY review_count DESC
+        LIMIT 1
+    """).fetchone()
 
 print(top_host[1])
 